@@ -0,0 +1,285 @@
+# Filename: allocation_cache.py
+#
+# Memoized allocations keyed by a normalized workload signature.
+# A workload descriptor is {"task_load", "task_type", "input_size_mb",
+# "policy", "workload_class"} (all optional); equivalent descriptors map to
+# one signature. Results are exactly what the policy returns for the
+# descriptor: the cache never changes an allocation. The first request for
+# a signature resolves and sizes it; a repeat of the same raw descriptor
+# values is one dict lookup.
+#
+# Entries carry the policy config fingerprint: when the policies change,
+# the cache clears itself on the next request. With ALLOCATION_CACHE_SHM
+# set, a fixed-size table in shared memory is consulted after the local
+# LRU, so every worker process benefits from any worker's misses.
+
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from time import monotonic
+
+from instrumentation import REGISTRY
+from policies import PolicyError, RESOURCES
+
+CACHE_SIZE = int(os.environ.get("ALLOCATION_CACHE_SIZE", 4096))
+CACHE_TTL = float(os.environ.get("ALLOCATION_CACHE_TTL", 300))
+SHARED_NAME = os.environ.get("ALLOCATION_CACHE_SHM", "")
+SHARED_SLOTS = int(os.environ.get("ALLOCATION_CACHE_SHM_SLOTS", 16384))
+
+
+def workload_signature(data):
+    """
+    Normalized, hashable key for a descriptor. Only coerces types: 50,
+    50.0 and "50" are the same load, task types and classes are
+    case-insensitive. Policy names are checked on the first miss.
+    """
+    load = data.get("task_load")
+    if isinstance(load, str):
+        load = float(load)
+    if not isinstance(load, (int, float)):
+        raise PolicyError("task_load must be a number")
+    if isinstance(load, float) and load.is_integer():
+        load = int(load)
+    try:
+        size = float(data.get("input_size_mb") or 0)
+    except (TypeError, ValueError):
+        raise PolicyError("input_size_mb must be a number") from None
+    if not 0 <= size < math.inf:  # NaN fails too
+        raise PolicyError("input_size_mb must be a finite number >= 0")
+    if size.is_integer():
+        size = int(size)
+    task_type = data.get("task_type")
+    workload_class = data.get("workload_class")
+    return (
+        load,
+        str(task_type).lower() if task_type is not None else None,
+        size,
+        str(data["policy"]) if data.get("policy") is not None else None,
+        str(workload_class).lower() if workload_class is not None else None,
+    )
+
+
+def signature_hash(signature):
+    """Stable across processes (unlike hash() on strings)."""
+    return int.from_bytes(hashlib.blake2b(repr(signature).encode(), digest_size=8).digest(), "little")
+
+
+# -------------------------------
+# SHARED TABLE (optional)
+# -------------------------------
+# Slot: key, fingerprint, int flags, expires, cpu, memory, storage, crc32 of the rest.
+# No locks: a torn write fails the crc check and reads as a miss.
+_BODY = struct.Struct("<QIIdddd")
+_HEAD = struct.Struct("<QI")
+_CRC = struct.Struct("<I")
+_SLOT_SIZE = _BODY.size + 8  # crc + padding
+
+
+class SharedAllocationTable:
+    """2-way set-associative table in a named SharedMemory block; created by the first process."""
+
+    def __init__(self, name, slots=SHARED_SLOTS):
+        from multiprocessing import shared_memory
+
+        self.slots = slots - slots % 2
+        size = self.slots * _SLOT_SIZE
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Attaching processes must not unlink the block when they exit
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            except Exception:
+                pass
+            if self.shm.size < size:
+                raise ValueError(f"shared cache {name} is smaller than {slots} slots")
+        self.buf = self.shm.buf
+
+    def _read(self, slot):
+        offset = slot * _SLOT_SIZE
+        body = bytes(self.buf[offset:offset + _BODY.size])
+        if zlib.crc32(body) != _CRC.unpack_from(self.buf, offset + _BODY.size)[0]:
+            return None
+        return _BODY.unpack(body)
+
+    def get(self, key, fingerprint, now):
+        base = (key % (self.slots // 2)) * 2
+        for slot in (base, base + 1):
+            # Cheap reject on the header before paying for the crc
+            if _HEAD.unpack_from(self.buf, slot * _SLOT_SIZE) != (key, fingerprint):
+                continue
+            entry = self._read(slot)
+            if entry is not None and entry[0] == key and entry[1] == fingerprint and entry[3] > now:
+                flags = entry[2]
+                return {r: int(v) if flags & (1 << i) else v for i, (r, v) in enumerate(zip(RESOURCES, entry[4:]))}
+        return None
+
+    def put(self, key, fingerprint, expires, allocation, now):
+        base = (key % (self.slots // 2)) * 2
+        entries = [(slot, self._read(slot)) for slot in (base, base + 1)]
+        free = [slot for slot, e in entries if e is None or e[0] == key or e[1] != fingerprint or e[3] <= now]
+        victim = free[0] if free else min(entries, key=lambda item: item[1][3])[0]  # soonest to expire
+        values = [allocation[r] for r in RESOURCES]
+        flags = sum(1 << i for i, v in enumerate(values) if isinstance(v, int))
+        body = _BODY.pack(key, fingerprint, flags, expires, *map(float, values))
+        offset = victim * _SLOT_SIZE
+        self.buf[offset:offset + _BODY.size] = body
+        _CRC.pack_into(self.buf, offset + _BODY.size, zlib.crc32(body))
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+
+# -------------------------------
+# LOCAL LRU / TTL CACHE
+# -------------------------------
+class AllocationCache:
+    """
+    registry: policies.PolicyRegistry
+    maxsize / ttl: bound and lifetime of local entries
+    shared: optional SharedAllocationTable consulted on local misses
+
+    Hits take no lock. Raw descriptor values map straight to their entry,
+    so a repeat costs one dict lookup and no validation; other spellings
+    of the same workload (50 vs "50") share the entry through its
+    signature, which also carries the LRU order.
+    """
+
+    def __init__(self, registry, maxsize=CACHE_SIZE, ttl=CACHE_TTL, shared=None):
+        self.registry = registry
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()  # signature -> (expires, policy name, allocation)
+        self._raw = {}                 # raw descriptor values -> entry
+        self._fingerprint = registry.fingerprint
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(("shared_hits", "misses", "evictions", "expired", "invalidations"), 0)
+        self._counters = {
+            result: REGISTRY.counter("allocation_cache_requests_total", "Allocation cache lookups", result=result)
+            for result in ("hit", "shared_hit", "miss")
+        }
+        self._hit = self._counters["hit"]
+        self._hits_base = self._hit.value
+
+    def _check_policies(self):
+        fingerprint = self.registry.fingerprint
+        if fingerprint != self._fingerprint:
+            with self._lock:
+                if fingerprint != self._fingerprint:
+                    self._entries.clear()
+                    self._raw = {}
+                    self._fingerprint = fingerprint
+                    self._stats["invalidations"] += 1
+        return fingerprint
+
+    def _remember(self, raw, entry):
+        """Map raw descriptor values to entry (caller holds the lock)."""
+        try:
+            if len(self._raw) >= 4 * self.maxsize:
+                self._raw = {}
+            self._raw[raw] = entry
+        except TypeError:  # unhashable values are validated every time
+            pass
+
+    def allocate(self, data):
+        """
+        Allocation for a workload descriptor.
+        Returns (policy name, allocation dict, source) with source "hit", "shared_hit" or "miss".
+        The allocation dict is shared with the cache: copy it before changing it.
+        """
+        get = data.get
+        raw = (get("task_load"), get("task_type"), get("input_size_mb"), get("policy"), get("workload_class"))
+        if self.registry.fingerprint != self._fingerprint:
+            self._check_policies()
+        try:
+            entry = self._raw.get(raw)
+        except TypeError:
+            entry = None
+        if entry is not None and entry[0] > monotonic():
+            self._hit.inc()
+            return entry[1], entry[2], "hit"
+        return self._resolve(data, raw)
+
+    def _resolve(self, data, raw):
+        """Slow path: normalize the descriptor, then the signature entry, the shared table or the policy."""
+        fingerprint = self._fingerprint
+        signature = workload_signature(data)
+        now = monotonic()
+        entry = self._entries.get(signature)
+        if entry is not None:
+            with self._lock:
+                if entry[0] > now:
+                    if signature in self._entries:
+                        self._entries.move_to_end(signature)
+                    if fingerprint == self._fingerprint:
+                        self._remember(raw, entry)
+                    hit = True
+                else:
+                    hit = False
+                    if self._entries.pop(signature, None) is not None:
+                        self._stats["expired"] += 1
+            if hit:
+                self._hit.inc()
+                return entry[1], entry[2], "hit"
+
+        load, task_type, input_size_mb, policy_name, workload_class = signature
+        policy = self.registry.get(policy_name, workload_class, task_type)
+        allocation = None
+        source = "miss"
+        if self.shared is not None:
+            key = signature_hash(signature)
+            allocation = self.shared.get(key, fingerprint, time.time())
+            if allocation is not None:
+                source = "shared_hit"
+        if allocation is None:
+            allocation = policy.size(load, input_size_mb)
+            if self.shared is not None:
+                wall = time.time()
+                self.shared.put(key, fingerprint, wall + self.ttl, allocation, wall)
+
+        entry = (now + self.ttl, policy.name, allocation)
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                self._entries[signature] = entry
+                self._entries.move_to_end(signature)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+                self._remember(raw, entry)
+            self._stats["shared_hits" if source == "shared_hit" else "misses"] += 1
+        self._counters[source].inc()
+        return policy.name, allocation, source
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._raw = {}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), maxsize=self.maxsize, ttl=self.ttl,
+                         shared=self.shared is not None, policy_fingerprint=self._fingerprint)
+        stats["hits"] = self._counters["hit"].value - self._hits_base
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def open_cache(registry):
+    """Cache configured from the environment (shared table when ALLOCATION_CACHE_SHM is set)."""
+    shared = None
+    if SHARED_NAME:
+        try:
+            shared = SharedAllocationTable(SHARED_NAME, SHARED_SLOTS)
+        except Exception as e:
+            print(f"SHARED ALLOCATION CACHE UNAVAILABLE ({e}); using a local cache only")
+    return AllocationCache(registry, shared=shared)
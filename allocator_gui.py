@@ -3,11 +3,23 @@
 # --------------------------------------------------------------
 import streamlit as st
 import boto3
-import paramiko
 import pandas as pd
 import time
 from datetime import datetime
+from functools import partial
 import json
+import os
+
+import cluster_snapshot
+import fleet_ops
+import metrics_store
+import scale_in
+import state_store
+import task_publisher
+from aws_clients import LazyClient
+from control_plane import AlertDigest
+from event_bus import EventBus
+from instrumentation import REGISTRY, InstrumentedClient
 
 # ------------------------------------------------------------------
 # 1. CONFIG & DESIGN
@@ -53,12 +65,20 @@ SNS_TOPIC_ARN = "arn:aws:sns:eu-north-1:198852397946:ASGAlerts"
 QUEUE_URL = "https://sqs.eu-north-1.amazonaws.com/198852397946/cpu-task-queue"
 GUI_IP = "13.60.221.26"
 LAMBDA_FUNCTION_NAME = "DynamicAllocator"
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(os.path.expanduser("~"), ".allocator-metrics"))
+HISTORY_WINDOWS = {"1 hour": 3600, "24 hours": 86400, "7 days": 7 * 86400, "30 days": 30 * 86400}
+
+# Every API call is timed into aws_api_call_seconds{service, operation}.
+# Control-plane clients are shared by all sessions: rate limited per service,
+# retried with jitter on throttling, and identical concurrent describes from
+# several sessions go out once (control_plane.py).
+@st.cache_resource
+def get_control_clients():
+    return {service: LazyClient(service, REGION, guard=True) for service in ("ec2", "autoscaling", "sns")}
 
-ec2 = boto3.client("ec2", region_name=REGION)
-autoscaling = boto3.client("autoscaling", region_name=REGION)
-sns = boto3.client('sns', region_name=REGION)
-sqs = boto3.client('sqs', region_name=REGION)
-lambda_client = boto3.client('lambda', region_name=REGION)
+ec2, autoscaling, sns = (get_control_clients()[service] for service in ("ec2", "autoscaling", "sns"))
+sqs = InstrumentedClient(boto3.client('sqs', region_name=REGION), "sqs")
+lambda_client = InstrumentedClient(boto3.client('lambda', region_name=REGION), "lambda")
 
 # ------------------------------------------------------------------
 # 2. LOGIN
@@ -95,38 +115,48 @@ if time.time() - st.session_state.last_refresh > 30:
 # ------------------------------------------------------------------
 # 4. CORE FUNCTIONS
 # ------------------------------------------------------------------
-@st.cache_data(ttl=30)
+@st.cache_resource
+def get_metrics_store():
+    # Memory-mapped history under METRICS_DIR; bounded by the ring sizes
+    return metrics_store.MetricsStore(METRICS_DIR)
+
+def record_snapshot(snapshot):
+    if "asg" in snapshot.fetched_at and "backlog" in snapshot.fetched_at:
+        get_metrics_store().append_many({
+            "desired": snapshot.asg["Desired"],
+            "running": snapshot.asg["Running"],
+            "backlog": snapshot.backlog,
+        })
+
+@st.cache_resource
+def get_alerts():
+    # Notifications within ALERT_DIGEST_SECONDS of each other go out as one email
+    return AlertDigest(lambda **kwargs: sns.publish(**kwargs), timer=True)
+
+def send_alert(message, subject):
+    get_alerts().publish(TopicArn=SNS_TOPIC_ARN, Message=message, Subject=subject)
+
+@st.cache_resource
+def get_event_bus():
+    # Enqueue and capacity events update the snapshot as they happen
+    return EventBus().start()
+
+@st.cache_resource
+def get_collector():
+    # One background collector per server process, shared by every session
+    clients = {"autoscaling": autoscaling, "ec2": ec2, "sqs": sqs}
+    collector = cluster_snapshot.SnapshotCollector(clients, ASG_NAME, QUEUE_URL, on_snapshot=record_snapshot)
+    return collector.attach(get_event_bus()).start()
+
+def get_snapshot():
+    # Reads the latest snapshot; never calls AWS
+    return get_collector().snapshot
+
 def get_asg_info():
-    try:
-        resp = autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[ASG_NAME])["AutoScalingGroups"][0]
-        instances = resp["Instances"]
-        running = len([i for i in instances if i["LifecycleState"] == "InService"])
-        return {
-            "Desired": resp["DesiredCapacity"],
-            "Min": resp["MinSize"],
-            "Max": resp["MaxSize"],
-            "Running": running,
-            "Instances": instances
-        }
-    except Exception as e:
-        st.error(f"ASG Error: {e}")
-        return {"Desired": 0, "Min": 0, "Max": 0, "Running": 0, "Instances": []}
+    return get_snapshot().asg
 
-@st.cache_data(ttl=30)
 def get_instance_info():
-    try:
-        asg = get_asg_info()
-        ids = [i["InstanceId"] for i in asg["Instances"]]
-        if not ids: return []
-        resp = ec2.describe_instances(InstanceIds=ids)
-        rows = []
-        for res in resp["Reservations"]:
-            for inst in res["Instances"]:
-                ip = inst.get("PublicIpAddress", "N/A")
-                state = inst["State"]["Name"]
-                rows.append({"ID": inst["InstanceId"], "IP": ip, "Status": state.capitalize()})
-        return rows
-    except: return []
+    return list(get_snapshot().instances)
 
 def ensure_sqs_queue():
     try:
@@ -144,84 +174,124 @@ def ensure_sqs_queue():
         st.warning(f"SQS check failed: {e}")
         return False
 
-def run_stress(ip, cores=8, duration=300):
-    if ip == "N/A" or ip == GUI_IP: return "Skipped"
-    try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(ip, username=USERNAME, timeout=10)
-        ssh.exec_command("sudo apt update -qq && sudo apt install stress-ng -y -qq || true")
-        time.sleep(2)
-        ssh.exec_command(f"nohup stress-ng --cpu {cores} --timeout {duration} > /dev/null 2>&1 &")
-        ssh.close()
-        sns.publish(TopicArn=SNS_TOPIC_ARN, Message=f"Stress started on {ip}", Subject="Stress Test")
-        add_feedback(f"Stress started on {ip}", "success")
-        return "Running"
-    except Exception as e:
-        add_feedback(f"Stress failed on {ip}: {str(e)[:30]}", "error")
-        return f"Failed: {str(e)[:30]}"
+@st.cache_resource
+def get_ssh_pool():
+    # One pool per server process: SSH connections survive reruns and sessions
+    return fleet_ops.SSHPool(USERNAME)
 
-def stop_stress(ip):
-    if ip == "N/A" or ip == GUI_IP: return "Skipped"
-    try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(ip, username=USERNAME, timeout=10)
-        ssh.exec_command("pkill -f stress-ng || true")
-        ssh.close()
-        add_feedback(f"Stress stopped on {ip}", "success")
-        return "Stopped"
-    except Exception as e:
-        add_feedback(f"Stop stress failed: {str(e)[:30]}", "error")
-        return "Failed"
+def stress_targets(instances):
+    return [i["IP"] for i in instances if i["IP"] != "N/A" and i["IP"] != GUI_IP]
+
+def report_fleet_results(results, verb):
+    ok = [ip for ip, r in results.items() if r["ok"]]
+    failed = {ip: r for ip, r in results.items() if not r["ok"]}
+    slowest = max((r["seconds"] for r in results.values()), default=0)
+    if ok:
+        add_feedback(f"Stress {verb} on {len(ok)}/{len(results)} nodes ({slowest:.1f}s)", "success")
+    for ip, r in failed.items():
+        add_feedback(f"Stress {verb} failed on {ip}: {r['result'][:30]}", "error")
+    return ok
+
+def run_stress(ips, cores=8, duration=300):
+    if not ips:
+        add_feedback("No worker nodes to stress", "info")
+        return {}
+    results = fleet_ops.fan_out(ips, partial(fleet_ops.start_stress, get_ssh_pool()), cores, duration)
+    started = report_fleet_results(results, "started")
+    if started:
+        send_alert(f"Stress started on {', '.join(started)}", "Stress Test")
+    return results
+
+def stop_stress(ips):
+    if not ips:
+        add_feedback("No worker nodes to stop", "info")
+        return {}
+    results = fleet_ops.fan_out(ips, partial(fleet_ops.stop_stress, get_ssh_pool()))
+    report_fleet_results(results, "stopped")
+    return results
+
+@st.cache_resource
+def get_task_publisher():
+    # Thread pool shared across reruns; batches of 10 go out concurrently
+    return task_publisher.TaskPublisher(sqs, QUEUE_URL, bus=get_event_bus())
 
 def publish_tasks(count=10):
     if not ensure_sqs_queue(): return "SQS missing"
     try:
-        for _ in range(count):
-            sqs.send_message(QueueUrl=QUEUE_URL, MessageBody=json.dumps({"task": "CPU", "id": f"task-{int(time.time())}"}))
-        sns.publish(TopicArn=SNS_TOPIC_ARN, Message=f"{count} tasks published", Subject="Tasks Published")
-        add_feedback(f"Published {count} tasks", "success")
-        return f"{count} queued"
+        result = get_task_publisher().publish([task_publisher.make_task("CPU") for _ in range(count)])
+        if result["failed"]:
+            add_feedback(f"{result['failed']} of {count} tasks failed to publish", "error")
+        send_alert(f"{result['sent']} tasks published", "Tasks Published")
+        add_feedback(f"Published {result['sent']} tasks", "success")
+        return f"{result['sent']} queued"
     except Exception as e:
         add_feedback(f"Task publish failed: {e}", "error")
         return f"Failed: {e}"
 
 def get_backlog():
-    if not ensure_sqs_queue(): return 0
+    return get_snapshot().backlog
+
+@st.cache_resource
+def get_state_store():
+    # Same store the workers report their in-flight task counts to
+    return state_store.open_store()
+
+def gui_instance_ids():
+    return [inst["ID"] for inst in get_instance_info() if inst["IP"] == GUI_IP]
+
+def worker_instances(asg):
+    # The dashboard host is in the ASG but runs no worker (it never reports a load): never scale it in
+    gui_ids = set(gui_instance_ids())
+    return [i for i in asg["Instances"] if i["InstanceId"] not in gui_ids]
+
+@st.cache_resource
+def protect_gui_host(gui_ids):
+    # Once per server process: the Lambda's drain mode and the ASG's own policy skip protected instances
+    if not gui_ids:
+        return False
     try:
-        attr = sqs.get_queue_attributes(QueueUrl=QUEUE_URL, AttributeNames=['ApproximateNumberOfMessages'])
-        return int(attr['Attributes'].get('ApproximateNumberOfMessages', 0))
-    except: return 0
+        autoscaling.set_instance_protection(InstanceIds=list(gui_ids), AutoScalingGroupName=ASG_NAME,
+                                            ProtectedFromScaleIn=True)
+        return True
+    except Exception as e:
+        print(f"SCALE-IN PROTECTION FAILED for the dashboard host: {e}")
+        return False
+
+def drain_workers(instances, count):
+    # Least-loaded first; with the drain hook they finish their tasks before terminating
+    draining = scale_in.scale_in(autoscaling, instances, count, get_state_store())
+    for instance_id in draining:
+        add_feedback(f"Draining {instance_id[:12]}...", "success")
+    return draining
 
 def scale_asg(desired):
     try:
-        current = get_asg_info()["Desired"]
-        autoscaling.update_auto_scaling_group(AutoScalingGroupName=ASG_NAME, DesiredCapacity=desired)
-        sns.publish(TopicArn=SNS_TOPIC_ARN, Message=f"Scaled {current}→{desired}", Subject="Scale")
-        st.cache_data.clear()
+        asg = get_asg_info()
+        current = asg["Desired"]
+        draining = drain_workers(worker_instances(asg), current - desired) if desired < current else []
+        if len(draining) < abs(desired - current):
+            autoscaling.update_auto_scaling_group(AutoScalingGroupName=ASG_NAME, DesiredCapacity=desired)
+        get_collector().invalidate("instances", "asg")
+        send_alert(f"Scaled {current}→{desired}", "Scale")
+        get_event_bus().publish("capacity.changed", asg=ASG_NAME, desired=desired)
         add_feedback(f"Scaled to {desired} instances", "success")
     except Exception as e:
         add_feedback(f"Scale failed: {e}", "error")
 
 def stop_extra_instances():
-    instances = get_instance_info()
-    gui_instance = None
-    workers = []
-    for inst in instances:
-        if inst["IP"] == GUI_IP:
-            gui_instance = inst
-        elif inst["Status"].lower() == "running":
-            workers.append(inst)
-    
-    if not workers:
+    # Drain the workers down to the ASG minimum instead of stopping them mid-task
+    asg = get_asg_info()
+    workers = worker_instances(asg)
+    count = min(len(workers), asg["Desired"] - asg["Min"])
+    if count <= 0:
         add_feedback("No extra workers to stop", "info")
         return
     
     try:
-        ec2.stop_instances(InstanceIds=[w["ID"] for w in workers])
-        for w in workers:
-            add_feedback(f"Stopped {w['ID'][:12]}...", "success")
+        draining = drain_workers(workers, count)
+        get_collector().invalidate("instances", "asg")
+        if draining:
+            get_event_bus().publish("capacity.changed", asg=ASG_NAME, desired=asg["Desired"] - len(draining))
     except Exception as e:
         add_feedback(f"Stop failed: {e}", "error")
 
@@ -234,24 +304,28 @@ def trigger_lambda():
             Payload=json.dumps({})
         )
         result = json.loads(response['Payload'].read().decode())
-        action = result.get("body", {})
-        if isinstance(action, str):
-            action = json.loads(action)
-        
+        body = result.get("body", {})
+        if isinstance(body, str):
+            body = json.loads(body)
+        # One invocation scales every configured pool; report ours
+        action = body.get("pools", {}).get(ASG_NAME, body)
+
         desired = action.get("desired", "N/A")
         running = action.get("running", "N/A")
         backlog = action.get("backlog", "N/A")
         act = action.get("action", "none")
 
         if act == "up":
- dialing add_feedback(f"Scaled UP → {desired} instances (Backlog: {backlog})", "success")
+            add_feedback(f"Scaled UP → {desired} instances (Backlog: {backlog})", "success")
         elif act == "down":
             add_feedback(f"Scaled DOWN → {desired} instances", "success")
         else:
             add_feedback(f"No action needed (Backlog: {backlog})", "info")
-        
-        st.cache_data.clear()
-        time.sleep(2)
+
+        # The response carries the new capacity; the collector folds it in and
+        # refetches the instance list in the background, so no wait here
+        if isinstance(desired, int):
+            get_event_bus().publish("capacity.changed", asg=ASG_NAME, desired=desired)
         st.rerun()
         return result
     except Exception as e:
@@ -289,9 +363,13 @@ else:
 # ------------------------------------------------------------------
 # 6. DASHBOARD
 # ------------------------------------------------------------------
-asg = get_asg_info()
-instances = get_instance_info()
-backlog = get_backlog()
+snapshot = get_snapshot()
+asg = snapshot.asg
+instances = list(snapshot.instances)
+backlog = snapshot.backlog
+protect_gui_host(tuple(gui_instance_ids()))
+for key, error in snapshot.errors.items():
+    st.warning(f"{key.upper()} refresh failed (showing last known values): {error[:80]}")
 
 st.markdown('<div class="section-header">Resource Cluster Overview</div>', unsafe_allow_html=True)
 col1, col2, col3, col4 = st.columns(4)
@@ -304,6 +382,25 @@ with col3:
 with col4:
     st.markdown(f'<div class="metric-card"><h3>$0.50</h3><p>Week</p></div>', unsafe_allow_html=True)
 
+st.markdown('<div class="section-header">Backlog & Capacity History</div>', unsafe_allow_html=True)
+window = st.radio("Window", list(HISTORY_WINDOWS), horizontal=True, label_visibility="collapsed")
+since = time.time() - HISTORY_WINDOWS[window]
+history = {}
+for name in ("backlog", "desired", "running"):
+    resolution, stamps, values = get_metrics_store().query(name, since, max_points=1500)
+    history[name] = pd.Series(values, index=pd.to_datetime(stamps, unit="s"), dtype=float)
+if len(history["backlog"]):
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("**Backlog**")
+        st.line_chart(history["backlog"])
+    with c2:
+        st.markdown("**Capacity**")
+        st.line_chart(pd.DataFrame({"Desired": history["desired"], "InService": history["running"]}))
+    st.caption(f"Resolution: {resolution}")
+else:
+    st.info("No history yet")
+
 st.markdown("---")
 if instances:
     df = pd.DataFrame(instances)
@@ -323,15 +420,11 @@ with st.sidebar.expander("Stress Testing", expanded=False):
     c1, c2 = st.columns(2)
     with c1:
         if st.button("Start Stress", use_container_width=True):
-            for inst in instances:
-                if inst["IP"] != "N/A" and inst["IP"] != GUI_IP:
-                    run_stress(inst["IP"], cores, duration)
+            run_stress(stress_targets(instances), cores, duration)
     with c2:
         st.markdown('<div class="danger-button">', unsafe_allow_html=True)
         if st.button("Stop Stress", use_container_width=True):
-            for inst in instances:
-                if inst["IP"] != "N/A" and inst["IP"] != GUI_IP:
-                    stop_stress(inst["IP"])
+            stop_stress(stress_targets(instances))
         st.markdown('</div>', unsafe_allow_html=True)
 
 with st.sidebar.expander("Tasks", expanded=False):
@@ -369,6 +462,18 @@ with st.sidebar.expander("Alerts", expanded=False):
         except Exception as e:
             add_feedback(f"Email failed: {e}", "error")
 
+with st.sidebar.expander("Instrumentation", expanded=False):
+    rows = []
+    for name, value in sorted(REGISTRY.snapshot().items()):
+        if isinstance(value, dict):
+            q = value["quantiles"]
+            rows.append({"Metric": name, "Count": value["count"],
+                         "p50 ms": round(q.get(0.5, 0) * 1000, 2), "p99 ms": round(q.get(0.99, 0) * 1000, 2)})
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    else:
+        st.caption("No calls recorded yet")
+
 st.sidebar.markdown("---")
 st.sidebar.caption("GUI: http://13.60.221.26:8501")
 st.sidebar.caption("Region: eu-north-1")
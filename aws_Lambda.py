@@ -1,9 +1,14 @@
 import json
-import boto3
+import math
 import os
-from datetime import datetime
 import time
 
+from aws_clients import LazyClient
+from control_plane import AlertDigest
+from forecast import HoltForecaster, target_capacity
+from instrumentation import REGISTRY
+from state_store import StateSession, open_store
+
 # -------------------------------
 # CONFIG
 # -------------------------------
@@ -19,38 +24,188 @@ COOLDOWN_SECONDS = 60            # 1 minute (was 300) — safe for demo
 MAX_INSTANCES = 5
 MIN_INSTANCES = 1
 
-# Clients
-autoscaling = boto3.client('autoscaling', region_name=REGION)
-sqs = boto3.client('sqs', region_name=REGION)
-sns = boto3.client('sns', region_name=REGION)
-ec2 = boto3.client('ec2', region_name=REGION)
+# Scaling mode: "reactive" (±1 on thresholds), "predictive" (forecast backlog, jump to target)
+# or "resource" (size the backlog's cpu/memory/storage demand against the instance type)
+SCALING_MODE = os.environ.get("SCALING_MODE", "reactive")
+FORECAST_HORIZON_SECONDS = float(os.environ.get("FORECAST_HORIZON_SECONDS", 180))  # boot time + cooldown
+TARGET_TASKS_PER_INSTANCE = float(os.environ.get("TARGET_TASKS_PER_INSTANCE", HIGH_BACKLOG_THRESHOLD))
+MAX_SCALE_DOWN_STEP = int(os.environ.get("MAX_SCALE_DOWN_STEP", 1))
+FORECAST_ALPHA = float(os.environ.get("FORECAST_ALPHA", 0.5))
+FORECAST_BETA = float(os.environ.get("FORECAST_BETA", 0.3))
+
+# Resource mode: queued tasks are sized with the allocation policies (TASK_LOAD_MIX
+# is the expected {task_load: weight} mix) and packed onto INSTANCE_TYPE nodes
+# (default: the ASG's own type) from the local instance catalog.
+TASK_LOAD_MIX = json.loads(os.environ.get("TASK_LOAD_MIX", '{"50": 1}'))
+INSTANCE_TYPE = os.environ.get("INSTANCE_TYPE") or None
+TARGET_UTILIZATION = float(os.environ.get("TARGET_UTILIZATION", 0.8))     # usable share of each instance
+TARGET_BACKLOG_ROUNDS = float(os.environ.get("TARGET_BACKLOG_ROUNDS", 2))  # full instance loads queued per instance
+
+# Scale-in: "drain" terminates the least-loaded instances (from worker load
+# reports) so a termination lifecycle hook can let them finish their tasks;
+# "desired" just lowers DesiredCapacity and the ASG picks. Hosts in the group
+# that run no worker must be protected from scale-in (the dashboard protects
+# itself). See scale_in.py. Workers report their load through the state
+# store, so unset = "drain" only with a shared (DynamoDB) store; a
+# per-container SQLite store never sees the reports.
+SCALE_IN_MODE = os.environ.get("SCALE_IN_MODE") or None
+
+# Worker pools: SCALING_POOLS is a JSON list (inline or a file path) of
+#   {"name": ..., "asg": ..., "queue_url": ..., <per-pool overrides>}
+# where overrides are lower-case versions of the settings above, e.g.
+# "high_backlog_threshold", "cooldown_seconds", "max_instances".
+# Unset = one pool for ASG_NAME / SQS_QUEUE_URL.
+SCALING_POOLS = os.environ.get("SCALING_POOLS", "")
+POOL_SETTINGS = (
+    "HIGH_BACKLOG_THRESHOLD", "LOW_BACKLOG_THRESHOLD", "COOLDOWN_SECONDS",
+    "MAX_INSTANCES", "MIN_INSTANCES", "SCALING_MODE", "FORECAST_HORIZON_SECONDS",
+    "TARGET_TASKS_PER_INSTANCE", "MAX_SCALE_DOWN_STEP",
+    "TASK_LOAD_MIX", "INSTANCE_TYPE", "TARGET_UTILIZATION", "TARGET_BACKLOG_ROUNDS",
+    "SCALE_IN_MODE",
+)
+POOL_KEYS = {"name", "asg", "queue_url", "policy", "workload_class"}
+DESCRIBE_BATCH_SIZE = 50         # AutoScalingGroupNames per describe call
+POOL_WORKERS = int(os.environ.get("POOL_WORKERS", 16))
+
+# Clients are built on first use from one shared session and keep their
+# connections across warm invocations; each API call is timed into
+# aws_api_call_seconds, rate limited and retried with jitter on throttling
+# (control_plane.py). The SQS pool matches the pool worker threads.
+autoscaling = LazyClient('autoscaling', REGION, guard=True)
+sqs = LazyClient('sqs', REGION, max_pool_connections=max(POOL_WORKERS, 10), guard=True)
+sns = LazyClient('sns', REGION, guard=True)
+
+# Alerts go out as one SNS digest per invocation (every pool's events in one
+# email). ALERT_DIGEST_SECONDS > 0 holds them across warm invocations until
+# the oldest is that old; a container that is recycled first loses them.
+ALERT_DIGEST_SECONDS = float(os.environ.get("ALERT_DIGEST_SECONDS", 0))
+alerts = AlertDigest(lambda **kwargs: sns.publish(**kwargs), window=ALERT_DIGEST_SECONDS)
+
+# Shared state: cooldown, last action and backlog samples, keyed by ASG name.
+# STATE_STORE_URL=dynamodb://<table> shares it across concurrent containers.
+state_store = open_store()
+if SCALE_IN_MODE is None:
+    SCALE_IN_MODE = "drain" if state_store.shared else "desired"
+elif SCALE_IN_MODE == "drain" and not state_store.shared:
+    print("SCALE_IN_MODE=drain without a shared state store: worker loads are never seen, "
+          "victims are picked blind (set STATE_STORE_URL=dynamodb://<table>)")
+
+# Optional sample history; unset = STATE line only. One container writes a
+# store directory (it holds a lock there; concurrent containers skip history).
+# The rings are memory-mapped, which NFS/EFS does not keep coherent between
+# clients: give each writer its own directory and let readers (the
+# dashboard, tuner.py) open it readonly.
+METRICS_STORE_PATH = os.environ.get("METRICS_STORE_PATH")
+metrics = None
+if METRICS_STORE_PATH:
+    from metrics_store import MetricsStore, StoreLocked
+    try:
+        metrics = MetricsStore(METRICS_STORE_PATH)
+    except StoreLocked as e:
+        print(f"METRICS STORE BUSY ({e}); this container records no history")
+
+# One JSON METRICS log line per invocation (timings, API latencies)
+METRICS_LOG = os.environ.get("METRICS_LOG", "1") == "1"
+HANDLER_SECONDS = REGISTRY.histogram("lambda_handler_seconds", "Scaling decision time per invocation")
 
-# State file (Lambda is stateless — use DynamoDB or S3 in prod)
-# For demo: in-memory (resets on cold start — acceptable)
-last_scale_time = 0
-last_scale_action = "none"
+# Reused across warm invocations for queue depths and per-pool decisions
+_executor = None
+
+# Instance type and instances seen on each ASG at the last describe
+asg_instance_types = {}
+asg_instances = {}
 
 # -------------------------------
-# HELPER: Get current ASG state
+# POOLS
 # -------------------------------
-def get_asg_state():
-    try:
-        resp = autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[ASG_NAME])
-        asg = resp['AutoScalingGroups'][0]
-        desired = asg['DesiredCapacity']
-        running = len([i for i in asg['Instances'] if i['LifecycleState'] == 'InService'])
-        return desired, running
-    except Exception as e:
-        print(f"ERROR getting ASG: {e}")
-        return 1, 1  # fallback
+def load_pools(spec=None):
+    """Parse SCALING_POOLS (inline JSON or a file path) into a list of pool dicts."""
+    spec = SCALING_POOLS if spec is None else spec
+    if not spec:
+        # Metrics keep their unprefixed names for the single default pool
+        return [{"name": ASG_NAME, "asg": ASG_NAME, "queue_url": SQS_QUEUE_URL, "metrics_prefix": ""}]
+    if not spec.lstrip().startswith("["):
+        with open(spec) as f:
+            spec = f.read()
+    pools = []
+    for entry in json.loads(spec):
+        unknown = set(entry) - POOL_KEYS - {s.lower() for s in POOL_SETTINGS}
+        if unknown or "asg" not in entry or "queue_url" not in entry:
+            raise ValueError(f"invalid pool config {entry}: needs asg and queue_url, unknown keys {sorted(unknown)}")
+        pool = dict(entry)
+        pool.setdefault("name", pool["asg"])
+        pool["metrics_prefix"] = pool["name"] + "_"
+        pools.append(pool)
+    names = [p["name"] for p in pools]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate pool names in SCALING_POOLS")
+    return pools
+
+POOLS = load_pools()
+
+def setting(pool, name):
+    """Per-pool override, else the module-level default (read at call time)."""
+    return pool.get(name.lower(), globals()[name])
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="pools")
+    return _executor
+
+def run_all(fn, items):
+    """fn(item) for every item, concurrently when there is more than one."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    return list(get_executor().map(fn, items))
+
+# -------------------------------
+# HELPER: Get ASG state (batched)
+# -------------------------------
+def _describe_chunk(names):
+    states = {}
+    kwargs = {"AutoScalingGroupNames": names, "MaxRecords": 100}
+    while True:
+        resp = autoscaling.describe_auto_scaling_groups(**kwargs)
+        for asg in resp['AutoScalingGroups']:
+            running = len([i for i in asg['Instances'] if i['LifecycleState'] == 'InService'])
+            states[asg['AutoScalingGroupName']] = (asg['DesiredCapacity'], running)
+            asg_instances[asg['AutoScalingGroupName']] = asg['Instances']
+            types = [i['InstanceType'] for i in asg['Instances'] if i.get('InstanceType')]
+            if types:
+                asg_instance_types[asg['AutoScalingGroupName']] = max(set(types), key=types.count)
+        if not resp.get("NextToken"):
+            return states
+        kwargs["NextToken"] = resp["NextToken"]
+
+def get_asg_states(names):
+    """{asg name: (desired, running)} from one describe call per 50 groups. Missing groups are left out."""
+    chunks = [names[i:i + DESCRIBE_BATCH_SIZE] for i in range(0, len(names), DESCRIBE_BATCH_SIZE)]
+
+    def describe(chunk):
+        try:
+            return _describe_chunk(chunk)
+        except Exception as e:
+            print(f"ERROR getting ASG: {e}")
+            return {}
+
+    states = {}
+    for part in run_all(describe, chunks):
+        states.update(part)
+    return states
+
+def get_asg_state(asg_name=None):
+    asg_name = asg_name or ASG_NAME
+    return get_asg_states([asg_name]).get(asg_name, (1, 1))  # fallback
 
 # -------------------------------
 # HELPER: Get SQS backlog
 # -------------------------------
-def get_backlog():
+def get_backlog(queue_url=None):
     try:
         attr = sqs.get_queue_attributes(
-            QueueUrl=SQS_QUEUE_URL,
+            QueueUrl=queue_url or SQS_QUEUE_URL,
             AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible']
         )
         visible = int(attr['Attributes'].get('ApproximateNumberOfMessages', 0))
@@ -60,81 +215,235 @@ def get_backlog():
         print(f"ERROR getting SQS: {e}")
         return 0
 
+def get_backlogs(queue_urls):
+    """{queue url: backlog}, queried concurrently."""
+    urls = list(dict.fromkeys(queue_urls))
+    return dict(zip(urls, run_all(get_backlog, urls)))
+
 # -------------------------------
 # HELPER: Send SNS email
 # -------------------------------
 def send_alert(message, subject="Scaling Event"):
+    """Queue an alert for the invocation's digest; errors go out at once."""
+    alerts.publish(
+        TopicArn=SNS_TOPIC_ARN,
+        Message=message,
+        Subject=subject,
+        urgent=subject == "ERROR"
+    )
+    print(f"ALERT QUEUED: {subject}")
+
+# -------------------------------
+# HELPER: Apply a capacity change
+# -------------------------------
+def drain_scale_in(pool, desired, new_capacity):
+    """Terminate the least-loaded instances; returns the ids draining (may be fewer than asked)."""
+    import scale_in
+
+    instances = asg_instances.get(pool["asg"], [])
+    return scale_in.scale_in(autoscaling, instances, desired - new_capacity, state_store, now=time.time())
+
+def apply_scaling(pool, desired, new_capacity, backlog):
+    direction = "UP" if new_capacity > desired else "DOWN"
+    name = pool["name"]
     try:
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Message=message,
-            Subject=subject
-        )
-        print(f"ALERT SENT: {subject}")
+        draining = []
+        if direction == "DOWN" and setting(pool, "SCALE_IN_MODE") == "drain":
+            draining = drain_scale_in(pool, desired, new_capacity)
+        if len(draining) < abs(new_capacity - desired):
+            # Scale-up, "desired" mode, or instances the planner could not pick
+            autoscaling.update_auto_scaling_group(
+                AutoScalingGroupName=pool["asg"],
+                DesiredCapacity=new_capacity
+            )
+        msg = f"[{name}] SCALED {direction}: {desired} → {new_capacity}\nBacklog: {backlog} tasks"
+        if draining:
+            msg += f"\nDraining: {', '.join(draining)}"
+        send_alert(msg, f"Scale {direction.capitalize()}: {name}")
+        print(f"[{name}] SCALED {direction} to {new_capacity}")
+        return True
     except Exception as e:
-        print(f"ALERT FAILED: {e}")
+        send_alert(f"[{name}] SCALE {direction} FAILED: {e}", "ERROR")
+        print(f"[{name}] SCALE FAILED: {e}")
+        return False
 
 # -------------------------------
-# MAIN SCALING LOGIC
+# DECISION (no side effects)
 # -------------------------------
-def lambda_handler(event, context):
-    global last_scale_time, last_scale_action
+def pool_settings(pool):
+    """Every POOL_SETTINGS value for pool, resolved once."""
+    return {name: setting(pool, name) for name in POOL_SETTINGS}
 
-    current_time = time.time()
-    desired, running = get_asg_state()
-    backlog = get_backlog()
-    tasks_per_instance = backlog / max(running, 1)
+def forecast_target(cfg, forecaster, desired):
+    """(capacity, projected backlog) for the forecast FORECAST_HORIZON_SECONDS from now."""
+    projected = forecaster.forecast(cfg["FORECAST_HORIZON_SECONDS"])
+    target = target_capacity(projected, cfg["TARGET_TASKS_PER_INSTANCE"], cfg["MIN_INSTANCES"], cfg["MAX_INSTANCES"])
+    if target < desired:
+        target = max(target, desired - cfg["MAX_SCALE_DOWN_STEP"])
+    return target, projected
+
+def decide_capacity(cfg, desired, running, backlog, now, last_scale_time, forecaster=None, resource_target=None):
+    """
+    The scaling decision alone: no clients, state or logging, so the tuner
+    can replay it over long traces. cfg comes from pool_settings();
+    forecaster is the pool's HoltForecaster, already updated with backlog;
+    resource_target() gives the resource-mode target.
+    Returns (new capacity, cooldown seconds remaining or 0).
+    """
+    cooldown = cfg["COOLDOWN_SECONDS"]
+    if now - last_scale_time < cooldown:
+        return desired, cooldown - (now - last_scale_time)
 
-    print(f"STATE: Desired={desired}, Running={running}, Backlog={backlog}, Tasks/Inst={tasks_per_instance:.1f}")
+    max_instances = cfg["MAX_INSTANCES"]
+    min_instances = cfg["MIN_INSTANCES"]
+    mode = cfg["SCALING_MODE"]
+    if mode == "resource" and resource_target is not None:
+        return resource_target(), 0
 
-    # Cooldown check
-    if current_time - last_scale_time < COOLDOWN_SECONDS:
-        print(f"COOLDOWN: {int(COOLDOWN_SECONDS - (current_time - last_scale_time))}s remaining")
-        return {"status": "cooldown"}
+    if mode == "predictive" and forecaster is not None and forecaster.ready:
+        return forecast_target(cfg, forecaster, desired)[0], 0
 
+    tasks_per_instance = backlog / max(running, 1)
     # Scale UP
-    if tasks_per_instance > HIGH_BACKLOG_THRESHOLD and desired < MAX_INSTANCES:
-        new_capacity = min(desired + 1, MAX_INSTANCES)
-        try:
-            autoscaling.update_auto_scaling_group(
-                AutoScalingGroupName=ASG_NAME,
-                DesiredCapacity=new_capacity
-            )
-            msg = f"SCALED UP: {desired} → {new_capacity}\nBacklog: {backlog} tasks"
-            send_alert(msg, "Scale Up")
-            last_scale_time = current_time
-            last_scale_action = "up"
-            print(f"SCALED UP to {new_capacity}")
-        except Exception as e:
-            send_alert(f"SCALE UP FAILED: {e}", "ERROR")
-            print(f"SCALE FAILED: {e}")
+    if tasks_per_instance > cfg["HIGH_BACKLOG_THRESHOLD"] and desired < max_instances:
+        return min(desired + 1, max_instances), 0
 
     # Scale DOWN
-    elif tasks_per_instance < LOW_BACKLOG_THRESHOLD and desired > MIN_INSTANCES:
-        new_capacity = max(desired - 1, MIN_INSTANCES)
+    if tasks_per_instance < cfg["LOW_BACKLOG_THRESHOLD"] and desired > min_instances:
+        return max(desired - 1, min_instances), 0
+    return desired, 0
+
+# -------------------------------
+# HELPER: Resource-aware target
+# -------------------------------
+def resource_capacity(pool, backlog, desired):
+    """Instances whose cpu/memory/storage cover the backlog's allocation demand."""
+    import capacity_model
+
+    instance_type = setting(pool, "INSTANCE_TYPE") or asg_instance_types.get(pool["asg"])
+    capacity = capacity_model.get_catalog().capacity(instance_type)
+    sized = capacity_model.instances_for_backlog(
+        backlog, setting(pool, "TASK_LOAD_MIX"), capacity, setting(pool, "TARGET_UTILIZATION"),
+        pool.get("policy"), pool.get("workload_class"))
+    needed = sized["instances"] / setting(pool, "TARGET_BACKLOG_ROUNDS")
+    target = min(max(math.ceil(needed), setting(pool, "MIN_INSTANCES")), setting(pool, "MAX_INSTANCES"))
+    if target < desired:
+        target = max(target, desired - setting(pool, "MAX_SCALE_DOWN_STEP"))
+    demand = sized["demand"]
+    print(f"[{pool['name']}] RESOURCES: Demand cpu={demand['cpu']:.0f} mem={demand['memory']:.0f}GB "
+          f"disk={demand['storage']:.0f}GB on {instance_type or 'default'} "
+          f"({capacity['cpu']} vCPU/{capacity['memory']}GB), Instance loads={sized['instances']}, Target={target}")
+    if sized["oversized"]:
+        print(f"[{pool['name']}] WARNING: {sized['oversized']} tasks exceed one {instance_type or 'default'} instance")
+    return target
+
+# -------------------------------
+# MAIN SCALING LOGIC
+# -------------------------------
+def lambda_handler(event, context):
+    with HANDLER_SECONDS.time():
         try:
-            autoscaling.update_auto_scaling_group(
-                AutoScalingGroupName=ASG_NAME,
-                DesiredCapacity=new_capacity
-            )
-            msg = f"SCALED DOWN: {desired} → {new_capacity}\nBacklog: {backlog} tasks"
-            send_alert(msg, "Scale Down")
-            last_scale_time = current_time
-            last_scale_action = "down"
-            print(f"SCALED DOWN to {new_capacity}")
-        except Exception as e:
-            send_alert(f"SCALE DOWN FAILED: {e}", "ERROR")
-            print(f"SCALE FAILED: {e}")
+            result = scale(event, context)
+        finally:
+            alerts.flush(force=False)
+            if metrics is not None:
+                metrics.flush()
+    if METRICS_LOG:
+        print(json.dumps({"type": "METRICS", "function": "lambda_handler", "metrics": REGISTRY.snapshot()}))
+    return result
 
-    else:
-        print("NO ACTION: Within thresholds")
+def load_states(pools):
+    """Every pool's scaler state in one read; None (each pool reads its own) if that fails."""
+    try:
+        return state_store.get_items([p["asg"] for p in pools])
+    except Exception as e:
+        print(f"ERROR reading state: {e}")
+        return None
+
+def scale(event, context):
+    """One batched describe, concurrent queue depths, one state read, then a decision per pool."""
+    current_time = time.time()
+    pools = POOLS
+    asg_states = get_asg_states(list(dict.fromkeys(p["asg"] for p in pools)))
+    backlogs = get_backlogs(p["queue_url"] for p in pools)
+    states = load_states(pools)
+
+    def decide(pool):
+        if pool["asg"] not in asg_states:
+            print(f"[{pool['name']}] ERROR: ASG {pool['asg']} not found, skipping")
+            return {"status": "error", "action": "none"}
+        desired, running = asg_states[pool["asg"]]
+        try:
+            return scale_pool(pool, desired, running, backlogs[pool["queue_url"]], current_time, states)
+        except Exception as e:
+            print(f"[{pool['name']}] ERROR: {e}")
+            return {"status": "error", "action": "none", "desired": desired, "running": running}
 
+    results = dict(zip((p["name"] for p in pools), run_all(decide, pools)))
+    # The single default pool (no SCALING_POOLS) keeps the original body: desired, running, backlog, action
+    legacy = not SCALING_POOLS and len(pools) == 1
+    body = results[pools[0]["name"]] if legacy else {"pools": results}
     return {
         "statusCode": 200,
-        "body": json.dumps({
-            "desired": desired,
-            "running": running,
-            "backlog": backlog,
-            "action": last_scale_action
-        })
+        "body": json.dumps(body)
     }
+
+def scale_pool(pool, desired, running, backlog, current_time, states=None):
+    """states: items from load_states(); without them the pool reads its own."""
+    name = pool["name"]
+    session = StateSession(state_store, pool["asg"])
+    state = session.load() if states is None else session.seed(states.get(pool["asg"]))
+    last_scale_time = state.get("last_scale_time", 0)
+    last_scale_action = state.get("last_scale_action", "none")
+    forecaster = HoltForecaster.from_dict(state.get("forecast"), FORECAST_ALPHA, FORECAST_BETA)
+
+    tasks_per_instance = backlog / max(running, 1)
+    forecaster.update(current_time, backlog)
+    state["forecast"] = forecaster.to_dict()
+    result = {"status": "ok", "desired": desired, "running": running, "backlog": backlog}
+
+    print(f"[{name}] STATE: Desired={desired}, Running={running}, Backlog={backlog}, Tasks/Inst={tasks_per_instance:.1f}")
+    if metrics is not None:
+        prefix = pool["metrics_prefix"]
+        metrics.append_many({
+            prefix + "desired": desired,
+            prefix + "running": running,
+            prefix + "backlog": backlog,
+            prefix + "tasks_per_instance": tasks_per_instance,
+        }, current_time)
+
+    cfg = pool_settings(pool)
+    new_capacity, remaining = decide_capacity(
+        cfg, desired, running, backlog, current_time, last_scale_time, forecaster,
+        lambda: resource_capacity(pool, backlog, desired))
+    if remaining:
+        print(f"[{name}] COOLDOWN: {int(remaining)}s remaining")
+        session.commit()
+        return dict(result, status="cooldown", action="none", retry_in=remaining)
+
+    if cfg["SCALING_MODE"] == "predictive" and forecaster.ready:
+        horizon = cfg["FORECAST_HORIZON_SECONDS"]
+        print(f"[{name}] FORECAST: Backlog in {horizon:.0f}s={forecaster.forecast(horizon):.1f}, "
+              f"Rate={forecaster.trend:+.2f}/s, Target={new_capacity}")
+
+    if new_capacity == desired:
+        print(f"[{name}] NO ACTION: Within thresholds")
+        session.commit()
+    else:
+        # Claim the cooldown window before touching the ASG; if another
+        # container committed since our read, it has already acted.
+        state["last_scale_time"] = current_time
+        state["last_scale_action"] = "up" if new_capacity > desired else "down"
+        if not session.commit():
+            print(f"[{name}] CONFLICT: State changed by a concurrent invocation, skipping")
+            return dict(result, status="conflict", action="none")
+        if apply_scaling(pool, desired, new_capacity, backlog):
+            last_scale_action = state["last_scale_action"]
+            result["desired"] = new_capacity
+        else:
+            # Release the cooldown so the next run can retry
+            state["last_scale_time"] = last_scale_time
+            state["last_scale_action"] = last_scale_action
+            session.commit()
+
+    return dict(result, action=last_scale_action)
@@ -0,0 +1,97 @@
+# Filename: aws_clients.py
+#
+# Shared, lazily built boto3 clients. Importing this module does not import
+# boto3; the first API call on a LazyClient builds the session (once per
+# process, shared by every client) and then the client itself. Clients keep
+# their connection pools across warm Lambda invocations, with TCP keep-alive
+# and pool sizes matched to the threads that share them.
+
+import os
+import threading
+
+DEFAULT_REGION = os.environ.get("AWS_REGION", "eu-north-1")
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", 16))
+CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", 2))
+READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", 10))
+
+_session = None
+_clients = {}
+_lock = threading.RLock()  # session and client construction are not thread-safe
+
+
+def get_session():
+    """The process-wide boto3 session (botocore loads its data files once)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3.session
+                _session = boto3.session.Session()
+    return _session
+
+
+def client_config(max_pool_connections=MAX_POOL_CONNECTIONS, max_attempts=3):
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={"mode": "standard", "max_attempts": max_attempts},
+    )
+
+
+def get_client(service, region=None, max_pool_connections=MAX_POOL_CONNECTIONS, max_attempts=3):
+    """One client per (service, region, pool size, SDK attempts) per process."""
+    key = (service, region or DEFAULT_REGION, max_pool_connections, max_attempts)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = get_session().client(
+                    service, region_name=key[1], config=client_config(max_pool_connections, max_attempts))
+    return client
+
+
+class LazyClient:
+    """
+    Stands in for a boto3 client and builds it on first attribute access.
+    instrument=True times every call into aws_api_call_seconds.
+    guard=True wraps it in a control_plane.GuardedClient, which then does
+    all the retrying (the SDK's own retries are turned off).
+    """
+
+    def __init__(self, service, region=None, max_pool_connections=MAX_POOL_CONNECTIONS, instrument=True,
+                 guard=False):
+        self.service = service
+        self.region = region
+        self.max_pool_connections = max_pool_connections
+        self.instrument = instrument
+        self.guard = guard
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with _lock:
+                if self._client is None:
+                    client = get_client(self.service, self.region, self.max_pool_connections,
+                                        max_attempts=1 if self.guard else 3)
+                    if self.instrument:
+                        from instrumentation import InstrumentedClient
+                        client = InstrumentedClient(client, self.service)
+                    if self.guard:
+                        from control_plane import GuardedClient
+                        client = GuardedClient(client, self.service, self.region or DEFAULT_REGION)
+                    self._client = client
+        return self._client
+
+    @property
+    def built(self):
+        return self._client is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.client, attr)
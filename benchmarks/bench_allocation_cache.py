@@ -0,0 +1,89 @@
+# Filename: bench_allocation_cache.py
+#
+# Cost per allocation with and without the signature cache, for a skewed
+# (Zipf-like) mix of workload descriptors. "size only" is the compiled
+# policy call alone; "validate + size" is what /allocate does per request
+# without a cache (normalize the descriptor, resolve the policy, size it).
+# Local misses are shown computed and answered from the shared table.
+# Usage: python benchmarks/bench_allocation_cache.py [--calls 100000] [--distinct 500]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allocation_cache import AllocationCache, SharedAllocationTable, workload_signature
+from policies import PolicyRegistry
+
+TASK_TYPES = (None, "cpu", "io")
+
+
+def descriptors(count, distinct, seed=7):
+    """count descriptors drawn Zipf-like from `distinct` workload shapes."""
+    rng = random.Random(seed)
+    shapes = [{"task_load": rng.randint(1, 100), "task_type": rng.choice(TASK_TYPES),
+               "input_size_mb": rng.choice((0, 0, 512, 4096, 20000))} for _ in range(distinct)]
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(shapes, weights=weights, k=count)
+
+
+def per_call_ns(fn, items, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for item in items:
+            fn(item)
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Allocation cache benchmark")
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=500, help="distinct workload shapes")
+    parser.add_argument("--maxsize", type=int, default=4096)
+    args = parser.parse_args()
+
+    registry = PolicyRegistry()
+    items = descriptors(args.calls, args.distinct)
+
+    def size_only(d):
+        return registry.get(None, None, d["task_type"]).size(d["task_load"], d["input_size_mb"])
+
+    def validate_and_size(d):
+        load, task_type, input_size_mb, policy, workload_class = workload_signature(d)
+        return registry.get(policy, workload_class, task_type).size(load, input_size_mb)
+
+    rows = [("size only", per_call_ns(size_only, items), None),
+            ("validate + size", per_call_ns(validate_and_size, items), None)]
+    local = AllocationCache(registry, maxsize=args.maxsize)
+    rows.append(("cache", per_call_ns(local.allocate, items), local))
+    # maxsize=1: (almost) every request misses the local LRU
+    computed = AllocationCache(registry, maxsize=1)
+    rows.append(("miss, computed", per_call_ns(computed.allocate, items), computed))
+
+    shared = SharedAllocationTable(f"bench-alloc-{os.getpid()}", 16384)
+    try:
+        warm = AllocationCache(registry, shared=shared)  # another worker filled the table
+        for d in items:
+            warm.allocate(d)
+        cold = AllocationCache(registry, maxsize=1, shared=shared)
+        rows.append(("miss, shared", per_call_ns(cold.allocate, items), cold))
+    finally:
+        shared.close()
+        shared.shm.unlink()
+
+    base = rows[1][1]
+    print(f"{args.calls} allocations over {args.distinct} shapes")
+    print(f"{'path':<15} | {'ns/call':>9} | {'vs validate':>11} | {'hit rate':>8}")
+    for name, ns, cache in rows:
+        rate = f"{cache.stats()['hit_rate']:.1%}" if cache else "-"
+        print(f"{name:<15} | {ns:>9.0f} | {base / ns:>10.2f}x | {rate:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Filename: bench_batch.py
+#
+# Compare per-request /allocate against /allocate/batch.
+# Usage: python benchmarks/bench_batch.py [--max-per-request 10000]
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dynamic
+
+SIZES = [1, 100, 10_000, 1_000_000]
+
+
+def time_per_request(client, loads):
+    start = time.perf_counter()
+    for load in loads:
+        client.post("/allocate", json={"task_load": load})
+    return time.perf_counter() - start
+
+
+def time_batch_json(client, loads):
+    start = time.perf_counter()
+    client.post("/allocate/batch", json={"task_loads": loads})
+    return time.perf_counter() - start
+
+
+def time_batch_binary(client, loads):
+    body = struct.pack(f"<{len(loads)}i", *loads)
+    start = time.perf_counter()
+    client.post("/allocate/batch", data=body, content_type="application/octet-stream")
+    return time.perf_counter() - start
+
+
+def time_function(loads):
+    start = time.perf_counter()
+    for load in loads:
+        dynamic.allocate_resources(load)
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    dynamic.allocate_resources_batch(loads)
+    return loop, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request vs batch allocation benchmark")
+    parser.add_argument("--max-per-request", type=int, default=10_000,
+                        help="above this size the per-request HTTP time is extrapolated")
+    args = parser.parse_args()
+
+    client = dynamic.app.test_client()
+    print(f"numpy: {'yes' if dynamic.np is not None else 'no (pure Python fallback)'}")
+    print(f"{'loads':>9} | {'fn loop':>10} | {'fn batch':>10} | {'http single':>14} | {'http json':>10} | {'http bin':>10}")
+    for n in SIZES:
+        loads = [random.randint(0, 100) for _ in range(n)]
+        fn_loop, fn_batch = time_function(loads)
+
+        if n <= args.max_per_request:
+            single = time_per_request(client, loads)
+            single_txt = f"{single:10.4f}s"
+        else:
+            sample = loads[:args.max_per_request]
+            single = time_per_request(client, sample) * n / len(sample)
+            single_txt = f"~{single:9.2f}s*"
+
+        batch_json = time_batch_json(client, loads)
+        batch_bin = time_batch_binary(client, loads)
+        print(f"{n:>9} | {fn_loop:9.4f}s | {fn_batch:9.4f}s | {single_txt:>14} | {batch_json:9.4f}s | {batch_bin:9.4f}s")
+    print("* extrapolated from --max-per-request loads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Filename: bench_cold_start.py
+#
+# Cold-start cost of the scaling Lambda: module import time and first /
+# warm invocation latency, each measured in a fresh interpreter. AWS calls
+# go through real boto3 clients whose HTTP layer is answered with canned
+# responses, so client construction and response parsing are included.
+#
+# Usage: python benchmarks/bench_cold_start.py [--runs 5] [--eager]
+#        [--max-import-ms 200] [--max-first-ms 1500]   (exit 1 on regression)
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CANNED = {
+    "DescribeAutoScalingGroups": (
+        b'<DescribeAutoScalingGroupsResponse xmlns="http://autoscaling.amazonaws.com/doc/2011-01-01/">'
+        b"<DescribeAutoScalingGroupsResult><AutoScalingGroups><member>"
+        b"<AutoScalingGroupName>my-dynamic-asg</AutoScalingGroupName>"
+        b"<DesiredCapacity>2</DesiredCapacity><MinSize>1</MinSize><MaxSize>5</MaxSize><Instances>"
+        b"<member><InstanceId>i-0001</InstanceId><LifecycleState>InService</LifecycleState></member>"
+        b"<member><InstanceId>i-0002</InstanceId><LifecycleState>InService</LifecycleState></member>"
+        b"</Instances></member></AutoScalingGroups></DescribeAutoScalingGroupsResult>"
+        b"</DescribeAutoScalingGroupsResponse>"
+    ),
+    "UpdateAutoScalingGroup": (
+        b'<UpdateAutoScalingGroupResponse xmlns="http://autoscaling.amazonaws.com/doc/2011-01-01/">'
+        b"<ResponseMetadata><RequestId>r</RequestId></ResponseMetadata></UpdateAutoScalingGroupResponse>"
+    ),
+    "GetQueueAttributes": b'{"Attributes": {"ApproximateNumberOfMessages": "60", "ApproximateNumberOfMessagesNotVisible": "0"}}',
+    "Publish": (
+        b'<PublishResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">'
+        b"<PublishResult><MessageId>m</MessageId></PublishResult></PublishResponse>"
+    ),
+}
+
+
+# -------------------------------
+# CHILD: one cold start
+# -------------------------------
+def install_stub(latency):
+    """Answer every request on the shared session with a canned response."""
+    import aws_clients
+    from botocore.awsrequest import AWSResponse
+
+    class Raw:
+        def __init__(self, body):
+            self.body = body
+
+        def stream(self, **kwargs):
+            yield self.body
+
+    def answer(request, event_name, **kwargs):
+        if latency:
+            time.sleep(latency)
+        return AWSResponse(request.url, 200, {}, Raw(CANNED[event_name.rsplit(".", 1)[-1]]))
+
+    # Clients copy the session's event hooks when built, so this must come first
+    aws_clients.get_session().events.register("before-send", answer)
+
+
+def child(eager, latency):
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    import aws_Lambda
+    import aws_clients
+    if eager:
+        # What the handler used to do at import: build every client up front
+        install_stub(latency)
+        for service in ("autoscaling", "sqs", "sns", "ec2"):
+            aws_clients.get_client(service, aws_Lambda.REGION, max_attempts=1)
+    imported = time.perf_counter()
+    if not eager:
+        install_stub(latency)
+    result = aws_Lambda.lambda_handler({}, None)
+    first = time.perf_counter()
+    aws_Lambda.lambda_handler({}, None)
+    warm = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "first_ms": (first - imported) * 1000,
+        "warm_ms": (warm - first) * 1000,
+        "modules": len(sys.modules),
+        "status": result["statusCode"],
+    }))
+
+
+def run_child(eager, latency):
+    env = dict(os.environ, STATE_STORE_URL="memory://", METRICS_LOG="0",
+               AWS_ACCESS_KEY_ID="testing", AWS_SECRET_ACCESS_KEY="testing", AWS_REGION="eu-north-1")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", "--latency", str(latency)] + (["--eager"] if eager else [])
+    out = subprocess.run(cmd, env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling Lambda cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="stubbed per-request latency (s)")
+    parser.add_argument("--eager", action="store_true", help="also build all clients at import, as before")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-first-ms", type=float, default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.eager, args.latency)
+        return
+
+    modes = [("lazy", False)] + ([("eager", True)] if args.eager else [])
+    medians = {}
+    for label, eager in modes:
+        runs = [run_child(eager, args.latency) for _ in range(args.runs)]
+        med = {key: statistics.median(r[key] for r in runs) for key in ("import_ms", "first_ms", "warm_ms")}
+        medians[label] = med
+        print(f"{label:<6} import {med['import_ms']:7.1f} ms | first invocation {med['first_ms']:7.1f} ms | "
+              f"warm invocation {med['warm_ms']:6.1f} ms | {runs[0]['modules']} modules")
+
+    lazy = medians["lazy"]
+    failed = []
+    if args.max_import_ms is not None and lazy["import_ms"] > args.max_import_ms:
+        failed.append(f"import {lazy['import_ms']:.1f} ms > {args.max_import_ms} ms")
+    if args.max_first_ms is not None and lazy["first_ms"] > args.max_first_ms:
+        failed.append(f"first invocation {lazy['first_ms']:.1f} ms > {args.max_first_ms} ms")
+    if failed:
+        print("REGRESSION: " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Filename: bench_control_plane.py
+#
+# Control-plane calls under API throttling, against local_aws fakes that
+# enforce a request rate. --threads callers (Lambda pool workers, GUI
+# sessions) each describe the ASG and update it --ops times:
+#   raw       the fake client as is: throttled calls fail
+#   guarded   control_plane.GuardedClient: token bucket, jittered retries,
+#             identical concurrent describes coalesced
+# Then --events scale alerts sent one SNS email each vs. one digest.
+# Usage: python benchmarks/bench_control_plane.py [--threads 16] [--ops 10] [--api-rate 20]
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control_plane import AlertDigest, GuardedClient, TokenBucket
+from local_aws import FakeAutoScaling, FakeSNS
+
+ASG = "workers"
+
+
+def run(mode, args):
+    asg = FakeAutoScaling(latency=args.latency, max_rate=args.api_rate)
+    asg.create_group(ASG, desired=2)
+    client = asg
+    if mode == "guarded":
+        client = GuardedClient(asg, "autoscaling", bucket=TokenBucket(args.api_rate * 0.8))
+    failed = [0]
+    lock = threading.Lock()
+
+    def caller(n):
+        for i in range(args.ops):
+            for call in (lambda: client.describe_auto_scaling_groups(AutoScalingGroupNames=[ASG]),
+                         lambda: client.update_auto_scaling_group(AutoScalingGroupName=ASG, DesiredCapacity=2 + i % 2)):
+                try:
+                    call()
+                except Exception:
+                    with lock:
+                        failed[0] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {"requests": sum(asg.calls.values()), "describes": asg.calls["describe_auto_scaling_groups"],
+            "throttled": asg.limit.throttled, "failed": failed[0], "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throttled control-plane benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=10, help="describe + update rounds per thread")
+    parser.add_argument("--api-rate", type=float, default=20, help="calls/s the fake API accepts")
+    parser.add_argument("--latency", type=float, default=0.02, help="per-call latency (s)")
+    parser.add_argument("--events", type=int, default=40, help="scale alerts for the SNS comparison")
+    args = parser.parse_args()
+
+    wanted = args.threads * args.ops * 2
+    print(f"{args.threads} callers x {args.ops} x (describe + update) = {wanted} operations, API limit {args.api_rate:.0f}/s")
+    print(f"{'client':<8} | {'requests':>8} | {'describes':>9} | {'throttled':>9} | {'failed ops':>10} | {'seconds':>7}")
+    for mode in ("raw", "guarded"):
+        r = run(mode, args)
+        print(f"{mode:<8} | {r['requests']:>8} | {r['describes']:>9} | {r['throttled']:>9} | {r['failed']:>10} | "
+              f"{r['seconds']:>7.2f}")
+
+    single, digest_sns = FakeSNS(), FakeSNS()
+    digest = AlertDigest(digest_sns.publish, window=60)
+    for i in range(args.events):
+        single.publish(TopicArn="alerts", Message=f"scaled to {i}", Subject="Scale Up")
+        digest.publish(TopicArn="alerts", Message=f"scaled to {i}", Subject="Scale Up")
+    digest.close()
+    print(f"{args.events} scale alerts: {len(single.messages)} emails one by one, {len(digest_sns.messages)} as digests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+# Filename: bench_end_to_end.py
+#
+# End-to-end local run of the whole loop, on wall time with compressed
+# timings:
+#   clients   POST /allocate on the dynamic.py API (its own process), then
+#             enqueue the task with its allocation
+#   queue     local_aws.FakeSQS; the ASG is local_aws.FakeAutoScaling with
+#             the drain lifecycle hook
+#   scaler    aws_Lambda.lambda_handler every --scaler-interval seconds
+#   workers   a worker.Worker + scale_in.DrainWatcher per InService instance,
+#             running sleep tasks
+# Traffic follows task_publisher's shapes. Reported: end-to-end task
+# latency (allocate -> done), allocation API throughput (a saturation burst
+# and during the run), scaling reaction time (scale-up warranted -> desired
+# raised -> capacity InService) and memory per component (the API's RSS;
+# in-process components from tracemalloc, attributed by the nearest
+# project frame).
+#
+# --json writes the results with the commit they ran on; --compare checks
+# them against an earlier file and exits 1 on a regression beyond
+# --tolerance.
+# Usage: python benchmarks/bench_end_to_end.py [--profiles steady spike] [--json e2e.json]
+#        python benchmarks/bench_end_to_end.py --compare e2e-main.json --tolerance 0.25
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ASG = "e2e-workers"
+
+# Traffic profiles: task_publisher.rate_at shape, peak tasks/s, seconds
+PROFILES = {
+    "steady": {"shape": "constant", "rate": 12, "duration": 60},
+    "ramp": {"shape": "ramp", "rate": 30, "duration": 60},
+    "burst": {"shape": "burst", "rate": 40, "duration": 60},
+    "spike": {"shape": "spike", "rate": 50, "duration": 60},
+}
+
+SERVERS = {
+    "flask": [sys.executable, "-c", "import dynamic; dynamic.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+    "asgi": [sys.executable, "dynamic_asgi.py", "--host", "127.0.0.1", "--port", "{port}", "--workers", "1"],
+}
+
+# In-process memory is charged to the nearest project module on the allocation's stack
+COMPONENTS = {
+    "scaler": ("aws_Lambda.py", "control_plane.py", "state_store.py", "forecast.py", "scale_in.py",
+               "instrumentation.py", "aws_clients.py"),
+    "aws stand-in": ("local_aws.py",),
+    "workers": ("worker.py",),
+    "traffic": ("task_publisher.py", "bench_end_to_end.py"),
+}
+
+# (metric path, higher is better) checked by --compare
+TRACKED = (
+    ("latency.p50", False), ("latency.p99", False),
+    ("api.burst_rps", True), ("api.burst_p99_ms", False),
+    ("scaling.reaction_p50", False), ("scaling.capacity_p50", False),
+    ("memory.api_rss_mb", False), ("memory.traced_peak_mb", False),
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def proc_memory_mb(pid):
+    """(current RSS, peak RSS) of pid in MB from /proc; (None, None) elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def memory_by_component(snapshot):
+    totals = dict.fromkeys(list(COMPONENTS) + ["other"], 0)
+    owners = {name: component for component, names in COMPONENTS.items() for name in names}
+    for stat in snapshot.statistics("traceback"):
+        component = "other"
+        for frame in reversed(stat.traceback):  # innermost project frame wins
+            owner = owners.get(os.path.basename(frame.filename))
+            if owner is not None:
+                component = owner
+                break
+        totals[component] += stat.size
+    return {k: round(v / 2 ** 20, 2) for k, v in totals.items()}
+
+
+# -------------------------------
+# API
+# -------------------------------
+class ApiClient:
+    """Keep-alive JSON client for one thread."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+
+    def allocate(self, payload):
+        body = json.dumps(payload)
+        for attempt in range(2):
+            try:
+                self.conn.request("POST", "/allocate", body, {"Content-Type": "application/json"})
+                return json.loads(self.conn.getresponse().read())
+            except (http.client.HTTPException, OSError):
+                self.conn.close()  # dropped keep-alive: reconnect once
+                if attempt:
+                    raise
+
+
+def api_burst(port, requests, connections):
+    """Saturation throughput of POST /allocate: (requests/s, latencies in seconds, errors)."""
+    latencies, errors = [], [0]
+    per_thread = requests // connections
+
+    def run():
+        client = ApiClient(port)
+        rng = random.Random()
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            try:
+                if client.allocate({"task_load": rng.randint(1, 100)}).get("status") != "success":
+                    errors[0] += 1
+            except Exception:
+                errors[0] += 1
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=run) for _ in range(connections)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latencies) / (time.perf_counter() - start), latencies, errors[0]
+
+
+# -------------------------------
+# FLEET
+# -------------------------------
+class Serialized:
+    """One call at a time into a stand-in that is not thread-safe (the real API serializes too)."""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return value(*args, **kwargs)
+        return call
+
+
+class Fleet:
+    """A worker (and drain watcher) on every InService instance of the fake ASG."""
+
+    def __init__(self, asg, sqs, queue_url, store, slots, handler):
+        self.asg = asg
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.store = store
+        self.slots = slots
+        self.handler = handler
+        self.nodes = {}  # instance id -> (worker, watcher)
+        self.started = 0
+        self.stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fleet", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        import scale_in
+        from worker import Worker
+
+        while not self.stopped.wait(0.2):
+            group = self.asg.describe_auto_scaling_groups(AutoScalingGroupNames=[ASG])["AutoScalingGroups"][0]
+            present = {i["InstanceId"]: i["LifecycleState"] for i in group["Instances"]}
+            for iid, state in present.items():
+                if state == "InService" and iid not in self.nodes:
+                    worker = Worker(self.sqs, self.queue_url, self.handler, workers=self.slots,
+                                    wait_seconds=1, visibility=30).start()
+                    watcher = scale_in.DrainWatcher(self.asg, worker, iid, self.store, interval=0.5).start()
+                    self.nodes[iid] = (worker, watcher)
+                    self.started += 1
+            for iid in [i for i in self.nodes if i not in present]:
+                worker, watcher = self.nodes.pop(iid)
+                watcher.done.set()
+                # Gone without draining (hook timeout): its tasks go back to the queue
+                threading.Thread(target=worker.stop, kwargs={"drain": False}, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        self._thread.join()
+        for worker, watcher in self.nodes.values():
+            watcher.done.set()
+            worker.stop(drain=False)
+
+
+# -------------------------------
+# ONE PROFILE
+# -------------------------------
+def run_profile(name, profile, port, args):
+    import aws_Lambda
+    import scale_in
+    from control_plane import GuardedClient
+    from local_aws import FakeAutoScaling, FakeSNS, FakeSQS
+    from state_store import open_store
+    from task_publisher import rate_at
+
+    sqs = FakeSQS()
+    queue_url = sqs.create_queue(QueueName=f"e2e-{name}")["QueueUrl"]
+    asg = Serialized(FakeAutoScaling(boot_seconds=args.boot_seconds))
+    asg.create_group(ASG, desired=1, min_size=1, max_size=args.max_instances)
+    scale_in.install_drain_hook(asg, ASG)
+    store = open_store("memory://")
+    sns = FakeSNS()
+
+    aws_Lambda.POOLS = aws_Lambda.load_pools(json.dumps([{
+        "name": "e2e", "asg": ASG, "queue_url": queue_url, "cooldown_seconds": args.cooldown,
+        "max_instances": args.max_instances, "min_instances": 1,
+        "scale_in_mode": "drain",  # workers share the in-process store
+    }]))
+    aws_Lambda.autoscaling = GuardedClient(asg, "autoscaling")
+    aws_Lambda.sqs, aws_Lambda.sns, aws_Lambda.state_store = sqs, sns, store
+    aws_Lambda.METRICS_LOG = False
+    high = aws_Lambda.setting(aws_Lambda.POOLS[0], "HIGH_BACKLOG_THRESHOLD")
+
+    tasks = {}  # id -> [submitted, enqueued, started, finished]
+
+    def handler(body):
+        task = json.loads(body)
+        record = tasks[task["id"]]
+        record[2] = time.time()
+        time.sleep(task["seconds"])
+        record[3] = time.time()
+        return task["id"]
+
+    fleet = Fleet(asg, sqs, queue_url, store, args.slots, handler).start()
+    stop = threading.Event()
+
+    def scaler():
+        while not stop.wait(args.scaler_interval):
+            try:
+                aws_Lambda.lambda_handler({}, None)
+            except Exception as e:
+                sys.__stderr__.write(f"scaler failed: {e}\n")
+
+    # Timeline and reaction times, sampled every 0.1s
+    timeline, reactions, capacity_times, scale_ups = [], [], [], [0]
+    t0 = time.time()
+
+    def monitor():
+        warranted_since = raised_at = None
+        last_desired = None
+        while not stop.wait(0.1):
+            attrs = sqs.get_queue_attributes(QueueUrl=queue_url)["Attributes"]
+            backlog = int(attrs["ApproximateNumberOfMessages"]) + int(attrs["ApproximateNumberOfMessagesNotVisible"])
+            group = asg.groups[ASG]
+            desired = group["DesiredCapacity"]
+            running = len(fleet.nodes)
+            now = time.time()
+            if not timeline or now - t0 - timeline[-1][0] >= 0.5:
+                timeline.append((round(now - t0, 1), backlog, running, desired))
+            if last_desired is not None and desired > last_desired:
+                scale_ups[0] += 1
+                if warranted_since is not None:
+                    reactions.append(now - warranted_since)
+                warranted_since, raised_at = None, (now, desired)
+            last_desired = desired
+            if raised_at is not None and running >= raised_at[1]:
+                capacity_times.append(now - raised_at[0])
+                raised_at = None
+            if warranted_since is None and backlog / max(running, 1) > high and desired < args.max_instances:
+                warranted_since = now
+
+    # Traffic: a dispatcher releases tasks on the profile's rate; clients allocate and enqueue them
+    due = queue.Queue()
+    api_latencies, api_errors = [], [0]
+
+    def client():
+        api = ApiClient(port)
+        rng = random.Random()
+        while True:
+            token = due.get()
+            if token is None:
+                return
+            submitted = time.time()
+            start = time.perf_counter()
+            try:
+                result = api.allocate({"task_load": rng.randint(1, 100), "task_type": "batch"})
+                ok = result.get("status") == "success"
+            except Exception:
+                ok = False
+            api_latencies.append(time.perf_counter() - start)
+            if not ok:
+                api_errors[0] += 1
+                continue
+            task_id = f"{name}-{token}"
+            tasks[task_id] = [submitted, time.time(), None, None]
+            seconds = args.task_seconds * rng.uniform(0.5, 1.5)
+            sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(
+                {"id": task_id, "seconds": seconds, "allocation": result["allocation"]}))
+
+    background = [threading.Thread(target=f, daemon=True) for f in (scaler, monitor)]
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+    for t in background + clients:
+        t.start()
+
+    duration = profile["duration"]
+    released, owed, start = 0, 0.0, time.perf_counter()
+    while True:
+        now = time.perf_counter() - start
+        if now >= duration:
+            break
+        owed += rate_at(profile["shape"], now, profile["rate"], duration) * 0.05
+        while released < int(owed):
+            due.put(released)
+            released += 1
+        time.sleep(0.05)
+    for _ in clients:
+        due.put(None)
+    for t in clients:
+        t.join()
+    traffic_seconds = time.perf_counter() - start
+
+    snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+    drain_deadline = time.time() + args.drain_timeout
+    while time.time() < drain_deadline and any(r[3] is None for r in list(tasks.values())):
+        time.sleep(0.2)
+
+    stop.set()
+    for t in background:
+        t.join()
+    fleet.stop()
+
+    done = [r for r in tasks.values() if r[3] is not None]
+    latency = [r[3] - r[0] for r in done]
+    waits = [r[2] - r[1] for r in done]
+    result = {
+        "profile": dict(profile),
+        "tasks": {"released": released, "enqueued": len(tasks), "completed": len(done),
+                  "unfinished": len(tasks) - len(done), "api_errors": api_errors[0]},
+        "latency": {"p50": percentile(latency, 50), "p90": percentile(latency, 90),
+                    "p99": percentile(latency, 99), "max": max(latency, default=None),
+                    "queue_wait_p50": percentile(waits, 50), "queue_wait_p99": percentile(waits, 99)},
+        "api": {"run_rps": len(api_latencies) / traffic_seconds,
+                "run_p50_ms": (percentile(api_latencies, 50) or 0) * 1000,
+                "run_p99_ms": (percentile(api_latencies, 99) or 0) * 1000},
+        "scaling": {"scale_ups": scale_ups[0],
+                    "reaction_p50": percentile(reactions, 50), "reaction_max": max(reactions, default=None),
+                    "capacity_p50": percentile(capacity_times, 50), "capacity_max": max(capacity_times, default=None),
+                    "peak_instances": max((row[2] for row in timeline), default=0),
+                    "instances_started": fleet.started, "alerts_sent": len(sns.messages)},
+        "timeline": timeline,
+    }
+    if snapshot is not None:
+        result["memory_by_component_mb"] = memory_by_component(snapshot)
+    return result
+
+
+# -------------------------------
+# REPORTING
+# -------------------------------
+def lookup(data, path):
+    for key in path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every tracked metric; the second value is True if any regressed."""
+    lines, regressed = [], False
+    for profile, run in results["runs"].items():
+        base_run = baseline.get("runs", {}).get(profile)
+        if base_run is None:
+            continue
+        for path, higher_better in TRACKED:
+            now, before = lookup(run, path), lookup(base_run, path)
+            if now is None or not before:
+                continue
+            change = (now - before) / before
+            worse = -change if higher_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            regressed |= bool(flag)
+            lines.append(f"{profile:<8} {path:<22} {before:>10.3f} -> {now:>10.3f} ({change:+.0%}) {flag}")
+    return lines, regressed
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def fmt(value, spec=".2f"):
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end allocate -> queue -> scale benchmark")
+    parser.add_argument("--profiles", nargs="*", default=["steady", "spike"], choices=sorted(PROFILES))
+    parser.add_argument("--shape", default=None, help="override every profile's traffic shape")
+    parser.add_argument("--rate", type=float, default=None, help="override peak tasks/s")
+    parser.add_argument("--duration", type=float, default=None, help="override traffic seconds")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="flask")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent API clients")
+    parser.add_argument("--api-requests", type=int, default=2000, help="saturation burst before the profiles")
+    parser.add_argument("--task-seconds", type=float, default=0.5, help="mean task run time")
+    parser.add_argument("--slots", type=int, default=4, help="concurrent tasks per instance")
+    parser.add_argument("--max-instances", type=int, default=8)
+    parser.add_argument("--boot-seconds", type=float, default=3)
+    parser.add_argument("--cooldown", type=float, default=5)
+    parser.add_argument("--scaler-interval", type=float, default=2)
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip in-process memory attribution")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="keep scaler and worker logs")
+    args = parser.parse_args()
+
+    if not args.no_tracemalloc:
+        tracemalloc.start(16)
+
+    port = free_port()
+    cmd = [part.replace("{port}", str(port)) for part in SERVERS[args.server]]
+    server = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {"meta": {"commit": git_commit(), "python": platform.python_version(), "cpus": os.cpu_count(),
+                        "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args)}, "runs": {}}
+    try:
+        wait_for_port(port)
+        rps, latencies, errors = api_burst(port, args.api_requests, args.clients)
+        results["api_burst"] = {"requests": len(latencies), "rps": rps, "errors": errors,
+                                "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000}
+        log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with log:
+            for name in args.profiles:
+                profile = dict(PROFILES[name])
+                for key in ("shape", "rate", "duration"):
+                    if getattr(args, key) is not None:
+                        profile[key] = getattr(args, key)
+                run = run_profile(name, profile, port, args)
+                run["api"].update(burst_rps=rps, burst_p99_ms=results["api_burst"]["p99_ms"])
+                results["runs"][name] = run
+        api_rss, api_peak = proc_memory_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    traced_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if tracemalloc.is_tracing() else None
+    memory = {"api_rss_mb": api_rss, "api_peak_rss_mb": api_peak,
+              "harness_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+              "traced_peak_mb": traced_peak}
+    for run in results["runs"].values():
+        run["memory"] = dict(memory, by_component_mb=run.pop("memory_by_component_mb", None))
+
+    burst = results["api_burst"]
+    print(f"commit {results['meta']['commit']}, {args.server} API: {burst['rps']:.0f} req/s saturated "
+          f"(p50 {burst['p50_ms']:.1f} ms, p99 {burst['p99_ms']:.1f} ms, {burst['errors']} errors)")
+    print(f"{'profile':<8} | {'tasks':>6} | {'unfin':>5} | {'e2e p50 s':>9} | {'e2e p99 s':>9} | {'api req/s':>9} | "
+          f"{'react s':>7} | {'capacity s':>10} | {'peak inst':>9} | {'alerts':>6}")
+    for name, run in results["runs"].items():
+        t, lat, api, sc = run["tasks"], run["latency"], run["api"], run["scaling"]
+        print(f"{name:<8} | {t['completed']:>6} | {t['unfinished']:>5} | {fmt(lat['p50']):>9} | {fmt(lat['p99']):>9} | "
+              f"{api['run_rps']:>9.1f} | {fmt(sc['reaction_p50'], '.1f'):>7} | {fmt(sc['capacity_p50'], '.1f'):>10} | "
+              f"{sc['peak_instances']:>9} | {sc['alerts_sent']:>6}")
+    print(f"memory: API RSS {fmt(memory['api_rss_mb'], '.1f')} MB (peak {fmt(memory['api_peak_rss_mb'], '.1f')}), "
+          f"harness peak RSS {memory['harness_peak_rss_mb']:.1f} MB, traced peak {fmt(traced_peak, '.1f')} MB")
+    for name, run in results["runs"].items():
+        parts = run["memory"]["by_component_mb"]
+        if parts:
+            print(f"  {name:<8} in-process MB at end of traffic: " + ", ".join(f"{k} {v:.2f}" for k, v in parts.items()))
+
+    if args.json:
+        text = json.dumps(results, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w") as f:
+                f.write(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print(f"vs {args.compare} (commit {baseline.get('meta', {}).get('commit')}), tolerance {args.tolerance:.0%}:")
+        for line in lines:
+            print("  " + line)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
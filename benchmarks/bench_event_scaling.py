@@ -0,0 +1,116 @@
+# Filename: bench_event_scaling.py
+#
+# Reaction time and AWS read calls: scheduled polling (lambda_handler every
+# --interval seconds) versus the event-driven scaler, on the same virtual
+# timeline with bursty arrivals, instance boot latency and FIFO service.
+# Usage: python benchmarks/bench_event_scaling.py [--minutes 40] [--interval 60]
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STATE_STORE_URL", "memory://")
+os.environ["METRICS_LOG"] = "0"
+
+import aws_Lambda
+from event_bus import EventBus
+from event_scaler import EventDrivenScaler
+from local_aws import FakeAutoScaling, FakeSNS, FakeSQS
+
+
+def arrival_rate(t):
+    """Tasks/second: light background with two one-minute bursts."""
+    return 40.0 if 300 <= t < 360 or 1500 <= t < 1560 else 0.2
+
+
+class _BusTime:
+    def __init__(self, bus):
+        self.bus = bus
+
+    def time(self):
+        return self.bus.now
+
+
+def run(mode, minutes, interval, service_rate, boot_seconds):
+    bus = EventBus(threaded=False)
+    asg, sqs = FakeAutoScaling(boot_seconds=boot_seconds, bus=bus), FakeSQS()
+    asg.create_group(aws_Lambda.ASG_NAME, desired=1, max_size=aws_Lambda.MAX_INSTANCES)
+    queue_url = sqs.create_queue(QueueName="cpu-task-queue")["QueueUrl"]
+    queue = sqs.queues[queue_url]["messages"]
+    bus.run(0)  # initial lifecycle events predate the scaler
+
+    aws_Lambda.autoscaling, aws_Lambda.sqs, aws_Lambda.sns = asg, sqs, FakeSNS()
+    aws_Lambda.state_store = aws_Lambda.open_store("memory://")
+    aws_Lambda.time = _BusTime(bus)
+    pool = {"name": aws_Lambda.ASG_NAME, "asg": aws_Lambda.ASG_NAME, "queue_url": queue_url, "metrics_prefix": ""}
+    aws_Lambda.POOLS = [pool]
+
+    stats = {"first_up": None, "peak": 0, "backlog_seconds": 0.0}
+    due = {"arrive": 0.0, "serve": 0.0}
+
+    def second():
+        t = bus.now
+        due["arrive"] += arrival_rate(t)
+        n = int(due["arrive"])
+        if n:
+            due["arrive"] -= n
+            for start in range(0, n, 10):
+                entries = [{"Id": str(i), "MessageBody": "{}"} for i in range(min(10, n - start))]
+                sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            bus.publish("tasks.enqueued", queue_url=queue_url, count=n)
+        in_service = sum(1 for i in asg.groups[pool["asg"]]["Instances"] if i["LifecycleState"] == "InService")
+        due["serve"] += in_service * service_rate
+        done = min(int(due["serve"]), len(queue))
+        for _ in range(done):
+            queue.popleft()
+        due["serve"] = due["serve"] - done if queue else 0.0  # idle capacity is not banked
+        if done:
+            bus.publish("tasks.completed", queue_url=queue_url, count=done)
+        stats["peak"] = max(stats["peak"], len(queue))
+        stats["backlog_seconds"] += len(queue)
+        if stats["first_up"] is None and asg.groups[pool["asg"]]["DesiredCapacity"] > 1:
+            stats["first_up"] = t
+        bus.call_later(1.0, second)
+
+    def poll():
+        aws_Lambda.lambda_handler({}, None)
+        bus.call_later(interval, poll)
+
+    bus.call_later(0, second)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "polling":
+            bus.call_later(0, poll)
+        else:
+            EventDrivenScaler(bus, aws_Lambda, [pool]).start()
+        bus.run(minutes * 60)
+    reads = asg.calls["describe_auto_scaling_groups"] + sqs.calls["get_queue_attributes"]
+    return {
+        "mode": mode,
+        "reaction": (stats["first_up"] - 300) if stats["first_up"] is not None else float("nan"),
+        "peak": stats["peak"],
+        "avg_wait": stats["backlog_seconds"] / max(1.0, sum(arrival_rate(t) for t in range(minutes * 60))),
+        "reads": reads,
+        "scale_actions": asg.calls["update_auto_scaling_group"] + asg.calls["terminate_instance_in_auto_scaling_group"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Polling vs event-driven scaling")
+    parser.add_argument("--minutes", type=int, default=40)
+    parser.add_argument("--interval", type=float, default=60, help="polling interval (s)")
+    parser.add_argument("--service-rate", type=float, default=0.5, help="tasks/s per instance")
+    parser.add_argument("--boot", type=float, default=90, help="instance boot seconds")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} | {'reaction s':>10} | {'peak backlog':>12} | {'avg wait s':>10} | {'AWS reads':>9} | {'scale actions':>13}")
+    for mode in ("polling", "events"):
+        r = run(mode, args.minutes, args.interval, args.service_rate, args.boot)
+        print(f"{r['mode']:<8} | {r['reaction']:>10.0f} | {r['peak']:>12} | {r['avg_wait']:>10.1f} | "
+              f"{r['reads']:>9} | {r['scale_actions']:>13}")
+
+
+if __name__ == "__main__":
+    main()
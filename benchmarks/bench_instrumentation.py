@@ -0,0 +1,75 @@
+# Filename: bench_instrumentation.py
+#
+# Per-call overhead of the instrumentation layer on the allocation hot path.
+# Usage: python benchmarks/bench_instrumentation.py [--calls 200000] [--threads 4]
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrumentation import Registry, timed, timer
+from policies import PolicyRegistry
+
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter_ns()
+    for i in range(calls):
+        fn(i % 101)
+    return (time.perf_counter_ns() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instrumentation overhead benchmark")
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    registry = Registry()
+    policy = PolicyRegistry().get()
+    histogram = registry.histogram("bench_seconds")
+    counter = registry.counter("bench_total")
+
+    @timed("bench_timed_seconds", registry=registry)
+    def decorated(load):
+        return policy.lookup(load)
+
+    def with_timer(load):
+        with timer("bench_timer_seconds", registry=registry):
+            return policy.lookup(load)
+
+    baseline = per_call_ns(policy.lookup, args.calls)
+    rows = [
+        ("lookup (no instrumentation)", baseline),
+        ("counter.inc", per_call_ns(lambda _: counter.inc(), args.calls)),
+        ("histogram.record_ns", per_call_ns(histogram.record_ns, args.calls)),
+        ("@timed lookup", per_call_ns(decorated, args.calls)),
+        ("timer() lookup", per_call_ns(with_timer, args.calls)),
+    ]
+    for name, ns in rows:
+        extra = f"  (+{ns - baseline:.0f} ns)" if "lookup" in name and ns != baseline else ""
+        print(f"{name:<30} {ns:8.0f} ns/call{extra}")
+
+    # Contended: every thread records into the same histogram
+    threads = [threading.Thread(target=per_call_ns, args=(decorated, args.calls // args.threads))
+               for _ in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    snap = registry.snapshot()["bench_timed_seconds"]
+    print(f"{args.threads} threads: {args.calls / elapsed:,.0f} calls/s, "
+          f"count={snap['count']} p50={snap['quantiles'][0.5] * 1e9:.0f}ns p99={snap['quantiles'][0.99] * 1e9:.0f}ns")
+
+    start = time.perf_counter()
+    text = registry.prometheus()
+    print(f"prometheus render: {(time.perf_counter() - start) * 1000:.2f} ms, {len(text)} bytes")
+
+
+if __name__ == "__main__":
+    main()
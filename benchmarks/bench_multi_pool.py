@@ -0,0 +1,71 @@
+# Filename: bench_multi_pool.py
+#
+# One scaling invocation for N worker pools versus one invocation per pool,
+# against the local_aws stand-ins with a per-call latency.
+# Usage: python benchmarks/bench_multi_pool.py [--pools 120] [--latency 0.02]
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-north-1")
+os.environ.setdefault("STATE_STORE_URL", "memory://")
+os.environ["METRICS_LOG"] = "0"
+
+import aws_Lambda
+from local_aws import FakeAutoScaling, FakeSNS, FakeSQS
+
+
+def setup(n_pools, latency, seed):
+    rng = random.Random(seed)
+    asg, sqs = FakeAutoScaling(), FakeSQS()
+    pools = []
+    for i in range(n_pools):
+        name = f"pool-{i:03d}"
+        asg.create_group(name, desired=rng.randint(1, 4), max_size=20)
+        url = sqs.create_queue(QueueName=f"{name}-tasks")["QueueUrl"]
+        for _ in range(rng.choice([0, 5, 40, 120])):
+            sqs.send_message(QueueUrl=url, MessageBody="{}")
+        pools.append({"name": name, "asg": name, "queue_url": url,
+                      "high_backlog_threshold": rng.choice([5, 10, 20]), "max_instances": 20})
+    asg.latency = sqs.latency = latency  # seeding above runs at full speed
+    aws_Lambda.autoscaling, aws_Lambda.sqs, aws_Lambda.sns = asg, sqs, FakeSNS()
+    aws_Lambda.state_store = aws_Lambda.open_store("memory://")
+    return asg, sqs, pools
+
+
+def run(label, pool_groups, asg, sqs):
+    before = sum(asg.calls.values()) + sum(sqs.calls.values())
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for group in pool_groups:
+            aws_Lambda.POOLS = group
+            aws_Lambda.lambda_handler({}, None)
+    elapsed = time.perf_counter() - start
+    calls = sum(asg.calls.values()) + sum(sqs.calls.values()) - before
+    actions = asg.calls["update_auto_scaling_group"] + asg.calls["terminate_instance_in_auto_scaling_group"]
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  {calls:5d} API calls  ({actions} scale actions so far)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-pool scaling benchmark")
+    parser.add_argument("--pools", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in per-call latency (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    asg, sqs, pools = setup(args.pools, args.latency, args.seed)
+    print(f"{args.pools} pools, {args.latency * 1000:.0f} ms per API call")
+    run("one invocation per pool", [[p] for p in pools], asg, sqs)
+
+    asg, sqs, pools = setup(args.pools, args.latency, args.seed)
+    run("single multi-pool handler", [pools], asg, sqs)
+
+
+if __name__ == "__main__":
+    main()
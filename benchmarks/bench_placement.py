@@ -0,0 +1,65 @@
+# Filename: bench_placement.py
+#
+# Per-task placement cost at fleet scale (default 10k nodes, 100k tasks),
+# then the adversarial case for the index: nodes that fit on cpu or on
+# memory but never both, so the per-dimension maxima cannot prune and every
+# search walks the whole fleet.
+# Usage: python benchmarks/bench_placement.py [--nodes 10000] [--tasks 100000] [--adversarial-tasks 200]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import placement
+from policies import PolicyRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Placement engine benchmark")
+    parser.add_argument("--nodes", type=int, default=10_000)
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--adversarial-tasks", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    policy = PolicyRegistry().get()
+    tasks = [policy.lookup(rng.randint(0, 100)) for _ in range(args.tasks)]
+    nodes = [dict(placement.DEFAULT_INSTANCE_CAPACITY, id=f"i-{n:05d}") for n in range(args.nodes)]
+    lower_bound = max(sum(t[r] for t in tasks) / placement.DEFAULT_INSTANCE_CAPACITY[r] for r in placement.RESOURCES)
+
+    print(f"sortedcontainers: {'yes' if placement.SortedList is not None else 'no (bisect fallback)'}")
+    print(f"lower bound (busiest dimension): {lower_bound:.0f} instances")
+    print(f"{'strategy':>10} | {'order':>10} | {'us/task':>8} | {'needed':>7} | {'new':>5} | {'unplaced':>8}")
+    for strategy in placement.STRATEGIES:
+        for decreasing in (False, True):
+            placer = placement.Placer(nodes, placement.DEFAULT_INSTANCE_CAPACITY, strategy)
+            start = time.perf_counter()
+            result = placer.place_all(tasks, decreasing=decreasing)
+            per_task = (time.perf_counter() - start) / len(tasks) * 1e6
+            order = "decreasing" if decreasing else "arrival"
+            print(f"{strategy:>10} | {order:>10} | {per_task:8.2f} | {result['instances_needed']:>7} | "
+                  f"{result['new_instances']:>5} | {len(result['unplaced']):>8}")
+
+    # Alternate cpu-rich/memory-poor and cpu-poor/memory-rich nodes: every
+    # subtree's maxima cover the task, no node does, and nothing ever fits.
+    skewed = [{"cpu": 8, "memory": 2, "storage": 500}, {"cpu": 1, "memory": 32, "storage": 500}]
+    nodes = [dict(skewed[n % 2], id=f"i-{n:05d}") for n in range(args.nodes)]
+    task = {"cpu": 4, "memory": 16, "storage": 10}
+    print(f"\nadversarial: {args.nodes} nodes fitting on cpu or memory only, {args.adversarial_tasks} tasks fitting none")
+    print(f"{'strategy':>10} | {'us/task':>10}")
+    for strategy in placement.STRATEGIES:
+        placer = placement.Placer(nodes, None, strategy)
+        start = time.perf_counter()
+        result = placer.place_all([task] * args.adversarial_tasks)
+        per_task = (time.perf_counter() - start) / args.adversarial_tasks * 1e6
+        assert len(result["unplaced"]) == args.adversarial_tasks
+        print(f"{strategy:>10} | {per_task:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
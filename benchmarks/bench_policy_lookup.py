@@ -0,0 +1,51 @@
+# Filename: bench_policy_lookup.py
+#
+# Microbenchmark: precompiled policy lookup vs evaluating the rules per call.
+# Usage: python benchmarks/bench_policy_lookup.py [--config policies.json]
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from policies import PolicyRegistry
+
+
+def original_clamps(task_load):
+    # The hard-coded sizing dynamic.allocate_resources used before policies
+    cpu = min(max(task_load // 10, 1), 8)
+    memory = min(max(task_load * 0.5, 1), 32)
+    storage = min(max(task_load * 2, 10), 500)
+    return {"cpu": cpu, "memory": memory, "storage": storage}
+
+
+def bench(fn, loads, repeat):
+    best = min(timeit.repeat(lambda: [fn(t) for t in loads], number=1, repeat=repeat))
+    return best / len(loads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Policy lookup microbenchmark")
+    parser.add_argument("--config", default=os.path.join(ROOT, "policies.json"))
+    parser.add_argument("--loads", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registry = PolicyRegistry(args.config)
+    loads = [random.randint(0, 100) for _ in range(args.loads)]
+
+    print(f"{'policy':>12} | {'evaluate ns/op':>15} | {'lookup ns/op':>13}")
+    print(f"{'(inline)':>12} | {bench(original_clamps, loads, args.repeat):15.1f} | {'-':>13}")
+    for name in registry.describe()["policies"]:
+        policy = registry.get(name)
+        evaluate_ns = bench(policy.evaluate, loads, args.repeat)
+        lookup_ns = bench(policy.lookup, loads, args.repeat)
+        print(f"{name:>12} | {evaluate_ns:15.1f} | {lookup_ns:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
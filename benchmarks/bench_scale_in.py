@@ -0,0 +1,188 @@
+# Filename: bench_scale_in.py
+#
+# Work lost to scale-in, on virtual time. Load alternates between busy and
+# quiet phases; at each quiet phase the fleet shrinks to --low instances:
+#   desired       lower DesiredCapacity, the ASG terminates the newest (today's Lambda)
+#   stop all      every worker stopped and replaced (today's "Stop Extra Workers")
+#   least-loaded  scale_in planner, no lifecycle hook
+#   drain         scale_in planner + termination hook: victims finish their tasks first
+# Killed tasks reappear after the visibility timeout and start over.
+# Usage: python benchmarks/bench_scale_in.py [--hours 6] [--phase 20] [--high 8] [--low 2]
+
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scale_in
+from event_bus import EventBus
+from local_aws import FakeAutoScaling
+from state_store import open_store
+
+ASG = "workers"
+SLOTS = 4              # concurrent tasks per instance
+VISIBILITY = 60        # worker visibility timeout (s)
+MODES = ("desired", "stop all", "least-loaded", "drain")
+
+
+class Fleet:
+    def __init__(self, mode, args, seed=1):
+        self.mode = mode
+        self.args = args
+        self.rng = random.Random(seed)
+        self.bus = EventBus(threaded=False)
+        self.asg = FakeAutoScaling(boot_seconds=60, bus=self.bus)
+        self.store = open_store("memory://")
+        self.queue = []        # (arrival time, duration)
+        self.running = {}      # instance id -> {token: (start, arrival, duration)}
+        self.draining = set()
+        self.reporters = {}
+        self.tokens = iter(range(10 ** 9))
+        self.stats = {"completed": 0, "killed": 0, "lost_seconds": 0.0, "latency": 0.0, "instance_seconds": 0.0}
+        self.asg.create_group(ASG, desired=args.high, min_size=1, max_size=args.high * 2)
+        if mode == "drain":
+            self.asg.put_lifecycle_hook(LifecycleHookName=scale_in.DRAIN_HOOK_NAME, AutoScalingGroupName=ASG,
+                                        LifecycleTransition=scale_in.TERMINATING_TRANSITION,
+                                        HeartbeatTimeout=scale_in.DRAIN_TIMEOUT, DefaultResult="CONTINUE")
+        self.bus.subscribe("instance.lifecycle", self.on_lifecycle)
+
+    @property
+    def group(self):
+        return self.asg.groups[ASG]
+
+    # --- workload ---
+    def arrive(self, rate):
+        for _ in range(self._poisson(rate)):
+            self.queue.append((self.bus.now, self.rng.uniform(30, 600)))
+        self.dispatch()
+
+    def _poisson(self, mean):
+        n, p, limit = 0, 1.0, math.exp(-mean)
+        while True:
+            p *= self.rng.random()
+            if p <= limit:
+                return n
+            n += 1
+
+    def dispatch(self):
+        for inst in self.group["Instances"]:
+            iid = inst["InstanceId"]
+            if inst["LifecycleState"] != "InService" or iid in self.draining:
+                continue
+            tasks = self.running.setdefault(iid, {})
+            while self.queue and len(tasks) < SLOTS:
+                arrival, duration = self.queue.pop(0)
+                token = next(self.tokens)
+                tasks[token] = (self.bus.now, arrival, duration)
+                self.bus.call_later(duration, self.finish, iid, token)
+
+    def finish(self, iid, token):
+        task = self.running.get(iid, {}).pop(token, None)
+        if task is None:
+            return  # killed
+        self.stats["completed"] += 1
+        self.stats["latency"] += self.bus.now - task[1]
+        self.release(iid)
+        self.dispatch()
+
+    def release(self, iid):
+        """A draining instance with nothing left running lets the termination continue."""
+        if iid in self.draining and not self.running.get(iid):
+            self.draining.discard(iid)
+            self.asg.complete_lifecycle_action(LifecycleHookName=scale_in.DRAIN_HOOK_NAME, AutoScalingGroupName=ASG,
+                                               LifecycleActionResult="CONTINUE", InstanceId=iid)
+
+    # --- instances ---
+    def on_lifecycle(self, event):
+        iid, state = event.payload["instance_id"], event.payload["state"]
+        if state == "InService":
+            self.dispatch()
+        elif state == "Terminating:Wait":
+            self.draining.add(iid)
+            self.bus.call_later(0, self.release, iid)
+        elif state == "Terminated":
+            self.draining.discard(iid)
+            for start, arrival, duration in self.running.pop(iid, {}).values():
+                self.stats["killed"] += 1
+                self.stats["lost_seconds"] += self.bus.now - start
+                self.bus.call_later(VISIBILITY, self.redeliver, arrival, duration)
+
+    def redeliver(self, arrival, duration):
+        self.queue.append((arrival, duration))
+        self.dispatch()
+
+    def report_loads(self):
+        for inst in self.group["Instances"]:
+            iid = inst["InstanceId"]
+            reporter = self.reporters.setdefault(iid, scale_in.LoadReporter(self.store, iid, ASG))
+            reporter.report(len(self.running.get(iid, {})), iid in self.draining, now=self.bus.now)
+
+    def shrink(self, target):
+        active = [i for i in self.group["Instances"] if not i["LifecycleState"].startswith("Terminating")]
+        count = len(active) - target
+        if count <= 0:
+            return
+        if self.mode == "desired":
+            self.asg.update_auto_scaling_group(AutoScalingGroupName=ASG, DesiredCapacity=target)
+        elif self.mode == "stop all":
+            self.asg.update_auto_scaling_group(AutoScalingGroupName=ASG, DesiredCapacity=target)
+            for inst in list(self.group["Instances"]):
+                self.asg.terminate_instance_in_auto_scaling_group(
+                    InstanceId=inst["InstanceId"], ShouldDecrementDesiredCapacity=False)
+        else:
+            loads = scale_in.worker_loads(self.store, [i["InstanceId"] for i in active], now=self.bus.now)
+            scale_in.scale_in(self.asg, active, count, loads=loads)
+
+    # --- run ---
+    def run(self):
+        args = self.args
+        phase = args.phase * 60
+        # A busy phase keeps about --high instances full; a quiet one about --low
+        per_slot = 1 / 315.0  # tasks/s one slot completes (mean duration 315s)
+
+        def tick():
+            busy = int(self.bus.now // phase) % 2 == 0
+            self.arrive((args.high if busy else args.low) * SLOTS * per_slot * 0.9)
+            self.stats["instance_seconds"] += len(self.group["Instances"])
+            self.bus.call_later(1.0, tick)
+
+        def phase_change():
+            if int(self.bus.now // phase) % 2 == 0:
+                self.asg.update_auto_scaling_group(AutoScalingGroupName=ASG, DesiredCapacity=args.high)
+            else:
+                self.shrink(args.low)
+            self.bus.call_later(phase, phase_change)
+
+        def report():
+            self.report_loads()
+            self.bus.call_later(scale_in.REPORT_SECONDS, report)
+
+        self.bus.call_later(0, tick)
+        self.bus.call_later(0, report)
+        self.bus.call_later(phase, phase_change)
+        self.bus.run(args.hours * 3600)
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scale-in lost-work simulation")
+    parser.add_argument("--hours", type=float, default=6)
+    parser.add_argument("--phase", type=float, default=20, help="minutes per busy/quiet phase")
+    parser.add_argument("--high", type=int, default=8)
+    parser.add_argument("--low", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'scale-in':<13} | {'completed':>9} | {'killed':>6} | {'lost task-h':>11} | "
+          f"{'mean latency s':>14} | {'instance-h':>10}")
+    for mode in MODES:
+        stats = Fleet(mode, args).run()
+        latency = stats["latency"] / max(1, stats["completed"])
+        print(f"{mode:<13} | {stats['completed']:>9} | {stats['killed']:>6} | {stats['lost_seconds'] / 3600:>11.1f} | "
+              f"{latency:>14.0f} | {stats['instance_seconds'] / 3600:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Filename: bench_serving.py
+#
+# Local load generator for the allocator API. Starts each serving mode on a
+# local port, drives POST /allocate from concurrent keep-alive connections
+# and reports p50/p99 latency and requests/sec.
+# Usage: python benchmarks/bench_serving.py [--requests 20000] [--concurrency 64]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "flask": [sys.executable, "-c", "import dynamic; dynamic.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+    "asgi": [sys.executable, "dynamic_asgi.py", "--host", "127.0.0.1", "--port", "{port}", "--workers", "{workers}"],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed connection")
+    length = 0
+    close = status_line.startswith(b"HTTP/1.0")
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"connection":
+            close = value.strip().lower() == b"close"
+    await reader.readexactly(length)
+    return status_line.split()[1], close
+
+
+async def client(port, count, latencies, errors):
+    reader = writer = None
+    for _ in range(count):
+        body = json.dumps({"task_load": random.randint(0, 100)}).encode()
+        request = (b"POST /allocate HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                   b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            status, close = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != b"200":
+                errors.append(status)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ConnectionError) as e:
+            errors.append(str(e))
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(port, total, concurrency):
+    latencies, errors = [], []
+    per_client = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, n, latencies, errors) for n in per_client if n))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def bench_mode(mode, args):
+    port = free_port()
+    cmd = [part.format(port=port, workers=args.workers) for part in MODES[mode]]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env=dict(os.environ, ALLOCATOR_POLICY_WATCH_SECONDS="0"))
+    try:
+        wait_for_port(port)
+        asyncio.run(run_load(port, min(200, args.requests), args.concurrency))  # warm-up
+        latencies, errors, elapsed = asyncio.run(run_load(port, args.requests, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serving-mode load benchmark")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="ASGI worker processes")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [bench_mode(mode, args) for mode in args.modes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':>6} | {'requests':>8} | {'errors':>6} | {'req/s':>9} | {'p50 ms':>7} | {'p99 ms':>7}")
+    for r in results:
+        print(f"{r['mode']:>6} | {r['requests']:>8} | {r['errors']:>6} | {r['rps']:9.0f} | {r['p50_ms']:7.2f} | {r['p99_ms']:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Filename: bench_simulator.py
+#
+# Replay speed of the autoscaling simulator: one month of per-minute steps,
+# then a small parameter sweep serially and on the process pool.
+# Usage: python benchmarks/bench_simulator.py [--days 30] [--workers N]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulator
+
+GRID = {"HIGH_BACKLOG_THRESHOLD": [5, 10, 20], "COOLDOWN_SECONDS": [60, 300]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulator replay benchmark")
+    parser.add_argument("--trace", default="diurnal:40")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    trace = simulator.load_trace(args.trace, args.days)
+    result = simulator.simulate(trace)
+    steps_per_sec = len(trace) / result["wall_seconds"]
+    print(f"single replay: {len(trace)} steps in {result['wall_seconds']:.2f}s ({steps_per_sec:,.0f} steps/s)")
+
+    short = trace[:1440 * 7]
+    combos = len(GRID["HIGH_BACKLOG_THRESHOLD"]) * len(GRID["COOLDOWN_SECONDS"])
+    start = time.perf_counter()
+    for high in GRID["HIGH_BACKLOG_THRESHOLD"]:
+        for cooldown in GRID["COOLDOWN_SECONDS"]:
+            simulator.simulate(short, {"HIGH_BACKLOG_THRESHOLD": high, "COOLDOWN_SECONDS": cooldown})
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    simulator.sweep(short, GRID, workers=args.workers)
+    parallel = time.perf_counter() - start
+    print(f"sweep of {combos} x 7 days: serial {serial:.2f}s, pool({args.workers}) {parallel:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
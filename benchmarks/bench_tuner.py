@@ -0,0 +1,57 @@
+# Filename: bench_tuner.py
+#
+# Cost of tuning: raw decide_capacity calls, one replay through the full
+# handler vs. decisions only (results must match), and a small tuner grid.
+# Usage: python benchmarks/bench_tuner.py [--days 30] [--workers N]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_Lambda
+import simulator
+import tuner
+
+GRID = {"HIGH_BACKLOG_THRESHOLD": [5, 10, 20], "COOLDOWN_SECONDS": [60, 300], "MAX_INSTANCES": [5, 20]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tuner benchmark")
+    parser.add_argument("--trace", default="diurnal:40")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    cfg = aws_Lambda.pool_settings(aws_Lambda.POOLS[0])
+    decide = aws_Lambda.decide_capacity
+    start = time.perf_counter()
+    for i in range(args.calls):
+        decide(cfg, 3, 3, i % 50, i * 60.0, 0)
+    elapsed = time.perf_counter() - start
+    print(f"decide_capacity: {args.calls:,} calls in {elapsed:.2f}s ({args.calls / elapsed:,.0f}/s)")
+
+    trace = simulator.load_trace(args.trace, args.days)
+    full = simulator.simulate(trace)
+    fast = simulator.simulate(trace, fast=True)
+    same = all(full[k] == fast[k] for k in full if k != "wall_seconds")
+    print(f"replay of {len(trace)} steps: handler {full['wall_seconds']:.2f}s, "
+          f"decisions only {fast['wall_seconds']:.2f}s ({full['wall_seconds'] / fast['wall_seconds']:.1f}x), "
+          f"same results: {same}")
+
+    short = trace[:1440 * 7]
+    evaluate = tuner.Evaluator(short, workers=args.workers)
+    start = time.perf_counter()
+    results = tuner.grid_search(evaluate, GRID)
+    elapsed = time.perf_counter() - start
+    evaluate.close()
+    front = tuner.pareto_front(results)
+    print(f"grid of {len(results)} x 7 days on {evaluate.workers} process(es): {elapsed:.2f}s, "
+          f"{len(front)} on the frontier")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Filename: bench_worker.py
+#
+# Consumer throughput against the in-process SQS stand-in (with per-call
+# latency): a one-message-at-a-time receive/process/delete loop versus
+# worker.Worker at several pool sizes, then a long-task run checking that
+# visibility extension prevents redelivery.
+# Usage: python benchmarks/bench_worker.py [--tasks 2000] [--task-ms 20] [--latency 0.01]
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_aws import FakeSQS
+from task_publisher import TaskPublisher, make_task
+from worker import Worker, run_task
+
+
+def seeded_queue(tasks, seconds, latency, visibility=30):
+    sqs = FakeSQS()
+    queue_url = sqs.create_queue(QueueName="cpu-task-queue", Attributes={"VisibilityTimeout": str(visibility)})["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url)
+    publisher.publish([make_task("IO", seconds=seconds) for _ in range(tasks)])
+    publisher.close()
+    sqs.calls.clear()
+    sqs.latency = latency  # seeding does not pay it
+    return sqs, queue_url
+
+
+def naive(sqs, queue_url, tasks):
+    done = 0
+    while done < tasks:
+        for message in sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=1).get("Messages", []):
+            run_task(message["Body"])
+            sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=message["ReceiptHandle"])
+            done += 1
+    return done
+
+
+def run(label, tasks, seconds, latency, workers=None):
+    sqs, queue_url = seeded_queue(tasks, seconds, latency)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if workers is None:
+            done = naive(sqs, queue_url, tasks)
+        else:
+            worker = Worker(sqs, queue_url, workers=workers, mode="thread", wait_seconds=1)
+            done = worker.start().run_until_empty(idle_seconds=0.3)["deleted"]
+    elapsed = time.perf_counter() - start - (0.3 if workers else 0)
+    calls = sum(sqs.calls.values())
+    return label, done, done / elapsed, calls / max(1, done)
+
+
+def long_tasks(latency):
+    """Tasks 2.5x longer than the visibility timeout."""
+    sqs, queue_url = seeded_queue(8, 2.5, latency, visibility=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = Worker(sqs, queue_url, workers=8, mode="thread", visibility=1, wait_seconds=1).start().run_until_empty(0.3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQS worker throughput benchmark")
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--task-ms", type=float, default=20, help="I/O-bound task duration")
+    parser.add_argument("--latency", type=float, default=0.01, help="stand-in per-call latency (s)")
+    args = parser.parse_args()
+    seconds = args.task_ms / 1000
+
+    rows = [run("naive loop", min(args.tasks, 300), seconds, args.latency)]
+    for workers in (1, 8, 32, 64):
+        rows.append(run(f"worker x{workers}", args.tasks if workers > 1 else min(args.tasks, 300),
+                        seconds, args.latency, workers))
+    print(f"{'consumer':<12} | {'tasks':>6} | {'tasks/s':>8} | {'SQS calls/task':>14}")
+    for label, done, rate, per_task in rows:
+        print(f"{label:<12} | {done:>6} | {rate:>8.0f} | {per_task:>14.2f}")
+
+    stats = long_tasks(args.latency)
+    print(f"long tasks (2.5s, visibility 1s): processed={stats.get('processed', 0)} "
+          f"redelivered={stats.get('redelivered', 0)} extensions={stats.get('extended', 0)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Filename: capacity_model.py
+#
+# Resource-aware capacity: turn a backlog of tasks into the number of
+# instances needed, using the cpu/memory/storage that the allocation
+# policies assign to each task and the real size of the ASG's instance
+# type, instead of a flat tasks-per-instance count.
+#
+# Instance specs come from a local catalog (instance_types.json, or
+# INSTANCE_CATALOG_FILE), loaded once per process. refresh() rewrites it
+# from EC2 describe_instance_types when the fleet adds a new type.
+
+import json
+import math
+import os
+import threading
+
+from placement import RESOURCES, instances_needed
+from policies import PolicyRegistry
+
+CATALOG_FILE = os.environ.get(
+    "INSTANCE_CATALOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance_types.json"))
+POLICY_FILE = os.environ.get(
+    "ALLOCATOR_POLICY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies.json"))
+
+# Backlogs larger than this are sized from a proportional sample of this many tasks
+PACKING_SAMPLE = 2000
+
+_catalogs = {}
+_registry = None
+_lock = threading.Lock()
+
+
+# -------------------------------
+# INSTANCE CATALOG
+# -------------------------------
+class InstanceCatalog:
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"INSTANCE CATALOG UNAVAILABLE ({e}); using defaults")
+            data = {}
+        self.default_type = data.get("default_type", "m5.2xlarge")
+        self.default_storage = data.get("default_storage", 500)
+        self.types = data.get("types", {})
+
+    def capacity(self, instance_type=None):
+        """{"cpu", "memory", "storage"} for instance_type (default type if unknown)."""
+        spec = self.types.get(instance_type) or self.types.get(self.default_type) or {"cpu": 8, "memory": 32}
+        return {"cpu": spec["cpu"], "memory": spec["memory"], "storage": spec.get("storage", self.default_storage)}
+
+    def __contains__(self, instance_type):
+        return instance_type in self.types
+
+    def refresh(self, ec2, instance_types):
+        """Add or update instance_types from EC2 and rewrite the catalog file."""
+        resp = ec2.describe_instance_types(InstanceTypes=list(instance_types))
+        for item in resp["InstanceTypes"]:
+            spec = {"cpu": item["VCpuInfo"]["DefaultVCpus"], "memory": item["MemoryInfo"]["SizeInMiB"] / 1024}
+            if item.get("InstanceStorageSupported"):
+                spec["storage"] = item["InstanceStorageInfo"]["TotalSizeInGB"]
+            self.types[item["InstanceType"]] = spec
+        data = {"default_type": self.default_type, "default_storage": self.default_storage, "types": self.types}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        return self
+
+
+def get_catalog(path=None):
+    path = path or CATALOG_FILE
+    catalog = _catalogs.get(path)
+    if catalog is None:
+        with _lock:
+            catalog = _catalogs.get(path)
+            if catalog is None:
+                catalog = _catalogs[path] = InstanceCatalog(path)
+    return catalog
+
+
+def get_policy_registry():
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _registry = PolicyRegistry(POLICY_FILE)
+    return _registry
+
+
+# -------------------------------
+# DEMAND
+# -------------------------------
+def expand_mix(load_mix, count):
+    """
+    count task loads distributed over load_mix ({load: weight}) by largest
+    remainder, so the sample is deterministic and proportional.
+    """
+    items = sorted((int(load), float(weight)) for load, weight in load_mix.items() if float(weight) > 0)
+    if not items or count <= 0:
+        return []
+    total = sum(w for _, w in items)
+    shares = [(load, count * w / total) for load, w in items]
+    counts = [int(share) for _, share in shares]
+    order = sorted(range(len(shares)), key=lambda i: shares[i][1] - counts[i], reverse=True)
+    for i in order[:count - sum(counts)]:
+        counts[i] += 1
+    return [load for (load, _), n in zip(shares, counts) for _ in range(n)]
+
+
+def allocations_for(loads, policy=None, workload_class=None):
+    """Per-task allocation dicts, exactly as dynamic.allocate_resources would size them."""
+    compiled = get_policy_registry().get(policy, workload_class)
+    return [compiled.lookup(load) for load in loads]
+
+
+def total_demand(allocations):
+    return {r: sum(a[r] for a in allocations) for r in RESOURCES}
+
+
+# -------------------------------
+# SIZING
+# -------------------------------
+def instances_for_backlog(backlog, load_mix, capacity, utilization=1.0, policy=None, workload_class=None):
+    """
+    Instances needed to run backlog tasks at once, packed onto nodes of
+    capacity scaled by utilization. Large backlogs pack a proportional
+    sample and scale the result. Tasks that do not fit a scaled node get an
+    instance each; "oversized" counts those that exceed even a whole one.
+    Returns: {"instances": int, "demand": {...}, "oversized": int}
+    """
+    if backlog <= 0:
+        return {"instances": 0, "demand": {r: 0 for r in RESOURCES}, "oversized": 0}
+    sample = min(backlog, PACKING_SAMPLE)
+    allocations = allocations_for(expand_mix(load_mix, sample), policy, workload_class)
+    template = {r: capacity[r] * utilization for r in RESOURCES}
+    fits = [a for a in allocations if all(a[r] <= template[r] for r in RESOURCES)]
+    packed = instances_needed(fits, node_template=template) + (len(allocations) - len(fits))
+    oversized = sum(1 for a in allocations if any(a[r] > capacity[r] for r in RESOURCES))
+    scale = backlog / sample
+    demand = total_demand(allocations)
+    return {
+        "instances": math.ceil(packed * scale),
+        "demand": {r: v * scale for r, v in demand.items()},
+        "oversized": math.ceil(oversized * scale),
+    }
@@ -0,0 +1,153 @@
+# Filename: cluster_snapshot.py
+#
+# Background collector for the dashboard. ASG, EC2 and SQS state are
+# fetched concurrently into one immutable ClusterSnapshot, which every
+# Streamlit session reads without making AWS calls. After a mutation the
+# caller invalidates only the keys it affected; the collector refetches
+# those and carries the rest over. Attached to an event bus, enqueue and
+# capacity events update the snapshot immediately, without an AWS call.
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+KEYS = ("asg", "instances", "backlog")
+
+ClusterSnapshot = namedtuple("ClusterSnapshot", ["asg", "instances", "backlog", "fetched_at", "errors"])
+
+EMPTY_ASG = {"Desired": 0, "Min": 0, "Max": 0, "Running": 0, "Instances": ()}
+EMPTY_SNAPSHOT = ClusterSnapshot(EMPTY_ASG, (), 0, {}, {})
+
+
+class SnapshotCollector:
+    """
+    clients: {"autoscaling": ..., "ec2": ..., "sqs": ...} boto3 clients
+    interval: seconds between full refreshes
+    on_snapshot: optional callback(snapshot) run on the collector thread
+    """
+
+    def __init__(self, clients, asg_name, queue_url, interval=15.0, on_snapshot=None):
+        self.autoscaling = clients["autoscaling"]
+        self.ec2 = clients["ec2"]
+        self.sqs = clients["sqs"]
+        self.asg_name = asg_name
+        self.queue_url = queue_url
+        self.interval = interval
+        self.on_snapshot = on_snapshot
+        self.snapshot = EMPTY_SNAPSHOT
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=len(KEYS), thread_name_prefix="snapshot")
+        self._thread = None
+
+    # -------------------------------
+    # FETCHERS: one AWS call each
+    # -------------------------------
+    def fetch_asg(self):
+        resp = self.autoscaling.describe_auto_scaling_groups(AutoScalingGroupNames=[self.asg_name])["AutoScalingGroups"][0]
+        instances = tuple(resp["Instances"])
+        return {
+            "Desired": resp["DesiredCapacity"],
+            "Min": resp["MinSize"],
+            "Max": resp["MaxSize"],
+            "Running": sum(1 for i in instances if i["LifecycleState"] == "InService"),
+            "Instances": instances,
+        }
+
+    def fetch_instances(self):
+        # Filter on the ASG's own tag so this does not wait for the ASG call
+        resp = self.ec2.describe_instances(Filters=[
+            {"Name": "tag:aws:autoscaling:groupName", "Values": [self.asg_name]},
+            {"Name": "instance-state-name", "Values": ["pending", "running", "stopping", "stopped"]},
+        ])
+        return tuple(
+            {"ID": inst["InstanceId"], "IP": inst.get("PublicIpAddress", "N/A"), "Status": inst["State"]["Name"].capitalize()}
+            for res in resp["Reservations"]
+            for inst in res["Instances"]
+        )
+
+    def fetch_backlog(self):
+        attr = self.sqs.get_queue_attributes(QueueUrl=self.queue_url, AttributeNames=["ApproximateNumberOfMessages"])
+        return int(attr["Attributes"].get("ApproximateNumberOfMessages", 0))
+
+    # -------------------------------
+    # COLLECTION
+    # -------------------------------
+    def collect(self, keys=KEYS):
+        """Fetch keys concurrently and publish a new snapshot. Failed keys keep their last value."""
+        fetchers = {"asg": self.fetch_asg, "instances": self.fetch_instances, "backlog": self.fetch_backlog}
+        futures = {key: self._pool.submit(fetchers[key]) for key in keys}
+        results, failures = {}, {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                failures[key] = str(e)
+        now = time.time()
+        with self._lock:
+            old = self.snapshot
+            values = dict(zip(KEYS, old[:len(KEYS)]), **results)
+            fetched_at = dict(old.fetched_at, **{key: now for key in results})
+            errors = dict({k: v for k, v in old.errors.items() if k not in keys}, **failures)
+            self.snapshot = ClusterSnapshot(values["asg"], values["instances"], values["backlog"], fetched_at, errors)
+        if self.on_snapshot is not None:
+            try:
+                self.on_snapshot(self.snapshot)
+            except Exception as e:
+                print(f"SNAPSHOT HOOK FAILED: {e}")
+        return self.snapshot
+
+    # -------------------------------
+    # EVENTS
+    # -------------------------------
+    def attach(self, bus):
+        for topic in ("tasks.enqueued", "tasks.completed", "queue.depth", "capacity.changed", "instance.lifecycle"):
+            bus.subscribe(topic, self.apply_event)
+        return self
+
+    def apply_event(self, event):
+        """Fold one bus event into the current snapshot."""
+        payload = event.payload
+        if payload.get("queue_url", self.queue_url) != self.queue_url or payload.get("asg", self.asg_name) != self.asg_name:
+            return
+        with self._lock:
+            snap = self.snapshot
+            if event.topic == "tasks.enqueued":
+                snap = snap._replace(backlog=snap.backlog + payload.get("count", 1))
+            elif event.topic == "tasks.completed":
+                snap = snap._replace(backlog=max(0, snap.backlog - payload.get("count", 1)))
+            elif event.topic == "queue.depth":
+                snap = snap._replace(backlog=int(payload["depth"]))
+            elif event.topic == "capacity.changed":
+                snap = snap._replace(asg=dict(snap.asg, Desired=payload["desired"]))
+            self.snapshot = snap
+        if event.topic in ("capacity.changed", "instance.lifecycle"):
+            self.invalidate("asg", "instances")  # instance list and IPs still come from AWS
+
+    def invalidate(self, *keys):
+        """Refetch keys (all if none given) in the background as soon as possible."""
+        with self._lock:
+            self._pending.update(keys or KEYS)
+        self._wake.set()
+
+    def _run(self):
+        next_full = time.time() + self.interval
+        while True:
+            self._wake.wait(timeout=max(0.0, next_full - time.time()))
+            self._wake.clear()
+            with self._lock:
+                keys, self._pending = self._pending, set()
+            if time.time() >= next_full:
+                keys, next_full = set(KEYS), time.time() + self.interval
+            if keys:
+                self.collect(tuple(k for k in KEYS if k in keys))
+
+    def start(self):
+        """First collection runs inline so the first render has data."""
+        if self._thread is None:
+            self.collect()
+            self._thread = threading.Thread(target=self._run, name="snapshot-collector", daemon=True)
+            self._thread.start()
+        return self
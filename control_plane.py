@@ -0,0 +1,368 @@
+# Filename: control_plane.py
+#
+# Guarded AWS control-plane calls, shared by the scaling Lambda and the GUI.
+#   - one token bucket per (service, region) keeps the process under the
+#     API's request rate; a throttled call halves the bucket's rate and
+#     successes win it back (AIMD, like botocore's adaptive mode)
+#   - throttling and transient errors are retried with full-jitter backoff
+#   - identical describe/get/list calls that overlap share one request
+#   - AlertDigest turns a run of alerts into one SNS message
+#
+# GuardedClient wraps a boto3 client or a local_aws stand-in, so all of it
+# runs against the fakes (which throttle with max_rate=...). Usually built
+# through aws_clients.LazyClient(..., guard=True).
+
+import json
+import os
+import random
+import threading
+import time
+
+from instrumentation import REGISTRY
+
+# Steady calls/second per service and process; AWS_RATE_LIMITS='{"autoscaling": 2}' overrides
+RATE_LIMITS = {"autoscaling": 5.0, "ec2": 20.0, "sns": 10.0, "sqs": 50.0, "lambda": 10.0}
+RATE_LIMITS.update(json.loads(os.environ.get("AWS_RATE_LIMITS", "{}")))
+DEFAULT_RATE = 10.0
+BURST_SECONDS = 2.0     # bucket size, in seconds of the full rate
+MIN_RATE_SHARE = 0.05   # throttling never lowers a bucket below this share of its rate
+ACQUIRE_TIMEOUT = float(os.environ.get("AWS_ACQUIRE_TIMEOUT", 30))
+MIN_WAIT = 0.001        # shortest wait for a token
+
+MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", 5))
+BACKOFF_BASE = 0.2      # first retry waits up to 2x this
+BACKOFF_CAP = 10.0
+
+COALESCE_PREFIXES = ("describe_", "get_", "list_")
+
+ALERT_DIGEST_SECONDS = float(os.environ.get("ALERT_DIGEST_SECONDS", 300))
+ALERT_DIGEST_MAX = 25   # pending alerts that force a digest out early
+
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "RequestLimitExceeded", "RequestThrottled", "SlowDown",
+    "ProvisionedThroughputExceededException",
+}
+TRANSIENT_CODES = {
+    "InternalError", "InternalFailure", "ServiceUnavailable", "ServiceUnavailableException",
+    "RequestTimeout", "RequestTimeoutException", "PriorRequestNotComplete",
+}
+TRANSIENT_EXCEPTIONS = {"EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError"}
+
+
+class RateLimitExceeded(Exception):
+    """No token within ACQUIRE_TIMEOUT: the process is asking far more than its rate."""
+
+
+# -------------------------------
+# ERROR CLASSIFICATION
+# -------------------------------
+def error_code(exc):
+    """The AWS error code of a botocore ClientError (or a local_aws one), else None."""
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def is_throttle(exc):
+    return error_code(exc) in THROTTLE_CODES
+
+
+def is_retryable(exc):
+    if is_throttle(exc) or error_code(exc) in TRANSIENT_CODES:
+        return True
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict) and response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500:
+        return True
+    return type(exc).__name__ in TRANSIENT_EXCEPTIONS or isinstance(exc, (ConnectionError, TimeoutError))
+
+
+# -------------------------------
+# RATE LIMITING
+# -------------------------------
+class TokenBucket:
+    """
+    rate tokens/second, holding at most burst. throttled() halves the
+    current rate (not below min_rate); each success() adds back a
+    twentieth of the configured rate.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.min_rate = min_rate or self.max_rate * MIN_RATE_SHARE
+        self.burst = burst or max(1.0, self.max_rate * BURST_SECONDS)
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Take one token, waiting for it up to timeout seconds. Returns False on timeout."""
+        deadline = self.clock() + timeout
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                # A rounding error short of a token must still advance a coarse (or fake) clock
+                wait = max((1 - self.tokens) / self.rate, MIN_WAIT)
+            if now + wait > deadline:
+                return False
+            self.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self._refill(self.clock())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)  # stop the burst that caused it
+
+    def success(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self._refill(self.clock())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+_buckets = {}
+_lock = threading.Lock()
+
+
+def get_bucket(service, region=None):
+    """The process-wide bucket for service in region."""
+    key = (service, region)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.get(key)
+            if bucket is None:
+                bucket = _buckets[key] = TokenBucket(RATE_LIMITS.get(service, DEFAULT_RATE))
+    return bucket
+
+
+# -------------------------------
+# COALESCING
+# -------------------------------
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share the first caller's result (or exception)."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Returns (result, shared)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+# -------------------------------
+# GUARDED CLIENT
+# -------------------------------
+class GuardedClient:
+    """
+    Wraps a boto3 client (or a local_aws stand-in): every API call first
+    takes a token from the service's bucket and is retried on throttling
+    and transient errors; overlapping identical describe/get/list calls go
+    out once, and their callers share the response (treat it as
+    read-only). Everything else passes through.
+    """
+
+    def __init__(self, client, service, region=None, bucket=None, attempts=MAX_ATTEMPTS, coalesce=True,
+                 rng=None, sleep=time.sleep, registry=REGISTRY):
+        self._client = client
+        self._service = service
+        self._bucket = bucket or get_bucket(service, region)
+        self._attempts = attempts
+        self._coalesce = coalesce
+        self._rng = rng or random.Random()
+        self._sleep = sleep
+        self._flights = SingleFlight()
+        self._wrapped = {}
+        self._retries = registry.counter("aws_api_retries_total", "Retried AWS API calls", service=service)
+        self._throttles = registry.counter("aws_api_throttles_total", "Throttled AWS API calls", service=service)
+        self._shared = registry.counter("aws_api_coalesced_total", "AWS API calls answered by an identical one",
+                                        service=service)
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if attr.startswith("_") or not callable(value) or attr in ("get_paginator", "get_waiter", "can_paginate"):
+            return value
+        wrapped = self._wrapped.get(attr)
+        if wrapped is None:
+            wrapped = self._wrapped[attr] = self._wrap(attr, value)
+        return wrapped
+
+    def _wrap(self, operation, method):
+        coalesce = self._coalesce and operation.startswith(COALESCE_PREFIXES)
+
+        def call(*args, **kwargs):
+            if not coalesce or args:
+                return self._call(method, args, kwargs)
+            key = (operation, json.dumps(kwargs, sort_keys=True, default=str))
+            result, shared = self._flights.do(key, lambda: self._call(method, args, kwargs))
+            if shared:
+                self._shared.inc()
+            return result
+
+        call.__name__ = operation
+        return call
+
+    def _call(self, method, args, kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self._bucket.acquire():
+                raise RateLimitExceeded(f"{self._service}: no request token within {ACQUIRE_TIMEOUT:.0f}s")
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                if is_throttle(e):
+                    self._throttles.inc()
+                    self._bucket.throttled()
+                if attempt >= self._attempts or not is_retryable(e):
+                    raise
+                self._retries.inc()
+                # Full jitter: concurrent callers that failed together do not retry together
+                self._sleep(self._rng.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+                continue
+            self._bucket.success()
+            return result
+
+
+# -------------------------------
+# SNS DIGESTS
+# -------------------------------
+class AlertDigest:
+    """
+    Collects alerts per topic and publishes each batch as one SNS message:
+    once the oldest is window seconds old, when max_pending are waiting,
+    after an urgent alert, or on flush(). publish has sns.publish's
+    signature. With timer=True a background timer sends due digests;
+    otherwise the owner calls flush(force=False) at convenient points
+    (the Lambda does so at the end of every invocation; with window 0
+    that sends everything the invocation queued as one digest).
+    """
+
+    def __init__(self, publish, window=ALERT_DIGEST_SECONDS, max_pending=ALERT_DIGEST_MAX,
+                 clock=time.time, timer=False):
+        self._publish = publish
+        self.window = window
+        self.max_pending = max_pending
+        self.clock = clock
+        self.timer = timer
+        self.sent = 0
+        self._pending = {}  # topic -> [(ts, subject, message)]
+        self._urgent = set()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def publish(self, TopicArn, Message, Subject=None, urgent=False, **kwargs):
+        """Queue an alert (same arguments as sns.publish); sends at once if that makes a digest due."""
+        with self._lock:
+            self._pending.setdefault(TopicArn, []).append((self.clock(), Subject or "", Message))
+            if urgent:
+                self._urgent.add(TopicArn)
+            due = urgent or len(self._pending[TopicArn]) >= self.max_pending
+        if due:
+            self.flush(force=False)
+        elif self.timer:
+            self._arm()
+        return {"Queued": True}
+
+    def pending(self):
+        with self._lock:
+            return sum(len(items) for items in self._pending.values())
+
+    def flush(self, force=True):
+        """Send the digests that are due (all of them when force). Returns the number of SNS messages sent."""
+        now = self.clock()
+        with self._lock:
+            due = [topic for topic, items in self._pending.items()
+                   if force or topic in self._urgent or len(items) >= self.max_pending
+                   or now - items[0][0] >= self.window]
+            batches = [(topic, self._pending.pop(topic)) for topic in due]
+            self._urgent.difference_update(due)
+        sent = 0
+        for topic, items in batches:
+            subject, message = self.render(items)
+            try:
+                self._publish(TopicArn=topic, Message=message, Subject=subject)
+                sent += 1
+                print(f"ALERT SENT: {subject}")
+            except Exception as e:
+                print(f"ALERT FAILED: {e} ({len(items)} alerts dropped)")
+        self.sent += sent
+        if self.timer and self.pending():
+            self._arm()
+        return sent
+
+    @staticmethod
+    def render(items):
+        """(subject, message) for a batch; a single alert goes out as it was."""
+        if len(items) == 1:
+            return items[0][1] or "Alert", items[0][2]
+        subjects = list(dict.fromkeys(subject for _, subject, _ in items if subject))
+        subject = f"{len(items)} alerts: {', '.join(subjects)}"
+        if len(subject) > 100:  # SNS subject limit
+            subject = subject[:97] + "..."
+        lines = [f"[{time.strftime('%H:%M:%S', time.localtime(ts))}] {subj}\n{message}" for ts, subj, message in items]
+        return subject, "\n\n".join(lines)
+
+    def _arm(self):
+        with self._lock:
+            if self._timer is not None or not self._pending:
+                return
+            oldest = min(items[0][0] for items in self._pending.values())
+            delay = max(0.0, oldest + self.window - self.clock())
+            self._timer = threading.Timer(delay, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self):
+        with self._lock:
+            self._timer = None
+        self.flush(force=False)
+
+    def close(self):
+        """Cancel the timer and send whatever is pending."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return self.flush()
@@ -1,21 +1,86 @@
 # Filename: dynamic_allocator.py
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from array import array
+import os
 import random
+import sys
+from time import perf_counter_ns
+
+from allocation_cache import open_cache
+from instrumentation import REGISTRY
+from policies import PolicyRegistry
+
+try:
+    import numpy as np
+except ImportError:  # binary batch bodies are decoded with array instead
+    np = None
 
 app = Flask(__name__)
 
+# Hot-path metrics (per process; scrape each worker separately)
+ALLOCATE_SECONDS = REGISTRY.histogram("allocate_compute_seconds", "Allocation compute time", endpoint="allocate")
+BATCH_SECONDS = REGISTRY.histogram("allocate_compute_seconds", "Allocation compute time", endpoint="batch")
+BATCH_LOADS = REGISTRY.counter("allocate_batch_loads_total", "Task loads sized through /allocate/batch")
+ALLOCATE_ERRORS = REGISTRY.counter("allocate_errors_total", "Allocation requests answered with status=error")
+
+# Allocation policies (hot-swapped when the config file changes)
+POLICY_FILE = os.environ.get("ALLOCATOR_POLICY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies.json"))
+POLICY_WATCH_SECONDS = float(os.environ.get("ALLOCATOR_POLICY_WATCH_SECONDS", 5))
+
+policy_registry = PolicyRegistry(POLICY_FILE)
+if POLICY_WATCH_SECONDS > 0:
+    policy_registry.start_watcher(POLICY_WATCH_SECONDS)
+
+# Repeated workload descriptors are answered from cache (cleared on policy change)
+allocation_cache = open_cache(policy_registry)
+
 # Example of dynamic resource allocator function
-def allocate_resources(task_load):
+def allocate_resources(task_load, policy=None, workload_class=None, task_type=None, input_size_mb=0):
     """
     Simulate CPU, Memory, Storage allocation based on task_load
     task_load: int (0-100)
+    policy / workload_class / task_type: optional policy selection (default policy otherwise)
+    input_size_mb: optional input data size; adds memory/storage per the policy
     Returns: dict of allocated resources
     """
-    cpu = min(max(task_load // 10, 1), 8)  # 1-8 vCPUs
-    memory = min(max(task_load * 0.5, 1), 32)  # 1-32 GB
-    storage = min(max(task_load * 2, 10), 500)  # 10-500 GB
-    return {"cpu": cpu, "memory": memory, "storage": storage}
+    return allocation_cache.allocate({
+        "task_load": task_load, "policy": policy, "workload_class": workload_class,
+        "task_type": task_type, "input_size_mb": input_size_mb,
+    })[1].copy()
+
+# Batched version of allocate_resources
+def allocate_resources_batch(task_loads, policy=None, workload_class=None):
+    """
+    Same sizing as allocate_resources, applied to a whole array at once
+    task_loads: sequence (or NumPy array) of int (0-100)
+    Returns: dict of columns, {"cpu": [...], "memory": [...], "storage": [...]}
+    """
+    return policy_registry.get(policy, workload_class).lookup_batch(task_loads)
+
+def parse_batch_body(req):
+    """
+    Read task_loads from a batch request
+    JSON: {"task_loads": [..]} or a bare list
+    Binary (application/octet-stream): packed little-endian int32 values
+    """
+    if req.mimetype == "application/octet-stream":
+        raw = req.get_data()
+        if len(raw) % 4:
+            raise ValueError("binary body must be a whole number of int32 values")
+        if np is not None:
+            return np.frombuffer(raw, dtype="<i4")
+        loads = array("i")
+        loads.frombytes(raw)
+        if sys.byteorder == "big":
+            loads.byteswap()
+        return loads
+    data = req.get_json()
+    if isinstance(data, dict):
+        data = data.get("task_loads", [])
+    if not isinstance(data, list):
+        raise ValueError("task_loads must be a list")
+    return data
 
 # Home route
 @app.route("/")
@@ -28,11 +93,53 @@ def allocate():
     try:
         data = request.json
         task_load = data.get("task_load", random.randint(1, 100))
-        result = allocate_resources(task_load)
-        return jsonify({"status": "success", "task_load": task_load, "allocation": result})
+        start = perf_counter_ns()
+        policy, result, source = allocation_cache.allocate(dict(data, task_load=task_load))
+        ALLOCATE_SECONDS.record_ns(perf_counter_ns() - start)
+        return jsonify({"status": "success", "task_load": task_load, "policy": policy, "allocation": result,
+                        "cached": source != "miss"})
     except Exception as e:
+        ALLOCATE_ERRORS.inc()
         return jsonify({"status": "error", "message": str(e)})
 
+# API route to allocate resources for many task loads in one request
+@app.route("/allocate/batch", methods=["POST"])
+def allocate_batch():
+    try:
+        task_loads = parse_batch_body(request)
+        start = perf_counter_ns()
+        policy = policy_registry.get(request.args.get("policy"), request.args.get("workload_class"))
+        result = policy.lookup_batch(task_loads)
+        BATCH_SECONDS.record_ns(perf_counter_ns() - start)
+        BATCH_LOADS.inc(len(task_loads))
+        return jsonify({"status": "success", "count": len(task_loads), "policy": policy.name, "allocation": result})
+    except Exception as e:
+        ALLOCATE_ERRORS.inc()
+        return jsonify({"status": "error", "message": str(e)})
+
+# Allocation cache statistics
+@app.route("/allocate/cache", methods=["GET"])
+def allocation_cache_stats():
+    return jsonify(allocation_cache.stats())
+
+# Policy introspection and hot reload
+@app.route("/policies", methods=["GET"])
+def list_policies():
+    return jsonify(policy_registry.describe())
+
+@app.route("/policies/reload", methods=["POST"])
+def reload_policies():
+    try:
+        swapped = policy_registry.reload(force=True)
+        return jsonify({"status": "success", "reloaded": swapped, "version": policy_registry.version})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)})
+
+# Prometheus scrape endpoint
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.prometheus(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     # Run Flask app on all IPs, port 80 for EC2
     app.run(host="0.0.0.0", port=80)
@@ -0,0 +1,136 @@
+# Filename: dynamic_asgi.py
+#
+# ASGI serving mode for the allocator: same "/", "/allocate" and
+# "/allocate/cache" contract as the Flask app in dynamic.py, without the
+# WSGI/Flask request overhead.
+# Needs uvicorn[standard]: the httptools parser and uvloop matter here, the
+# pure-Python h11 fallback is an order of magnitude slower under load.
+# Run:  python dynamic_asgi.py --workers 4 --port 80
+# (--shared-cache: workers also share one allocation table in shared memory)
+#   or: gunicorn -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:80 dynamic_asgi:app
+
+import argparse
+import os
+import random
+
+from time import perf_counter_ns
+
+from dynamic import ALLOCATE_ERRORS, ALLOCATE_SECONDS, allocation_cache
+from instrumentation import REGISTRY
+
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+    def loads(raw):
+        return orjson.loads(raw)
+except ImportError:  # stdlib json is slower but speaks the same format
+    import json
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(raw):
+        return json.loads(raw)
+
+HOME_BODY = b"Dynamic Resource Allocator is running!"
+JSON_HEADERS = [(b"content-type", b"application/json")]
+METRICS_HEADERS = [(b"content-type", b"text/plain; version=0.0.4")]
+TEXT_HEADERS = [(b"content-type", b"text/html; charset=utf-8")]
+
+
+async def read_body(receive):
+    chunks = []
+    more = True
+    while more:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def respond(send, status, headers, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers + [(b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def allocate(raw):
+    try:
+        data = loads(raw)
+        task_load = data.get("task_load", random.randint(1, 100))
+        start = perf_counter_ns()
+        policy, result, source = allocation_cache.allocate(dict(data, task_load=task_load))
+        ALLOCATE_SECONDS.record_ns(perf_counter_ns() - start)
+        return dumps({"status": "success", "task_load": task_load, "policy": policy, "allocation": result,
+                      "cached": source != "miss"})
+    except Exception as e:
+        ALLOCATE_ERRORS.inc()
+        return dumps({"status": "error", "message": str(e)})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"]
+    method = scope["method"]
+    if path == "/allocate":
+        if method != "POST":
+            await respond(send, 405, TEXT_HEADERS, b"Method Not Allowed")
+            return
+        body = await read_body(receive)
+        await respond(send, 200, JSON_HEADERS, allocate(body))
+    elif path == "/allocate/cache":
+        await respond(send, 200, JSON_HEADERS, dumps(allocation_cache.stats()))
+    elif path == "/":
+        await respond(send, 200, TEXT_HEADERS, HOME_BODY)
+    elif path == "/metrics":
+        # Per worker process: each pre-forked worker keeps its own registry
+        await respond(send, 200, METRICS_HEADERS, REGISTRY.prometheus().encode())
+    else:
+        await respond(send, 404, TEXT_HEADERS, b"Not Found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the allocator API on an ASGI server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ALLOCATOR_WORKERS", os.cpu_count() or 1)),
+                        help="pre-forked worker processes sharing the listening socket")
+    parser.add_argument("--keep-alive", type=int, default=30, help="idle keep-alive timeout in seconds")
+    parser.add_argument("--shared-cache", action="store_true", help="share allocation cache entries across workers")
+    args = parser.parse_args()
+
+    if args.shared_cache and args.workers > 1:
+        # Read by allocation_cache when each worker imports dynamic
+        os.environ.setdefault("ALLOCATION_CACHE_SHM", f"allocator-cache-{os.getpid()}")
+
+    import uvicorn
+
+    uvicorn.run(
+        "dynamic_asgi:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_keep_alive=args.keep_alive,
+        access_log=False,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
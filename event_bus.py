@@ -0,0 +1,120 @@
+# Filename: event_bus.py
+#
+# In-process publish/subscribe bus with timers, for event-driven scaling
+# and the dashboard. Events and timers share one ordered queue:
+#   threaded=True   a dispatcher thread delivers events and fires timers on
+#                   the wall clock (what the dashboard and services use)
+#   threaded=False  nothing runs until run(until) is called; the bus keeps
+#                   its own virtual clock, so offline runs are deterministic
+#
+# Topics used in this project:
+#   tasks.enqueued      queue_url, count        (publishers)
+#   tasks.completed     queue_url, count        (workers)
+#   queue.depth         queue_url, depth        (absolute observation)
+#   instance.lifecycle  asg, instance_id, state, previous
+#   capacity.changed    asg, desired
+
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+Event = namedtuple("Event", ["topic", "payload", "ts"])
+
+
+class EventBus:
+    def __init__(self, threaded=True, start_time=0.0):
+        self.threaded = threaded
+        self.now = start_time            # virtual clock when not threaded
+        self._subscribers = {}           # topic -> [handler]
+        self._queue = []                 # (due, seq, fn, args)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.delivered = 0
+
+    def clock(self):
+        return time.time() if self.threaded else self.now
+
+    def subscribe(self, topic, handler):
+        """handler(event) for every event on topic ("*" = all topics)."""
+        with self._cond:
+            self._subscribers.setdefault(topic, []).append(handler)
+        return handler
+
+    def unsubscribe(self, topic, handler):
+        with self._cond:
+            handlers = self._subscribers.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def publish(self, topic, **payload):
+        event = Event(topic, payload, self.clock())
+        self._push(event.ts, self._deliver, (event,))
+        return event
+
+    def call_later(self, delay, fn, *args):
+        """Run fn(*args) on the bus after delay seconds. Returns a handle for cancel()."""
+        handle = [False]
+        self._push(self.clock() + max(0.0, delay), self._fire, (handle, fn, args))
+        return handle
+
+    @staticmethod
+    def cancel(handle):
+        if handle is not None:
+            handle[0] = True
+
+    def _push(self, due, fn, args):
+        with self._cond:
+            heapq.heappush(self._queue, (due, next(self._seq), fn, args))
+            self._cond.notify()
+        if self.threaded and self._thread is None:
+            self.start()
+
+    def _fire(self, handle, fn, args):
+        if not handle[0]:
+            fn(*args)
+
+    def _deliver(self, event):
+        handlers = self._subscribers.get(event.topic, []) + self._subscribers.get("*", [])
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"EVENT HANDLER FAILED ({event.topic}): {e}")
+        self.delivered += 1
+
+    # -------------------------------
+    # DISPATCH
+    # -------------------------------
+    def run(self, until=None):
+        """Virtual-time mode: process everything due up to until (all pending if None)."""
+        while True:
+            with self._cond:
+                if not self._queue or (until is not None and self._queue[0][0] > until):
+                    break
+                due, _, fn, args = heapq.heappop(self._queue)
+            self.now = max(self.now, due)
+            fn(*args)
+        if until is not None:
+            self.now = max(self.now, until)
+
+    def _run_threaded(self):
+        while True:
+            with self._cond:
+                while not self._queue or self._queue[0][0] > time.time():
+                    timeout = self._queue[0][0] - time.time() if self._queue else None
+                    self._cond.wait(timeout)
+                _, _, fn, args = heapq.heappop(self._queue)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"EVENT BUS ERROR: {e}")
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_threaded, name="event-bus", daemon=True)
+                self._thread.start()
+        return self
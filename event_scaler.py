@@ -0,0 +1,258 @@
+# Filename: event_scaler.py
+#
+# Event-driven scaling: instead of polling ASG and SQS on a schedule, keep
+# a per-pool backlog/capacity model up to date from bus events (enqueues,
+# completions, instance lifecycle) and decide only when it changes.
+# Decisions are debounced: a burst of events produces one decision, made
+# `debounce` seconds after the last change but never more than `max_delay`
+# after the first. The decision itself is aws_Lambda.scale_pool, so
+# thresholds, cooldowns and the shared state store behave exactly as in
+# the scheduled Lambda. AWS is read at seed() and by reconcile().
+#
+# Completions only shrink the modeled backlog when workers publish
+# "tasks.completed" on the same bus (worker.Worker(bus=...) in this
+# process). Workers on other hosts never reach it, so a service that does
+# not host its workers must reconcile: reconcile_every() publishes one
+# queue-depth read per interval as "queue.depth".
+#
+# Deployed as a Lambda (handler event_scaler.lambda_handler), an EventBridge
+# rule for the Auto Scaling launch/terminate events drives it; add a
+# schedule (e.g. rate(5 minutes)) to the same function as a backstop, which
+# re-reads the ASG as well.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+DEBOUNCE_SECONDS = 2.0
+MAX_DELAY_SECONDS = 10.0
+RECONCILE_SECONDS = float(os.environ.get("EVENT_RECONCILE_SECONDS", 60))
+
+
+class PoolModel:
+    """Incrementally maintained view of one pool."""
+
+    __slots__ = ("pool", "desired", "running", "backlog", "changes", "first_change", "timer", "version")
+
+    def __init__(self, pool, desired=0, running=0, backlog=0):
+        self.pool = pool
+        self.desired = desired
+        self.running = running
+        self.backlog = backlog
+        self.changes = 0
+        self.first_change = None
+        self.timer = None
+        self.version = 0
+
+
+class EventDrivenScaler:
+    """
+    bus:    event_bus.EventBus
+    scaler: the aws_Lambda module (its clients, state store and scale_pool)
+    pools:  pool dicts as in aws_Lambda.load_pools(); default scaler.POOLS
+    """
+
+    def __init__(self, bus, scaler=None, pools=None, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        if scaler is None:
+            import aws_Lambda as scaler
+        self.bus = bus
+        self.scaler = scaler
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.models = {p["name"]: PoolModel(p) for p in (pools or scaler.POOLS)}
+        self._by_queue = {}
+        self._by_asg = {}
+        for model in self.models.values():
+            self._by_queue.setdefault(model.pool["queue_url"], []).append(model)
+            self._by_asg.setdefault(model.pool["asg"], []).append(model)
+        self._lock = threading.RLock()
+        self.decisions = deque(maxlen=1000)  # (ts, pool name, result), most recent
+
+    # -------------------------------
+    # SETUP
+    # -------------------------------
+    def seed(self):
+        """One read of ASG and queue state; everything after comes from events."""
+        pools = [m.pool for m in self.models.values()]
+        states = self.scaler.get_asg_states(list(dict.fromkeys(p["asg"] for p in pools)))
+        backlogs = self.scaler.get_backlogs(p["queue_url"] for p in pools)
+        with self._lock:
+            for model in self.models.values():
+                model.desired, model.running = states.get(model.pool["asg"], (model.desired, model.running))
+                model.backlog = backlogs.get(model.pool["queue_url"], model.backlog)
+        return self
+
+    def reconcile(self):
+        """One queue-depth read for every pool, published as queue.depth."""
+        backlogs = self.scaler.get_backlogs(m.pool["queue_url"] for m in self.models.values())
+        for queue_url, depth in backlogs.items():
+            self.bus.publish("queue.depth", queue_url=queue_url, depth=depth)
+        return backlogs
+
+    def reconcile_every(self, interval=RECONCILE_SECONDS):
+        """Keep reconciling on the bus every interval seconds (threaded buses only: run() would never end)."""
+        def tick():
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"RECONCILE FAILED: {e}")
+            self.bus.call_later(interval, tick)
+
+        self.bus.call_later(interval, tick)
+        return self
+
+    def attach(self):
+        handlers = {
+            "tasks.enqueued": self._on_enqueued,
+            "tasks.completed": self._on_completed,
+            "queue.depth": self._on_depth,
+            "instance.lifecycle": self._on_lifecycle,
+            "capacity.changed": self._on_capacity,
+        }
+        for topic, handler in handlers.items():
+            self.bus.subscribe(topic, handler)
+        return self
+
+    def start(self):
+        return self.seed().attach()
+
+    # -------------------------------
+    # EVENTS -> MODEL
+    # -------------------------------
+    def _on_enqueued(self, event):
+        for model in self._by_queue.get(event.payload["queue_url"], ()):
+            self._change(model, backlog=model.backlog + event.payload.get("count", 1))
+
+    def _on_completed(self, event):
+        for model in self._by_queue.get(event.payload["queue_url"], ()):
+            self._change(model, backlog=max(0, model.backlog - event.payload.get("count", 1)))
+
+    def _on_depth(self, event):
+        for model in self._by_queue.get(event.payload["queue_url"], ()):
+            self._change(model, backlog=int(event.payload["depth"]))
+
+    def _on_lifecycle(self, event):
+        state, previous = event.payload["state"], event.payload.get("previous")
+        for model in self._by_asg.get(event.payload["asg"], ()):
+            running = model.running
+            if state == "InService" and previous != "InService":
+                running += 1
+            elif previous == "InService" and state != "InService":
+                running -= 1
+            self._change(model, running=max(0, running))
+
+    def _on_capacity(self, event):
+        for model in self._by_asg.get(event.payload["asg"], ()):
+            with self._lock:
+                model.desired = event.payload["desired"]  # our own or an operator's change; no decision
+
+    def _change(self, model, **fields):
+        with self._lock:
+            if all(getattr(model, k) == v for k, v in fields.items()):
+                return
+            for key, value in fields.items():
+                setattr(model, key, value)
+            model.version += 1
+            self._schedule(model, self.debounce)
+
+    # -------------------------------
+    # DEBOUNCED DECISIONS
+    # -------------------------------
+    def _schedule(self, model, delay):
+        now = self.bus.clock()
+        if model.first_change is None:
+            model.first_change = now
+        delay = min(delay, max(0.0, model.first_change + self.max_delay - now))
+        self.bus.cancel(model.timer)
+        model.timer = self.bus.call_later(delay, self._decide, model)
+
+    def _decide(self, model):
+        with self._lock:
+            model.timer = None
+            model.first_change = None
+            desired, running, backlog = model.desired, model.running, model.backlog
+        now = self.bus.clock()
+        try:
+            result = self.scaler.scale_pool(model.pool, desired, running, backlog, now)
+        except Exception as e:
+            print(f"[{model.pool['name']}] EVENT DECISION FAILED: {e}")
+            return
+        finally:
+            self.scaler.alerts.flush(force=False)
+        self.decisions.append((now, model.pool["name"], result))
+        if result.get("desired", desired) != desired:
+            self.bus.publish("capacity.changed", asg=model.pool["asg"], desired=result["desired"])
+        elif result.get("status") == "cooldown" and result.get("retry_in"):
+            # Nothing else may happen; look again once the cooldown is over
+            with self._lock:
+                if model.timer is None:
+                    model.timer = self.bus.call_later(result["retry_in"], self._decide, model)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: {"desired": m.desired, "running": m.running, "backlog": m.backlog}
+                    for name, m in self.models.items()}
+
+
+def lifecycle_from_eventbridge(event):
+    """
+    Map an EventBridge Auto Scaling event to an instance.lifecycle payload
+    (None for other events), so a rule feeding this process can drive it.
+    """
+    states = {
+        "EC2 Instance Launch Successful": ("InService", "Pending"),
+        "EC2 Instance Terminate Successful": ("Terminated", "InService"),
+    }
+    if event.get("source") != "aws.autoscaling" or event.get("detail-type") not in states:
+        return None
+    state, previous = states[event["detail-type"]]
+    detail = event.get("detail", {})
+    return {"asg": detail.get("AutoScalingGroupName"), "instance_id": detail.get("EC2InstanceId"),
+            "state": state, "previous": previous}
+
+
+# -------------------------------
+# LAMBDA ENTRY POINT
+# -------------------------------
+_bus = None
+_service = None
+
+
+def lambda_handler(event, context):
+    """
+    Event-driven mode as a Lambda. The model lives in the warm container;
+    each invocation applies the event, reconciles and decides at once (no
+    debounce: the container is frozen between invocations, so timers only
+    fire on the next one). Cold starts and scheduled runs re-read the ASG
+    too and decide for every pool.
+    """
+    global _bus, _service
+    from event_bus import EventBus
+
+    now = time.time()
+    event = event or {}
+    if _service is None:
+        _bus = EventBus(threaded=False, start_time=now)
+        _service = EventDrivenScaler(_bus, debounce=0, max_delay=0).attach()
+        full = True
+    else:
+        full = event.get("detail-type") == "Scheduled Event"
+    since = _bus.now
+    _bus.run(until=now)  # cooldown retries that came due while frozen
+    if full:
+        _service.seed()
+        for model in _service.models.values():
+            _service._schedule(model, 0)
+    else:
+        lifecycle = lifecycle_from_eventbridge(event)
+        if lifecycle is not None:
+            _bus.publish("instance.lifecycle", **lifecycle)
+        _service.reconcile()
+    _bus.run(until=now)
+    results = {name: result for ts, name, result in _service.decisions if ts > since or full}
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"pools": results, "model": _service.snapshot()})
+    }
@@ -0,0 +1,131 @@
+# Filename: fleet_ops.py
+#
+# Parallel SSH operations across the worker fleet for the dashboard.
+# One reusable paramiko connection per host, a bounded thread pool with
+# per-host timeouts, and results aggregated per host. No Streamlit calls
+# happen here: worker threads cannot touch st.session_state, so callers
+# turn the returned results into feedback on the main thread.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import paramiko
+
+from instrumentation import timed, timer
+
+CONNECT_TIMEOUT = 10
+COMMAND_TIMEOUT = 120     # apt install can be slow on a fresh host
+MAX_PARALLEL_HOSTS = 16
+
+
+class SSHPool:
+    """Reusable SSH connections keyed by IP. Safe to share across Streamlit reruns."""
+
+    def __init__(self, username, connect_timeout=CONNECT_TIMEOUT):
+        self.username = username
+        self.connect_timeout = connect_timeout
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.stress_ready = set()  # hosts known to have stress-ng installed
+
+    def host_lock(self, ip):
+        with self._lock:
+            return self._locks.setdefault(ip, threading.Lock())
+
+    def get(self, ip):
+        client = self._clients.get(ip)
+        transport = client.get_transport() if client is not None else None
+        if transport is not None and transport.is_active():
+            return client
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with timer("ssh_connect_seconds", "SSH connection setup time"):
+            client.connect(ip, username=self.username, timeout=self.connect_timeout,
+                           banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout)
+        client.get_transport().set_keepalive(30)
+        self._clients[ip] = client
+        return client
+
+    def drop(self, ip):
+        client = self._clients.pop(ip, None)
+        if client is not None:
+            client.close()
+
+    def run(self, ip, command, timeout=COMMAND_TIMEOUT):
+        """Run command on ip and wait for it. Returns (exit status, stdout)."""
+        with self.host_lock(ip):
+            try:
+                client = self.get(ip)
+                with timer("ssh_command_seconds", "Remote command time including output"):
+                    _, stdout, _ = client.exec_command(command, timeout=timeout)
+                    output = stdout.read().decode(errors="replace")
+                    return stdout.channel.recv_exit_status(), output
+            except Exception:
+                self.drop(ip)  # reconnect next time
+                raise
+
+    def close_all(self):
+        for ip in list(self._clients):
+            self.drop(ip)
+
+
+# -------------------------------
+# STRESS OPERATIONS (one host)
+# -------------------------------
+def ensure_stress_ng(pool, ip):
+    """Install stress-ng once per host; later calls are a set lookup."""
+    if ip in pool.stress_ready:
+        return
+    status, _ = pool.run(ip, "command -v stress-ng >/dev/null || "
+                             "(sudo apt-get update -qq && sudo apt-get install -y -qq stress-ng)")
+    if status != 0:
+        raise RuntimeError(f"stress-ng install failed (exit {status})")
+    pool.stress_ready.add(ip)
+
+
+@timed("ssh_operation_seconds", "Per-host fleet operation time", operation="start_stress")
+def start_stress(pool, ip, cores=8, duration=300):
+    ensure_stress_ng(pool, ip)
+    pool.run(ip, f"nohup stress-ng --cpu {int(cores)} --timeout {int(duration)} > /dev/null 2>&1 &", timeout=15)
+    return "Running"
+
+
+@timed("ssh_operation_seconds", "Per-host fleet operation time", operation="stop_stress")
+def stop_stress(pool, ip):
+    pool.run(ip, "pkill -f stress-ng || true", timeout=15)
+    return "Stopped"
+
+
+# -------------------------------
+# FAN-OUT
+# -------------------------------
+def fan_out(ips, operation, *args, max_workers=MAX_PARALLEL_HOSTS, timeout=COMMAND_TIMEOUT + CONNECT_TIMEOUT):
+    """
+    Run operation(ip, *args) on every ip concurrently.
+    Returns {ip: {"ok": bool, "result": str, "seconds": float}}; hosts that
+    do not finish within timeout are reported as timed out.
+    """
+    ips = list(dict.fromkeys(ips))
+    if not ips:
+        return {}
+
+    def call(ip):
+        start = time.perf_counter()
+        try:
+            return {"ok": True, "result": operation(ip, *args), "seconds": time.perf_counter() - start}
+        except Exception as e:
+            return {"ok": False, "result": str(e)[:80], "seconds": time.perf_counter() - start}
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(ips)), thread_name_prefix="fleet")
+    futures = {executor.submit(call, ip): ip for ip in ips}
+    done, _ = wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+    results = {}
+    for future, ip in futures.items():
+        if future in done:
+            results[ip] = future.result()
+        else:
+            results[ip] = {"ok": False, "result": f"timed out after {timeout}s", "seconds": timeout}
+    return results
@@ -0,0 +1,77 @@
+# Filename: forecast.py
+#
+# Incremental backlog forecasting for the scaling Lambda.
+# Holt's linear (double exponential) smoothing: O(1) work per sample,
+# irregular sample spacing handled by expressing the trend per second.
+
+import math
+from collections import deque
+
+
+class HoltForecaster:
+    """
+    level: smoothed backlog
+    trend: smoothed backlog change per second (net arrival rate)
+    error: smoothed absolute one-step forecast error, used as a safety margin
+    """
+
+    def __init__(self, alpha=0.5, beta=0.3, window=60):
+        self.alpha = alpha
+        self.beta = beta
+        self.level = None
+        self.trend = 0.0
+        self.error = 0.0
+        self.last_time = None
+        self.samples = deque(maxlen=window)  # rolling (timestamp, backlog) window
+
+    def update(self, timestamp, backlog):
+        self.samples.append((timestamp, backlog))
+        if self.level is None:
+            self.level = float(backlog)
+            self.last_time = timestamp
+            return
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            return
+        predicted = self.level + self.trend * dt
+        self.error = self.alpha * abs(backlog - predicted) + (1 - self.alpha) * self.error
+        previous = self.level
+        self.level = self.alpha * backlog + (1 - self.alpha) * predicted
+        self.trend = self.beta * (self.level - previous) / dt + (1 - self.beta) * self.trend
+        self.last_time = timestamp
+
+    def to_dict(self):
+        return {
+            "level": self.level,
+            "trend": self.trend,
+            "error": self.error,
+            "last_time": self.last_time,
+            "samples": [list(sample) for sample in self.samples],
+        }
+
+    @classmethod
+    def from_dict(cls, data, alpha=0.5, beta=0.3, window=60):
+        forecaster = cls(alpha, beta, window)
+        if data:
+            forecaster.level = data.get("level")
+            forecaster.trend = data.get("trend", 0.0)
+            forecaster.error = data.get("error", 0.0)
+            forecaster.last_time = data.get("last_time")
+            forecaster.samples.extend(tuple(sample) for sample in data.get("samples", []))
+        return forecaster
+
+    @property
+    def ready(self):
+        return len(self.samples) >= 3
+
+    def forecast(self, horizon_seconds, margin=1.0):
+        """Projected backlog horizon_seconds ahead, plus margin x typical error."""
+        if self.level is None:
+            return 0.0
+        return max(self.level + self.trend * horizon_seconds + margin * self.error, 0.0)
+
+
+def target_capacity(projected_backlog, tasks_per_instance, min_instances, max_instances):
+    """Instances needed to keep projected_backlog / instance at tasks_per_instance."""
+    target = math.ceil(projected_backlog / tasks_per_instance) if tasks_per_instance > 0 else max_instances
+    return min(max(target, min_instances), max_instances)
@@ -0,0 +1,266 @@
+# Filename: instrumentation.py
+#
+# Lightweight hot-path instrumentation: counters, HDR-style latency
+# histograms, a timing decorator/context manager, an AWS client wrapper,
+# Prometheus text exposition and a JSON snapshot for Lambda logs.
+#
+# Writes never take a lock: every thread increments its own shard (a plain
+# list) and readers sum the shards. Recording a latency is two
+# perf_counter_ns() calls, a bit_length() and a list increment. When a
+# thread exits (thread-per-connection servers, short-lived pools) its shard
+# is folded into a shared retired cell, so shards track live threads only.
+
+import functools
+import threading
+import weakref
+from time import perf_counter_ns
+
+# Histogram buckets: 2**SUB_BITS linear sub-buckets per power of two of
+# nanoseconds (~6% relative precision), covering up to ~2**MAX_EXPONENT ns.
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+MAX_EXPONENT = 44                   # ~4.9 hours
+N_BUCKETS = (MAX_EXPONENT + 2) * SUB_COUNT
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(ns):
+    if ns < SUB_COUNT:
+        return ns if ns > 0 else 0
+    k = ns.bit_length() - SUB_BITS - 1
+    return min(k * SUB_COUNT + (ns >> k), N_BUCKETS - 1)
+
+
+def bucket_upper(index):
+    """Largest value (ns) that lands in bucket index."""
+    if index < 2 * SUB_COUNT:
+        return index
+    k = index // SUB_COUNT - 1
+    m = index - k * SUB_COUNT
+    return ((m + 1) << k) - 1
+
+
+class _Owner:
+    """Lives in one thread's thread-local; collected when that thread exits."""
+
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """Per-thread list cells; the owning thread is the only writer of its cell."""
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._shards = {}  # id(cell) -> cell; cells of equal counts are still distinct
+        self._retired = [0] * size  # totals of threads that have exited
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self._size
+            owner = self._local.owner = _Owner()
+            weakref.finalize(owner, self._retire, cell)
+            with self._lock:  # once per thread
+                self._shards[id(cell)] = cell
+            return cell
+
+    def _retire(self, cell):
+        with self._lock:
+            self._retired = [a + b for a, b in zip(self._retired, cell)]
+            del self._shards[id(cell)]
+
+    def merged(self):
+        with self._lock:
+            shards = list(self._shards.values())
+            shards.append(self._retired)
+        return [sum(column) for column in zip(*shards)]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, n=1):
+        self.cell()[0] += n
+
+    @property
+    def value(self):
+        return self.merged()[0]
+
+
+class Histogram(_Sharded):
+    """Latency histogram in nanoseconds. Cell layout: [count, sum, bucket 0..N-1]."""
+
+    kind = "summary"
+
+    def __init__(self):
+        super().__init__(N_BUCKETS + 2)
+
+    def record_ns(self, ns):
+        cell = self.cell()
+        cell[0] += 1
+        cell[1] += ns
+        if ns < SUB_COUNT:
+            cell[2 + (ns if ns > 0 else 0)] += 1
+        else:
+            k = ns.bit_length() - SUB_BITS - 1
+            cell[2 + min(k * SUB_COUNT + (ns >> k), N_BUCKETS - 1)] += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        merged = self.merged()
+        count, total, buckets = merged[0], merged[1], merged[2:]
+        quantiles = {}
+        if count:
+            targets = [(q, q * count) for q in QUANTILES]
+            seen = 0
+            for index, n in enumerate(buckets):
+                if not n:
+                    continue
+                seen += n
+                while targets and seen >= targets[0][1]:
+                    quantiles[targets.pop(0)[0]] = bucket_upper(index) / 1e9
+                if not targets:
+                    break
+        return {"count": count, "sum": total / 1e9, "quantiles": quantiles}
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record_ns(perf_counter_ns() - self.start)
+        return False
+
+
+# -------------------------------
+# REGISTRY
+# -------------------------------
+class Registry:
+    def __init__(self):
+        self._metrics = {}  # (name, labels tuple) -> metric
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls()
+                    self._help.setdefault(name, (help, cls.kind))
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help="", **labels):
+        return self._get(Histogram, name, help, labels)
+
+    def snapshot(self):
+        """JSON-friendly view: {"name{label=value}": {...}}"""
+        out = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            key = name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+            out[key] = metric.value if isinstance(metric, Counter) else metric.snapshot()
+        return out
+
+    def prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        by_name = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            by_name.setdefault(name, []).append((labels, metric))
+        for name in sorted(by_name):
+            help, kind = self._help[name]
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in by_name[name]:
+                if isinstance(metric, Counter):
+                    lines.append(f"{name}{_labels(labels)} {metric.value}")
+                    continue
+                snap = metric.snapshot()
+                for q, value in snap["quantiles"].items():
+                    lines.append(f"{name}{_labels(labels + (('quantile', q),))} {value:.9f}")
+                lines.append(f"{name}_sum{_labels(labels)} {snap['sum']:.9f}")
+                lines.append(f"{name}_count{_labels(labels)} {snap['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry()
+
+
+def timed(name, help="", registry=REGISTRY, **labels):
+    """Decorator: record each call's latency; exceptions count as <name>_errors_total."""
+    def decorate(fn):
+        histogram = registry.histogram(name, help, **labels)
+        errors = registry.counter(f"{name}_errors_total", f"Failed calls of {name}", **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                errors.inc()
+                raise
+            finally:
+                histogram.record_ns(perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+def timer(name, help="", registry=REGISTRY, **labels):
+    """Context manager: with timer("ssh_command_seconds", op="stress"): ..."""
+    return registry.histogram(name, help, **labels).time()
+
+
+# -------------------------------
+# AWS CLIENTS
+# -------------------------------
+class InstrumentedClient:
+    """
+    Wraps a boto3 client (or a local_aws stand-in): every API method records
+    aws_api_call_seconds{service, operation}. Everything else passes through.
+    """
+
+    def __init__(self, client, service, registry=REGISTRY):
+        self._client = client
+        self._service = service
+        self._registry = registry
+        self._wrapped = {}
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if attr.startswith("_") or not callable(value) or attr in ("get_paginator", "get_waiter", "can_paginate"):
+            return value
+        wrapped = self._wrapped.get(attr)
+        if wrapped is None:
+            wrapped = self._wrapped[attr] = timed(
+                "aws_api_call_seconds", "AWS API call latency", self._registry,
+                service=self._service, operation=attr,
+            )(value)
+        return wrapped
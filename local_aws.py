@@ -0,0 +1,473 @@
+# Filename: local_aws.py
+#
+# In-process stand-ins for the boto3 clients this project uses, for the
+# simulator, benchmarks and offline runs. They implement only the calls and
+# response fields the project reads, with the same names and shapes as boto3.
+
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError: the code is in response["Error"]["Code"]."""
+
+    def __init__(self, code, operation, message="", status=400):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status}}
+        self.operation_name = operation
+
+
+class ApiRateLimit:
+    """Server-side request rate: calls beyond rate/second (after a burst) fail with Throttling."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def check(self, operation):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1:
+                self.throttled += 1
+                raise ClientError("Throttling", operation, "Rate exceeded")
+            self.tokens -= 1
+
+
+class FakeAutoScaling:
+    """
+    Auto Scaling groups whose instances boot for boot_seconds (LifecycleState
+    "Pending") before going "InService". clock is any callable returning
+    seconds, so simulations can run on virtual time. latency adds a sleep to
+    every API call, as FakeSQS does; max_rate (calls/s) makes calls beyond
+    it fail with Throttling. With an event_bus.EventBus, lifecycle
+    transitions are published as "instance.lifecycle" events (as EventBridge
+    would deliver them) and boots complete on the bus clock.
+    A group with a termination lifecycle hook keeps instances it removes in
+    "Terminating:Wait" until complete_lifecycle_action or the hook timeout.
+    """
+
+    MAX_NAMES = 50
+
+    def __init__(self, clock=None, boot_seconds=0.0, latency=0.0, bus=None, max_rate=None):
+        self.clock = clock or (bus.clock if bus is not None else time.time)
+        self.bus = bus
+        self.boot_seconds = boot_seconds
+        self.latency = latency
+        self.limit = ApiRateLimit(max_rate) if max_rate else None
+        self.groups = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._ready = {}
+        self._hook_deadlines = {}  # instance id -> time the hook's default result applies
+        self._ids = itertools.count(1)
+
+    def create_group(self, name, desired=1, min_size=0, max_size=100, instance_type="c5.2xlarge", in_service=True):
+        self.groups[name] = {
+            "AutoScalingGroupName": name,
+            "DesiredCapacity": 0,
+            "MinSize": min_size,
+            "MaxSize": max_size,
+            "InstanceType": instance_type,
+            "Instances": [],
+            "LifecycleHooks": [],
+        }
+        self._set_capacity(self.groups[name], desired, ready_now=in_service)
+        return self.groups[name]
+
+    def _launch(self, group, ready_now):
+        instance_id = f"i-{next(self._ids):017x}"
+        self._ready[instance_id] = self.clock() + (0 if ready_now else self.boot_seconds)
+        group["Instances"].append({
+            "InstanceId": instance_id,
+            "InstanceType": group["InstanceType"],
+            "LifecycleState": "Pending",
+            "HealthStatus": "Healthy",
+            "ProtectedFromScaleIn": False,
+            "LaunchTime": self.clock(),
+        })
+        self._lifecycle(group, instance_id, "Pending", None)
+        if self.bus is not None:
+            self.bus.call_later(self._ready[instance_id] - self.clock(), self._refresh, group)
+
+    @staticmethod
+    def _active(group):
+        return [i for i in group["Instances"] if not i["LifecycleState"].startswith("Terminating")]
+
+    def _set_capacity(self, group, desired, ready_now=False):
+        while len(self._active(group)) < desired:
+            self._launch(group, ready_now)
+        # Scale-in terminates the newest unprotected instances first (pending before in-service)
+        active = self._active(group)
+        while len(active) > desired:
+            candidates = [i for i in active if not i["ProtectedFromScaleIn"]]
+            if not candidates:
+                break  # the real ASG waits until protection is removed
+            victim = candidates[-1]
+            active.remove(victim)
+            self._remove(group, victim)
+        group["DesiredCapacity"] = desired
+        self._refresh(group)
+
+    def _remove(self, group, inst):
+        """Terminate inst, through the termination lifecycle hook if the group has one."""
+        hooks = [h for h in group["LifecycleHooks"] if h["LifecycleTransition"] == "autoscaling:EC2_INSTANCE_TERMINATING"]
+        previous = inst["LifecycleState"]
+        self._ready.pop(inst["InstanceId"], None)
+        if not hooks:
+            group["Instances"].remove(inst)
+            self._lifecycle(group, inst["InstanceId"], "Terminated", previous)
+            return
+        inst["LifecycleState"] = "Terminating:Wait"
+        timeout = hooks[0]["HeartbeatTimeout"]
+        self._hook_deadlines[inst["InstanceId"]] = self.clock() + timeout
+        self._lifecycle(group, inst["InstanceId"], "Terminating:Wait", previous)
+        if self.bus is not None:
+            self.bus.call_later(timeout, self._refresh, group)
+
+    def _finish_termination(self, group, inst):
+        group["Instances"].remove(inst)
+        self._hook_deadlines.pop(inst["InstanceId"], None)
+        self._lifecycle(group, inst["InstanceId"], "Terminated", "Terminating:Wait")
+
+    def _refresh(self, group):
+        now = self.clock()
+        for inst in list(group["Instances"]):
+            state = inst["LifecycleState"]
+            if state == "Pending" and self._ready[inst["InstanceId"]] <= now:
+                inst["LifecycleState"] = "InService"
+                self._lifecycle(group, inst["InstanceId"], "InService", "Pending")
+            elif state == "Terminating:Wait" and self._hook_deadlines[inst["InstanceId"]] <= now:
+                self._finish_termination(group, inst)  # hook timed out; default result
+
+    def _lifecycle(self, group, instance_id, state, previous):
+        if self.bus is not None:
+            self.bus.publish("instance.lifecycle", asg=group["AutoScalingGroupName"],
+                             instance_id=instance_id, state=state, previous=previous)
+
+    def ready_times(self, name):
+        """Boot-completion times of the group's pending instances."""
+        return [self._ready[i["InstanceId"]] for i in self.groups[name]["Instances"] if i["LifecycleState"] == "Pending"]
+
+    def _find(self, instance_id, group_name=None):
+        for name, group in self.groups.items():
+            if group_name not in (None, name):
+                continue
+            for inst in group["Instances"]:
+                if inst["InstanceId"] == instance_id:
+                    return group, inst
+        raise ValueError(f"ValidationError: instance {instance_id} is not in an Auto Scaling group")
+
+    # --- boto3 surface ---
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.limit is not None:
+            self.limit.check(name)
+
+    def describe_auto_scaling_groups(self, AutoScalingGroupNames=None, **kwargs):
+        self._call("describe_auto_scaling_groups")
+        names = AutoScalingGroupNames or list(self.groups)
+        if len(names) > self.MAX_NAMES:
+            raise ValueError(f"ValidationError: at most {self.MAX_NAMES} AutoScalingGroupNames")
+        groups = []
+        for name in names:
+            group = self.groups.get(name)
+            if group is not None:
+                self._refresh(group)
+                groups.append(group)
+        return {"AutoScalingGroups": groups}
+
+    def update_auto_scaling_group(self, AutoScalingGroupName, DesiredCapacity=None, MinSize=None, MaxSize=None, **kwargs):
+        self._call("update_auto_scaling_group")
+        group = self.groups[AutoScalingGroupName]
+        if MinSize is not None:
+            group["MinSize"] = MinSize
+        if MaxSize is not None:
+            group["MaxSize"] = MaxSize
+        if DesiredCapacity is not None:
+            self._set_capacity(group, DesiredCapacity)
+        return {}
+
+    def terminate_instance_in_auto_scaling_group(self, InstanceId, ShouldDecrementDesiredCapacity, **kwargs):
+        self._call("terminate_instance_in_auto_scaling_group")
+        group, inst = self._find(InstanceId)
+        if inst["LifecycleState"].startswith("Terminating"):
+            raise ValueError(f"ValidationError: instance {InstanceId} is already terminating")
+        if ShouldDecrementDesiredCapacity:
+            if group["DesiredCapacity"] - 1 < group["MinSize"]:
+                raise ValueError("ValidationError: desired capacity would go below the group's MinSize")
+            group["DesiredCapacity"] -= 1
+        self._remove(group, inst)
+        self._set_capacity(group, group["DesiredCapacity"])  # replaces the instance when not decrementing
+        return {"Activity": {"ActivityId": str(uuid.uuid4()), "AutoScalingGroupName": group["AutoScalingGroupName"],
+                             "Description": f"Terminating EC2 instance: {InstanceId}"}}
+
+    def put_lifecycle_hook(self, LifecycleHookName, AutoScalingGroupName, LifecycleTransition,
+                           HeartbeatTimeout=3600, DefaultResult="ABANDON", **kwargs):
+        self._call("put_lifecycle_hook")
+        hooks = self.groups[AutoScalingGroupName]["LifecycleHooks"]
+        hooks[:] = [h for h in hooks if h["LifecycleHookName"] != LifecycleHookName]
+        hooks.append({"LifecycleHookName": LifecycleHookName, "AutoScalingGroupName": AutoScalingGroupName,
+                      "LifecycleTransition": LifecycleTransition, "HeartbeatTimeout": HeartbeatTimeout,
+                      "DefaultResult": DefaultResult})
+        return {}
+
+    def record_lifecycle_action_heartbeat(self, LifecycleHookName, AutoScalingGroupName, InstanceId, **kwargs):
+        self._call("record_lifecycle_action_heartbeat")
+        group, inst = self._find(InstanceId, AutoScalingGroupName)
+        hook = next(h for h in group["LifecycleHooks"] if h["LifecycleHookName"] == LifecycleHookName)
+        if inst["LifecycleState"] != "Terminating:Wait":
+            raise ValueError(f"ValidationError: no active lifecycle action for {InstanceId}")
+        self._hook_deadlines[InstanceId] = self.clock() + hook["HeartbeatTimeout"]
+        if self.bus is not None:
+            self.bus.call_later(hook["HeartbeatTimeout"], self._refresh, group)
+        return {}
+
+    def complete_lifecycle_action(self, LifecycleHookName, AutoScalingGroupName, LifecycleActionResult,
+                                  InstanceId, **kwargs):
+        self._call("complete_lifecycle_action")
+        group, inst = self._find(InstanceId, AutoScalingGroupName)
+        if inst["LifecycleState"] != "Terminating:Wait":
+            raise ValueError(f"ValidationError: no active lifecycle action for {InstanceId}")
+        self._finish_termination(group, inst)
+        return {}
+
+    def set_instance_protection(self, InstanceIds, AutoScalingGroupName, ProtectedFromScaleIn, **kwargs):
+        self._call("set_instance_protection")
+        for instance_id in InstanceIds:
+            self._find(instance_id, AutoScalingGroupName)[1]["ProtectedFromScaleIn"] = ProtectedFromScaleIn
+        return {}
+
+    def describe_auto_scaling_instances(self, InstanceIds=None, **kwargs):
+        self._call("describe_auto_scaling_instances")
+        found = []
+        for name, group in self.groups.items():
+            self._refresh(group)
+            for inst in group["Instances"]:
+                if InstanceIds is None or inst["InstanceId"] in InstanceIds:
+                    found.append(dict(inst, AutoScalingGroupName=name))
+        return {"AutoScalingInstances": found}
+
+
+class FakeSNS:
+    def __init__(self, latency=0.0, max_rate=None):
+        self.latency = latency
+        self.limit = ApiRateLimit(max_rate) if max_rate else None
+        self.messages = []
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def publish(self, TopicArn, Message, Subject=None, **kwargs):
+        with self._lock:
+            self.calls["publish"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.limit is not None:
+            self.limit.check("publish")
+        self.messages.append({"TopicArn": TopicArn, "Message": Message, "Subject": Subject})
+        return {"MessageId": str(uuid.uuid4())}
+
+
+class FakeSQS:
+    """
+    Standard queues held in memory. latency adds a sleep to every call so
+    client-side concurrency behaves as it would against the real endpoint.
+    Received messages stay in flight until deleted or until their
+    visibility timeout lapses, then become receivable again. max_rate
+    throttles as in FakeAutoScaling.
+    """
+
+    MAX_BATCH = 10
+    DEFAULT_VISIBILITY = 30
+
+    class exceptions:
+        class QueueDoesNotExist(Exception):
+            pass
+
+        class ReceiptHandleIsInvalid(Exception):
+            pass
+
+    def __init__(self, latency=0.0, region="eu-north-1", account="000000000000", max_rate=None):
+        self.latency = latency
+        self.limit = ApiRateLimit(max_rate) if max_rate else None
+        self.base_url = f"https://sqs.{region}.amazonaws.com/{account}/"
+        self.queues = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)
+        self._receipts = itertools.count(1)
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.limit is not None:
+            self.limit.check(name)
+
+    def _queue(self, url):
+        queue = self.queues.get(url)
+        if queue is None:
+            raise self.exceptions.QueueDoesNotExist(url)
+        return queue
+
+    def create_queue(self, QueueName, Attributes=None, **kwargs):
+        self._call("create_queue")
+        url = self.base_url + QueueName
+        visibility = int((Attributes or {}).get("VisibilityTimeout", self.DEFAULT_VISIBILITY))
+        self.queues.setdefault(url, {
+            "messages": deque(), "sent": 0, "visibility": visibility,
+            "inflight": {},  # receipt handle -> [message, visible again at]
+            "expiry": [],    # heap of (visible again at, receipt handle)
+        })
+        return {"QueueUrl": url}
+
+    def get_queue_url(self, QueueName, **kwargs):
+        self._call("get_queue_url")
+        url = self.base_url + QueueName
+        self._queue(url)
+        return {"QueueUrl": url}
+
+    def _enqueue(self, queue, body):
+        message_id = str(uuid.uuid4())
+        md5 = hashlib.md5(body.encode()).hexdigest()
+        with self._lock:
+            queue["messages"].append({"MessageId": message_id, "Body": body, "MD5OfBody": md5,
+                                      "SentTimestamp": time.time(), "ReceiveCount": 0})
+            queue["sent"] += 1
+            self._arrived.notify()
+        return {"MessageId": message_id, "MD5OfMessageBody": md5}
+
+    def _expire(self, queue, now):
+        """Return lapsed in-flight messages to the queue (lock held)."""
+        expiry, inflight = queue["expiry"], queue["inflight"]
+        while expiry and expiry[0][0] <= now:
+            _, receipt = heapq.heappop(expiry)
+            entry = inflight.get(receipt)
+            if entry is not None and entry[1] <= now:  # not extended since
+                del inflight[receipt]
+                queue["messages"].appendleft(entry[0])
+                self._arrived.notify()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call("send_message")
+        return self._enqueue(self._queue(QueueUrl), MessageBody)
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        self._call("send_message_batch")
+        queue = self._queue(QueueUrl)
+        if len(Entries) > self.MAX_BATCH:
+            raise ValueError(f"TooManyEntriesInBatchRequest: {len(Entries)}")
+        successful = [dict(self._enqueue(queue, e["MessageBody"]), Id=e["Id"]) for e in Entries]
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None, **kwargs):
+        self._call("receive_message")
+        queue = self._queue(QueueUrl)
+        if not 1 <= MaxNumberOfMessages <= self.MAX_BATCH:
+            raise ValueError(f"InvalidParameterValue: MaxNumberOfMessages={MaxNumberOfMessages}")
+        visibility = queue["visibility"] if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.time() + WaitTimeSeconds
+        received = []
+        with self._arrived:
+            while True:
+                now = time.time()
+                self._expire(queue, now)
+                if queue["messages"] or now >= deadline:
+                    break
+                wake = deadline if not queue["expiry"] else min(deadline, queue["expiry"][0][0])
+                self._arrived.wait(max(0.0, wake - now))
+            messages = queue["messages"]
+            while messages and len(received) < MaxNumberOfMessages:
+                message = messages.popleft()
+                message["ReceiveCount"] += 1
+                receipt = f"{message['MessageId']}#{next(self._receipts)}"
+                queue["inflight"][receipt] = [message, now + visibility]
+                heapq.heappush(queue["expiry"], (now + visibility, receipt))
+                received.append({
+                    "MessageId": message["MessageId"],
+                    "ReceiptHandle": receipt,
+                    "Body": message["Body"],
+                    "MD5OfBody": message["MD5OfBody"],
+                    "Attributes": {"ApproximateReceiveCount": str(message["ReceiveCount"]),
+                                   "SentTimestamp": str(int(message["SentTimestamp"] * 1000))},
+                })
+        return {"Messages": received} if received else {}
+
+    def _delete(self, queue, receipt):
+        with self._lock:
+            return queue["inflight"].pop(receipt, None) is not None
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        self._call("delete_message")
+        if not self._delete(self._queue(QueueUrl), ReceiptHandle):
+            raise self.exceptions.ReceiptHandleIsInvalid(ReceiptHandle)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries, **kwargs):
+        self._call("delete_message_batch")
+        queue = self._queue(QueueUrl)
+        if len(Entries) > self.MAX_BATCH:
+            raise ValueError(f"TooManyEntriesInBatchRequest: {len(Entries)}")
+        successful, failed = [], []
+        for e in Entries:
+            if self._delete(queue, e["ReceiptHandle"]):
+                successful.append({"Id": e["Id"]})
+            else:
+                failed.append({"Id": e["Id"], "SenderFault": True, "Code": "ReceiptHandleIsInvalid"})
+        return {"Successful": successful, "Failed": failed}
+
+    def _change_visibility(self, queue, receipt, timeout):
+        with self._lock:
+            entry = queue["inflight"].get(receipt)
+            if entry is None:
+                return False
+            entry[1] = time.time() + timeout
+            heapq.heappush(queue["expiry"], (entry[1], receipt))
+            if timeout <= 0:
+                self._expire(queue, entry[1])
+            return True
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout, **kwargs):
+        self._call("change_message_visibility")
+        if not self._change_visibility(self._queue(QueueUrl), ReceiptHandle, VisibilityTimeout):
+            raise self.exceptions.ReceiptHandleIsInvalid(ReceiptHandle)
+        return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries, **kwargs):
+        self._call("change_message_visibility_batch")
+        queue = self._queue(QueueUrl)
+        if len(Entries) > self.MAX_BATCH:
+            raise ValueError(f"TooManyEntriesInBatchRequest: {len(Entries)}")
+        successful, failed = [], []
+        for e in Entries:
+            if self._change_visibility(queue, e["ReceiptHandle"], e["VisibilityTimeout"]):
+                successful.append({"Id": e["Id"]})
+            else:
+                failed.append({"Id": e["Id"], "SenderFault": True, "Code": "ReceiptHandleIsInvalid"})
+        return {"Successful": successful, "Failed": failed}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None, **kwargs):
+        self._call("get_queue_attributes")
+        queue = self._queue(QueueUrl)
+        with self._lock:
+            self._expire(queue, time.time())
+            visible, inflight = len(queue["messages"]), len(queue["inflight"])
+        return {"Attributes": {
+            "QueueArn": "arn:aws:sqs:local:" + QueueUrl.rsplit("/", 1)[-1],
+            "ApproximateNumberOfMessages": str(visible),
+            "ApproximateNumberOfMessagesNotVisible": str(inflight),
+        }}
@@ -0,0 +1,319 @@
+# Filename: metrics_store.py
+#
+# Embedded append-only time-series store for scaler and dashboard samples.
+# Each series is a fixed-size ring of float64 columns (memory-bounded),
+# optionally backed by a memory-mapped file so history survives restarts,
+# with 1m / 5m / 1h rollups (mean, min, max) maintained on append. Queries
+# pick the finest resolution that still fits max_points, so charting
+# weeks of history reads a few thousand rows at most.
+#
+# A store directory has one writing process: the writer holds an exclusive
+# lock on it, and a second writer gets StoreLocked instead of tearing the
+# ring headers. Other processes open it readonly. All rings of a series
+# share one file, so a series costs one file descriptor.
+
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows): one writer per directory is up to the deployment
+    fcntl = None
+
+# resolution -> (bucket seconds, ring capacity)
+ROLLUPS = {
+    "1m": (60, 60 * 24 * 31),       # 31 days
+    "5m": (300, 12 * 24 * 183),     # ~6 months
+    "1h": (3600, 24 * 366 * 2),     # 2 years
+}
+RAW_CAPACITY = 60 * 24 * 14        # two weeks at one sample per minute
+
+_HEADER = struct.Struct("<4sqqqq")  # magic, width, capacity, head, count
+_HEADER_SIZE = 64
+_MAGIC = b"TSR1"
+
+
+class StoreLocked(RuntimeError):
+    pass
+
+
+class RingBuffer:
+    """
+    capacity rows of width float64 columns; column 0 is the timestamp.
+    Lives at offset in buf (a memory-mapped series file), otherwise in its
+    own bytearray. A zeroed region is a new, empty ring.
+    """
+
+    def __init__(self, width, capacity, buf=None, offset=0, readonly=False):
+        self.width = width
+        self.capacity = capacity
+        size = self.size(width, capacity)
+        if buf is None:
+            buf = bytearray(size)
+        self._buf = buf
+        self._offset = offset
+        magic, w, c, head, count = _HEADER.unpack_from(buf, offset)
+        if magic == _MAGIC:
+            if w != width or c != capacity:
+                raise ValueError("incompatible ring layout")
+            self.head, self.count = head % capacity, min(count, capacity)
+        elif magic == bytes(4):
+            self.head = self.count = 0
+        else:
+            raise ValueError("not a ring buffer")
+        self._data = memoryview(buf)[offset + _HEADER_SIZE:offset + size].cast("d")
+        if not readonly:
+            self._write_header()
+
+    @staticmethod
+    def size(width, capacity):
+        return _HEADER_SIZE + width * capacity * 8
+
+    def _write_header(self):
+        _HEADER.pack_into(self._buf, self._offset, _MAGIC, self.width, self.capacity, self.head, self.count)
+
+    def append(self, row):
+        base = self.head * self.width
+        self._data[base:base + self.width] = memoryview(struct.pack(f"<{self.width}d", *row)).cast("d")
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, i):
+        return (self.head - self.count + i) % self.capacity
+
+    def timestamp(self, i):
+        return self._data[self._slot(i) * self.width]
+
+    def row(self, i):
+        base = self._slot(i) * self.width
+        return tuple(self._data[base:base + self.width])
+
+    def last_timestamp(self):
+        return self.timestamp(self.count - 1) if self.count else None
+
+    def bisect(self, t):
+        """First logical index whose timestamp is >= t."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, lo, hi):
+        return [self.row(i) for i in range(lo, hi)]
+
+    def release(self):
+        self._data.release()
+
+
+def _map_file(path, size, readonly=False):
+    """mmap of a whole series file, created (zeroed) if missing or of another size when writing."""
+    if readonly:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size != size:
+                raise ValueError(f"{path}: incompatible series layout")
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    exists = os.path.exists(path) and os.path.getsize(path) == size
+    # The map keeps its own descriptor; the file object is closed right away
+    with open(path, "r+b" if exists else "w+b") as f:
+        if not exists:
+            f.truncate(size)
+        return mmap.mmap(f.fileno(), size)
+
+
+class Series:
+    """One metric: raw (ts, value) ring plus (ts, mean, min, max) rollup rings, in one file."""
+
+    def __init__(self, name, directory=None, raw_capacity=RAW_CAPACITY, readonly=False):
+        layout = [("raw", 2, raw_capacity)] + [(res, 4, cap) for res, (_, cap) in ROLLUPS.items()]
+        self.name = name
+        self._map = None
+        if directory:
+            size = sum(RingBuffer.size(width, cap) for _, width, cap in layout)
+            self._map = _map_file(os.path.join(directory, f"{name}.ring"), size, readonly)
+        rings, offset = {}, 0
+        for res, width, cap in layout:
+            rings[res] = RingBuffer(width, cap, self._map, offset, readonly)
+            if self._map is not None:
+                offset += RingBuffer.size(width, cap)
+        self.raw = rings.pop("raw")
+        self.rollups = rings
+        self._open = {}  # res -> [bucket start, sum, count, min, max]
+        self.lock = threading.Lock()
+        self._reopen_buckets()
+
+    def _reopen_buckets(self):
+        """
+        Rebuild the buckets still filling when the file was last written
+        from the raw ring's tail; they only reach the rollup rings once the
+        next bucket starts, so a restart must not drop them.
+        """
+        last = self.raw.last_timestamp()
+        if last is None:
+            return
+        for res, (seconds, _) in ROLLUPS.items():
+            start = last - last % seconds
+            previous = self.rollups[res].last_timestamp()
+            if previous is not None and previous >= start:
+                continue
+            values = [row[1] for row in self.raw.rows(self.raw.bisect(start), len(self.raw))]
+            self._open[res] = [start, sum(values), len(values), min(values), max(values)]
+
+    def append(self, ts, value):
+        with self.lock:
+            last = self.raw.last_timestamp()
+            if last is not None and ts < last:
+                return False  # append-only: drop out-of-order samples
+            self.raw.append((ts, value))
+            for res, (seconds, _) in ROLLUPS.items():
+                start = ts - ts % seconds
+                bucket = self._open.get(res)
+                if bucket is not None and bucket[0] != start:
+                    self.rollups[res].append((bucket[0], bucket[1] / bucket[2], bucket[3], bucket[4]))
+                    bucket = None
+                if bucket is None:
+                    self._open[res] = [start, value, 1, value, value]
+                else:
+                    bucket[1] += value
+                    bucket[2] += 1
+                    bucket[3] = min(bucket[3], value)
+                    bucket[4] = max(bucket[4], value)
+            return True
+
+    def query(self, start, end, max_points=2000):
+        """
+        Samples in [start, end) at the finest resolution that fits max_points.
+        Returns (resolution, [timestamps], [values]); rollup values are means.
+        """
+        with self.lock:
+            lo, hi = self.raw.bisect(start), self.raw.bisect(end)
+            # Once the raw ring has wrapped past start, only rollups cover the window
+            wrapped = len(self.raw) == self.raw.capacity and self.raw.timestamp(0) > start
+            if hi - lo <= max_points and not wrapped:
+                rows = self.raw.rows(lo, hi)
+                return "raw", [r[0] for r in rows], [r[1] for r in rows]
+            for res, ring in self.rollups.items():
+                lo, hi = ring.bisect(start), ring.bisect(end)
+                if hi - lo <= max_points:
+                    break
+            rows = ring.rows(max(lo, hi - max_points), hi)
+            bucket = self._open.get(res)
+            points = [(r[0], r[1]) for r in rows]
+            if bucket is not None and start <= bucket[0] < end:
+                points.append((bucket[0], bucket[1] / bucket[2]))
+            return res, [p[0] for p in points], [p[1] for p in points]
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        with self.lock:
+            for ring in [self.raw] + list(self.rollups.values()):
+                ring.release()
+            if self._map is not None:
+                self._map.close()
+
+
+_locked_dirs = set()  # POSIX locks do not exclude a second opener in the same process
+_locked_lock = threading.Lock()
+
+
+def _lock_directory(directory):
+    """Exclusive writer lock on a store directory; raises StoreLocked if another writer has it."""
+    key = os.path.realpath(directory)
+    with _locked_lock:
+        if key in _locked_dirs:
+            raise StoreLocked(f"{directory} is already open for writing in this process")
+        handle = open(os.path.join(directory, "writer.lock"), "a+")
+        if fcntl is not None:
+            try:
+                fcntl.lockf(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                raise StoreLocked(f"{directory} is open for writing by another process") from None
+        _locked_dirs.add(key)
+    return key, handle
+
+
+class MetricsStore:
+    """
+    Named series created on first append. directory=None keeps everything in
+    memory; otherwise each series is a memory-mapped file there. readonly
+    opens a directory another process writes (no lock, no new series).
+    """
+
+    def __init__(self, directory=None, raw_capacity=RAW_CAPACITY, readonly=False):
+        self.directory = directory
+        self.raw_capacity = raw_capacity
+        self.readonly = readonly
+        self._series = {}
+        self._lock = threading.Lock()
+        self._writer = None
+        if directory:
+            if not readonly:
+                os.makedirs(directory, exist_ok=True)
+                self._writer = _lock_directory(directory)
+            names = (f[:-len(".ring")] for f in os.listdir(directory) if f.endswith(".ring"))
+            for name in sorted(n for n in names if "." not in n):
+                try:
+                    self.series(name)
+                except ValueError as e:
+                    if not readonly:
+                        raise
+                    print(f"METRICS SERIES SKIPPED: {name} ({e})")
+
+    def series(self, name):
+        series = self._series.get(name)
+        if series is None:
+            if not re.fullmatch(r"[A-Za-z0-9_\-]+", name):
+                raise ValueError(f"invalid series name: {name}")
+            with self._lock:
+                series = self._series.get(name)
+                if series is None:
+                    series = self._series[name] = Series(name, self.directory, self.raw_capacity, self.readonly)
+        return series
+
+    def names(self):
+        return sorted(self._series)
+
+    def append(self, name, value, ts=None):
+        if self.readonly:
+            raise ValueError("metrics store is open readonly")
+        return self.series(name).append(time.time() if ts is None else ts, float(value))
+
+    def append_many(self, values, ts=None):
+        ts = time.time() if ts is None else ts
+        for name, value in values.items():
+            self.append(name, value, ts)
+
+    def query(self, name, start, end=None, max_points=2000):
+        if name not in self._series:
+            return "raw", [], []
+        return self._series[name].query(start, time.time() if end is None else end, max_points)
+
+    def flush(self):
+        for series in list(self._series.values()):
+            series.flush()
+
+    def close(self):
+        for series in list(self._series.values()):
+            series.close()
+        self._series.clear()
+        if self._writer is not None:
+            key, handle = self._writer
+            handle.close()  # releases the lock
+            with _locked_lock:
+                _locked_dirs.discard(key)
+            self._writer = None
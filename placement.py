@@ -0,0 +1,224 @@
+# Filename: placement.py
+#
+# Bin-packing placement of allocate_resources() results onto worker nodes.
+# Free capacity is indexed so a placement does not scan the whole fleet:
+#   first-fit -> segment tree of per-dimension max free capacity
+#   best-fit  -> sorted index of (free cpu, free memory, free storage, slot),
+#                falling back to the segment tree when cpu is not the binding
+#                dimension and the tightest candidates are short on memory/storage
+#
+# The tree prunes a subtree only when one dimension's max falls short, so a
+# search is O(log n) while free capacity is roughly proportional across
+# dimensions (identical instance types, one binding dimension). When nodes
+# fit on one dimension but not another the maxima stop pruning and a search
+# degrades to O(n); bench_placement.py measures both cases.
+
+from bisect import bisect_left, insort
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:  # plain sorted list: O(log n) search, O(n) memmove on update
+    SortedList = None
+
+RESOURCES = ("cpu", "memory", "storage")
+STRATEGIES = ("first-fit", "best-fit")
+
+# Capacity of a worker by EC2 instance type (vCPU, GB, GB)
+DEFAULT_INSTANCE_CAPACITY = {"cpu": 8, "memory": 32, "storage": 500}
+
+# Best-fit candidates examined in the sorted index before falling back to first-fit
+BEST_FIT_SCAN = 32
+
+
+class _SortedIndex:
+    """Minimal SortedList stand-in used when sortedcontainers is missing."""
+
+    def __init__(self):
+        self._items = []
+
+    def add(self, item):
+        insort(self._items, item)
+
+    def remove(self, item):
+        del self._items[bisect_left(self._items, item)]
+
+    def bisect_left(self, item):
+        return bisect_left(self._items, item)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class _MaxSegmentTree:
+    """Per-dimension max of free capacity over node slots."""
+
+    def __init__(self, capacity=1):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.trees = [[-1] * (2 * self.size) for _ in RESOURCES]
+
+    def _grow(self):
+        old_size, old_trees = self.size, self.trees
+        self.__init__(old_size * 2)
+        for d, tree in enumerate(old_trees):
+            leaves = tree[old_size:2 * old_size]
+            self.trees[d][self.size:self.size + old_size] = leaves
+            for i in range(self.size - 1, 0, -1):
+                self.trees[d][i] = max(self.trees[d][2 * i], self.trees[d][2 * i + 1])
+
+    def set(self, slot, free):
+        while slot >= self.size:
+            self._grow()
+        i = slot + self.size
+        for d, tree in enumerate(self.trees):
+            tree[i] = free[d]
+            j = i // 2
+            while j:
+                value = max(tree[2 * j], tree[2 * j + 1])
+                if tree[j] == value:
+                    break
+                tree[j] = value
+                j //= 2
+
+    def first_fit(self, need):
+        """
+        Leftmost slot whose free capacity covers need, or None.
+        O(log n) when some dimension's max prunes the subtrees that cannot
+        fit; O(n) when every subtree passes the per-dimension check but no
+        single node covers need on all dimensions.
+        """
+        cpu, mem, sto = self.trees
+        c, m, s = need
+        stack = [1]
+        while stack:
+            i = stack.pop()
+            if cpu[i] < c or mem[i] < m or sto[i] < s:
+                continue
+            if i >= self.size:
+                return i - self.size
+            stack.append(2 * i + 1)
+            stack.append(2 * i)
+        return None
+
+
+class Placer:
+    """
+    Online placement engine. Feed it allocation dicts one at a time with
+    place(), or a whole batch with place_all() (first/best-fit-decreasing).
+    nodes: iterable of {"id", "cpu", "memory", "storage"} free capacities
+    node_template: capacity of a fresh instance, used when nothing fits
+    """
+
+    def __init__(self, nodes=(), node_template=None, strategy="best-fit"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy: {strategy}")
+        self.strategy = strategy
+        self.node_template = node_template
+        self.ids = []
+        self.free = []
+        self.used = []
+        self.new_instances = 0
+        nodes = list(nodes)
+        self._tree = _MaxSegmentTree(len(nodes))
+        self._index = (SortedList() if SortedList is not None else _SortedIndex()) if strategy == "best-fit" else None
+        for node in nodes:
+            self.add_node(node["id"], node)
+
+    def add_node(self, node_id, capacity):
+        slot = len(self.ids)
+        free = tuple(capacity[r] for r in RESOURCES)
+        self.ids.append(node_id)
+        self.free.append(free)
+        self.used.append(False)
+        self._index_set(slot, None, free)
+        return slot
+
+    def _index_set(self, slot, old, new):
+        self._tree.set(slot, new)
+        if self._index is not None:
+            if old is not None:
+                self._index.remove(old + (slot,))
+            self._index.add(new + (slot,))
+
+    def _find(self, need):
+        index = self._index
+        if index is not None:
+            # Tightest cpu fit first; walk forward past a few nodes short on memory/storage
+            i = index.bisect_left((need[0],))
+            end = min(i + BEST_FIT_SCAN, len(index))
+            while i < end:
+                c, m, s, slot = index[i]
+                if m >= need[1] and s >= need[2]:
+                    return slot
+                i += 1
+            if end == len(index):
+                return None
+        return self._tree.first_fit(need)
+
+    def place(self, allocation):
+        """Place one task. Returns the node id, or None if it cannot fit anywhere."""
+        need = tuple(allocation[r] for r in RESOURCES)
+        slot = self._find(need)
+        if slot is None:
+            template = self.node_template
+            if template is None or any(template[r] < n for r, n in zip(RESOURCES, need)):
+                return None
+            self.new_instances += 1
+            slot = self.add_node(f"new-{self.new_instances}", template)
+        old = self.free[slot]
+        new = tuple(f - n for f, n in zip(old, need))
+        self.free[slot] = new
+        self.used[slot] = True
+        self._index_set(slot, old, new)
+        return self.ids[slot]
+
+    def place_all(self, allocations, decreasing=True):
+        """
+        Place a batch of allocations. decreasing=True sorts the largest tasks
+        first (FFD / BFD), which packs tighter than arrival order.
+        Returns: {"assignments": [(task index, node id)], "unplaced": [task index],
+                  "instances_needed": int, "new_instances": int}
+        """
+        order = range(len(allocations))
+        if decreasing:
+            order = sorted(order, key=lambda i: tuple(allocations[i][r] for r in RESOURCES), reverse=True)
+        assignments, unplaced = [], []
+        for i in order:
+            node_id = self.place(allocations[i])
+            if node_id is None:
+                unplaced.append(i)
+            else:
+                assignments.append((i, node_id))
+        return {
+            "assignments": assignments,
+            "unplaced": unplaced,
+            "instances_needed": self.instances_needed,
+            "new_instances": self.new_instances,
+        }
+
+    @property
+    def instances_needed(self):
+        """Nodes hosting at least one task — what the ASG actually has to run."""
+        return sum(self.used)
+
+
+# -------------------------------
+# HELPERS
+# -------------------------------
+def nodes_from_asg(asg_instances, capacity_by_type=None, default_capacity=DEFAULT_INSTANCE_CAPACITY):
+    """Free-capacity nodes for the InService instances of a describe_auto_scaling_groups response."""
+    capacity_by_type = capacity_by_type or {}
+    return [
+        dict(capacity_by_type.get(inst.get("InstanceType"), default_capacity), id=inst["InstanceId"])
+        for inst in asg_instances
+        if inst.get("LifecycleState") == "InService"
+    ]
+
+
+def instances_needed(allocations, nodes=(), node_template=DEFAULT_INSTANCE_CAPACITY, strategy="best-fit"):
+    """Instance count required to host every allocation (packed largest-first)."""
+    return Placer(nodes, node_template, strategy).place_all(allocations)["instances_needed"]
@@ -0,0 +1,296 @@
+# Filename: policies.py
+#
+# Named allocation policies loaded from a JSON config file.
+# task_load is bounded (0-100), so every policy is compiled once into a
+# lookup table and the request path is a single index.
+
+import json
+import math
+import os
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # batch lookups fall back to plain Python
+    np = None
+
+MIN_LOAD = 0
+MAX_LOAD = 100
+RESOURCES = ("cpu", "memory", "storage")
+
+# Built-in policy: the original hard-coded clamps of dynamic.allocate_resources
+DEFAULT_CONFIG = {
+    "default": "linear",
+    "classes": {},
+    "policies": {
+        "linear": {
+            "type": "rules",
+            "cpu": {"type": "linear", "divisor": 10, "min": 1, "max": 8},          # 1-8 vCPUs
+            "memory": {"type": "linear", "scale": 0.5, "min": 1, "max": 32},      # 1-32 GB
+            "storage": {"type": "linear", "scale": 2, "min": 10, "max": 500},     # 10-500 GB
+        }
+    },
+}
+
+
+class PolicyError(ValueError):
+    pass
+
+
+# -------------------------------
+# RULE COMPILERS: config -> fn(task_load)
+# -------------------------------
+def _linear_rule(spec):
+    scale = spec.get("scale")
+    divisor = spec.get("divisor")
+    lo = spec.get("min", 0)
+    hi = spec.get("max", float("inf"))
+
+    def rule(load):
+        value = load * scale if scale is not None else load
+        if divisor:
+            value = value // divisor
+        return min(max(value, lo), hi)
+    return rule
+
+
+def _step_rule(spec):
+    # steps: [[threshold, value], ...] — value of the highest threshold <= load
+    steps = sorted(spec.get("steps", []))
+    if not steps:
+        raise PolicyError("step rule needs at least one [threshold, value] pair")
+
+    def rule(load):
+        value = steps[0][1]
+        for threshold, step_value in steps:
+            if load < threshold:
+                break
+            value = step_value
+        return value
+    return rule
+
+
+RULE_TYPES = {"linear": _linear_rule, "step": _step_rule}
+
+
+def _compile_rules(spec):
+    fns = {}
+    for resource in RESOURCES:
+        rule = spec.get(resource)
+        if rule is None:
+            raise PolicyError(f"missing rule for {resource}")
+        if isinstance(rule, (int, float)):
+            fns[resource] = lambda load, v=rule: v
+            continue
+        kind = rule.get("type", "linear")
+        if kind not in RULE_TYPES:
+            raise PolicyError(f"unknown rule type: {kind}")
+        fns[resource] = RULE_TYPES[kind](rule)
+
+    def evaluate(load):
+        return {r: fns[r](load) for r in RESOURCES}
+    return evaluate
+
+
+def _compile_tiered(spec):
+    # tiers: [{"max_load": 30, "cpu": 1, "memory": 2, "storage": 20}, ...]
+    tiers = sorted(spec.get("tiers", []), key=lambda t: t.get("max_load", float("inf")))
+    if not tiers:
+        raise PolicyError("tiered policy needs at least one tier")
+    for tier in tiers:
+        missing = [r for r in RESOURCES if r not in tier]
+        if missing:
+            raise PolicyError(f"tier missing {', '.join(missing)}")
+
+    def evaluate(load):
+        for tier in tiers:
+            if load <= tier.get("max_load", float("inf")):
+                break
+        return {r: tier[r] for r in RESOURCES}
+    return evaluate
+
+
+POLICY_TYPES = {"rules": _compile_rules, "tiered": _compile_tiered}
+
+
+def _compile_input_rule(spec):
+    """
+    Extra memory/storage for a task's input data:
+      {"memory_per_gb": 0.5, "storage_per_gb": 2, "max_memory": 64, "max_storage": 1000}
+    memory grows with the input, storage is at least input * storage_per_gb.
+    """
+    if not spec:
+        return None
+    memory_per_gb = spec.get("memory_per_gb", 0)
+    storage_per_gb = spec.get("storage_per_gb", 0)
+    max_memory = spec.get("max_memory", float("inf"))
+    max_storage = spec.get("max_storage", float("inf"))
+
+    def apply(allocation, input_size_mb):
+        gb = input_size_mb / 1024
+        if memory_per_gb:
+            allocation["memory"] = min(allocation["memory"] + math.ceil(gb * memory_per_gb), max(allocation["memory"], max_memory))
+        if storage_per_gb:
+            allocation["storage"] = min(max(allocation["storage"], math.ceil(gb * storage_per_gb)), max(allocation["storage"], max_storage))
+        return allocation
+    return apply
+
+
+# -------------------------------
+# COMPILED POLICY
+# -------------------------------
+class CompiledPolicy:
+    """
+    A policy evaluated once for every task_load in MIN_LOAD..MAX_LOAD.
+    lookup() is an index into the table; loads outside the range (or
+    non-integers) are evaluated directly so results never change.
+    """
+
+    def __init__(self, name, spec, input_spec=None):
+        kind = spec.get("type", "rules")
+        if kind not in POLICY_TYPES:
+            raise PolicyError(f"policy {name}: unknown type {kind}")
+        try:
+            self.evaluate = POLICY_TYPES[kind](spec)
+            self.input_rule = _compile_input_rule(spec.get("input", input_spec))
+        except PolicyError as e:
+            raise PolicyError(f"policy {name}: {e}") from None
+        self.name = name
+        self.kind = kind
+        self.table = tuple(self.evaluate(load) for load in range(MIN_LOAD, MAX_LOAD + 1))
+        self.columns = {r: [row[r] for row in self.table] for r in RESOURCES}
+        if np is not None:
+            self.arrays = {r: np.asarray(col) for r, col in self.columns.items()}
+
+    def lookup(self, task_load):
+        if type(task_load) is int and MIN_LOAD <= task_load <= MAX_LOAD:
+            return dict(self.table[task_load])
+        return self.evaluate(task_load)
+
+    def size(self, task_load, input_size_mb=0):
+        """lookup() plus the policy's input-size adjustment."""
+        if input_size_mb and not 0 <= input_size_mb < math.inf:  # NaN fails too
+            raise PolicyError("input_size_mb must be a finite number >= 0")
+        allocation = self.lookup(task_load)
+        if input_size_mb and self.input_rule is not None:
+            allocation = self.input_rule(allocation, input_size_mb)
+        return allocation
+
+    def lookup_batch(self, task_loads):
+        """Columnar lookup for an array of loads: {"cpu": [...], ...}"""
+        if np is not None:
+            loads = np.asarray(task_loads)
+            if loads.dtype.kind in "iu" and (loads.size == 0 or (loads.min() >= MIN_LOAD and loads.max() <= MAX_LOAD)):
+                return {r: self.arrays[r][loads].tolist() for r in RESOURCES}
+            if isinstance(task_loads, np.ndarray):
+                task_loads = task_loads.tolist()  # Python ints, so evaluate() returns JSON-able values
+        rows = [self.lookup(t) for t in task_loads]
+        return {r: [row[r] for row in rows] for r in RESOURCES}
+
+
+# -------------------------------
+# REGISTRY: hot-swappable set of policies
+# -------------------------------
+class PolicyRegistry:
+    """
+    Holds the compiled policies for one config file. reload() compiles a
+    new set off to the side and swaps it in with a single assignment, so
+    requests in flight keep using the set they started with.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._state = self._compile(DEFAULT_CONFIG, version=0)
+        if path:
+            self.reload()
+
+    @staticmethod
+    def _compile(config, version):
+        specs = config.get("policies") or {}
+        if not specs:
+            raise PolicyError("config defines no policies")
+        input_spec = config.get("input")
+        policies = {name: CompiledPolicy(name, spec, input_spec) for name, spec in specs.items()}
+        default = config.get("default") or next(iter(policies))
+        classes = dict(config.get("classes") or {})
+        for name in [default] + list(classes.values()):
+            if name not in policies:
+                raise PolicyError(f"unknown policy referenced: {name}")
+        # task_types: task type (as sent by publishers, e.g. "CPU") -> workload class
+        task_types = {t.lower(): c for t, c in (config.get("task_types") or {}).items()}
+        for workload_class in task_types.values():
+            if workload_class not in classes:
+                raise PolicyError(f"unknown workload class referenced: {workload_class}")
+        # Same config -> same fingerprint in every process, unlike version
+        fingerprint = zlib.crc32(json.dumps(config, sort_keys=True).encode())
+        return {"policies": policies, "default": default, "classes": classes, "task_types": task_types,
+                "version": version, "fingerprint": fingerprint}
+
+    @property
+    def version(self):
+        return self._state["version"]
+
+    @property
+    def fingerprint(self):
+        return self._state["fingerprint"]
+
+    def describe(self):
+        state = self._state
+        return {
+            "version": state["version"],
+            "default": state["default"],
+            "classes": state["classes"],
+            "task_types": state["task_types"],
+            "policies": {name: p.kind for name, p in state["policies"].items()},
+        }
+
+    def get(self, name=None, workload_class=None, task_type=None):
+        state = self._state
+        if name is None:
+            if workload_class is None and task_type is not None:
+                workload_class = state["task_types"].get(str(task_type).lower())
+            name = state["classes"].get(workload_class, state["default"])
+        try:
+            return state["policies"][name]
+        except KeyError:
+            raise PolicyError(f"unknown policy: {name}") from None
+
+    def load_config(self, config):
+        with self._lock:
+            self._state = self._compile(config, version=self._state["version"] + 1)
+        return self._state["version"]
+
+    def reload(self, force=False):
+        """Recompile from self.path if it changed. Returns True when swapped."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        mtime = os.path.getmtime(self.path)
+        if not force and mtime == self._mtime:
+            return False
+        with open(self.path) as f:
+            config = json.load(f)
+        self.load_config(config)
+        self._mtime = mtime
+        print(f"POLICIES LOADED: {self.path} (version {self.version})")
+        return True
+
+    def start_watcher(self, interval=5.0):
+        """Poll the config file's mtime in a daemon thread and hot-swap on change."""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"POLICY RELOAD FAILED: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="policy-watcher", daemon=True)
+        self._watcher.start()
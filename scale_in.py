@@ -0,0 +1,252 @@
+# Filename: scale_in.py
+#
+# Drain-aware scale-in. Lowering DesiredCapacity lets the ASG terminate
+# whichever instances its termination policy picks, killing their running
+# tasks; SQS hands those back only after the visibility timeout and they
+# start over. Instead, the planner picks the least-loaded instances (from
+# the in-flight counts workers report to the shared state store) and
+# terminates exactly those with terminate_instance_in_auto_scaling_group.
+#
+# With the termination lifecycle hook installed (install_drain_hook), a
+# victim waits in "Terminating:Wait": the DrainWatcher on it stops taking
+# new tasks, finishes the ones it holds, and completes the lifecycle
+# action, so nothing is lost. Without the hook, choosing idle instances
+# still loses less than the ASG's own choice.
+#
+# One-time setup:  python scale_in.py --install-hook my-dynamic-asg
+
+import argparse
+import os
+import threading
+import time
+
+DRAIN_HOOK_NAME = os.environ.get("DRAIN_HOOK_NAME", "drain-workers")
+DRAIN_TIMEOUT = int(os.environ.get("DRAIN_TIMEOUT_SECONDS", 900))  # hook timeout; watchers send heartbeats
+REPORT_SECONDS = 15   # worker load report / lifecycle check interval
+LOAD_TTL = 120        # older reports count as unknown load
+TERMINATING_TRANSITION = "autoscaling:EC2_INSTANCE_TERMINATING"
+
+
+def load_key(instance_id):
+    return f"worker:{instance_id}"
+
+
+# -------------------------------
+# WORKER LOAD REPORTS
+# -------------------------------
+class LoadReporter:
+    """Writes one instance's in-flight task count to the state store (single writer per key)."""
+
+    def __init__(self, store, instance_id, asg=None):
+        self.store = store
+        self.key = load_key(instance_id)
+        self.asg = asg
+        self.session = None
+
+    def report(self, inflight, draining=False, now=None):
+        from state_store import StateSession
+
+        fields = {"asg": self.asg, "inflight": inflight, "draining": draining,
+                  "updated": time.time() if now is None else now}
+        for _ in range(2):
+            if self.session is None:
+                self.session = StateSession(self.store, self.key)
+            self.session.load().update(fields)
+            if self.session.commit():
+                return True
+            self.session = None  # stale version (e.g. after a restart): re-read once
+        return False
+
+
+def worker_loads(store, instance_ids, now=None, ttl=LOAD_TTL):
+    """{instance id: in-flight tasks}, None where the report is missing or older than ttl. One batched read."""
+    now = time.time() if now is None else now
+    instance_ids = list(instance_ids)
+    try:
+        items = store.get_items([load_key(i) for i in instance_ids])
+    except Exception as e:
+        print(f"ERROR reading worker loads: {e}")
+        items = {}
+    loads = {}
+    for instance_id in instance_ids:
+        item = items.get(load_key(instance_id))
+        fresh = item is not None and now - item.get("updated", 0) <= ttl
+        loads[instance_id] = item["inflight"] if fresh else None
+    return loads
+
+
+# -------------------------------
+# PLANNING
+# -------------------------------
+def plan_scale_in(instances, loads, count):
+    """
+    Instance ids to remove for a scale-in of count. Booting instances go
+    first (no work yet), then idle ones, then those with no recent report
+    (usually no worker running), then busy ones by in-flight tasks, fewest
+    first. Protected and already terminating instances are never picked:
+    hosts in the group that run no worker (the dashboard) must be
+    protected from scale-in, or they rank as idle.
+    """
+    candidates = [i for i in instances
+                  if i["LifecycleState"] in ("Pending", "InService") and not i.get("ProtectedFromScaleIn")]
+    zones = {}
+    for inst in instances:
+        if inst["LifecycleState"] in ("Pending", "InService"):
+            zones[inst.get("AvailabilityZone")] = zones.get(inst.get("AvailabilityZone"), 0) + 1
+
+    def rank(inst):
+        load = loads.get(inst["InstanceId"])
+        return (inst["LifecycleState"] != "Pending", 1 if load is None else (0 if load == 0 else 2), load or 0,
+                -zones[inst.get("AvailabilityZone")], inst["InstanceId"])
+
+    # Ties go to the zone with the most instances (the ASG's default
+    # policy also balances zones first), then by instance id
+    victims = []
+    for _ in range(min(max(0, count), len(candidates))):
+        victim = min(candidates, key=rank)
+        candidates.remove(victim)
+        zones[victim.get("AvailabilityZone")] -= 1
+        victims.append(victim["InstanceId"])
+    return victims
+
+
+def drain_instances(autoscaling, victims):
+    """Terminate victims, decrementing desired capacity for each. Returns the ids accepted."""
+    terminated = []
+    for instance_id in victims:
+        try:
+            autoscaling.terminate_instance_in_auto_scaling_group(
+                InstanceId=instance_id, ShouldDecrementDesiredCapacity=True)
+            terminated.append(instance_id)
+        except Exception as e:
+            print(f"DRAIN FAILED for {instance_id}: {e}")
+    return terminated
+
+
+def scale_in(autoscaling, instances, count, store=None, loads=None, now=None):
+    """Plan and start a scale-in of count instances; returns the ids now draining. now: the caller's clock."""
+    if loads is None:
+        loads = worker_loads(store, [i["InstanceId"] for i in instances], now) if store is not None else {}
+    return drain_instances(autoscaling, plan_scale_in(instances, loads, count))
+
+
+def install_drain_hook(autoscaling, asg, timeout=DRAIN_TIMEOUT):
+    """Termination lifecycle hook that holds victims in Terminating:Wait while they drain."""
+    autoscaling.put_lifecycle_hook(
+        LifecycleHookName=DRAIN_HOOK_NAME, AutoScalingGroupName=asg, LifecycleTransition=TERMINATING_TRANSITION,
+        HeartbeatTimeout=timeout, DefaultResult="CONTINUE")
+
+
+# -------------------------------
+# WORKER SIDE: drain on termination
+# -------------------------------
+def instance_id_from_metadata(timeout=1.0):
+    """This instance's id from IMDSv2 (INSTANCE_ID overrides); None off EC2."""
+    if os.environ.get("INSTANCE_ID"):
+        return os.environ["INSTANCE_ID"]
+    import urllib.request
+
+    try:
+        token_req = urllib.request.Request("http://169.254.169.254/latest/api/token", method="PUT",
+                                           headers={"X-aws-ec2-metadata-token-ttl-seconds": "60"})
+        token = urllib.request.urlopen(token_req, timeout=timeout).read().decode()
+        id_req = urllib.request.Request("http://169.254.169.254/latest/meta-data/instance-id",
+                                        headers={"X-aws-ec2-metadata-token": token})
+        return urllib.request.urlopen(id_req, timeout=timeout).read().decode()
+    except Exception:
+        return None
+
+
+class DrainWatcher:
+    """
+    Runs next to a worker.Worker: reports its in-flight count and, once the
+    instance enters Terminating:Wait, stops the worker with drain, keeps
+    the lifecycle action alive with heartbeats, then completes it.
+    """
+
+    def __init__(self, autoscaling, worker, instance_id, store=None, interval=REPORT_SECONDS, hook=DRAIN_HOOK_NAME):
+        self.autoscaling = autoscaling
+        self.worker = worker
+        self.instance_id = instance_id
+        self.interval = interval
+        self.hook = hook
+        self.reporter = LoadReporter(store, instance_id) if store is not None else None
+        self.asg = None
+        self.done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="drain-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _report(self, draining=False):
+        if self.reporter is None:
+            return
+        self.reporter.asg = self.asg
+        try:
+            self.reporter.report(self.worker.inflight, draining)
+        except Exception as e:
+            print(f"LOAD REPORT FAILED: {e}")
+
+    def _state(self):
+        resp = self.autoscaling.describe_auto_scaling_instances(InstanceIds=[self.instance_id])
+        for inst in resp.get("AutoScalingInstances", []):
+            self.asg = inst["AutoScalingGroupName"]
+            return inst["LifecycleState"]
+        return None
+
+    def _run(self):
+        while not self.done.is_set():
+            try:
+                state = self._state()
+            except Exception as e:
+                print(f"LIFECYCLE CHECK FAILED: {e}")
+                state = None
+            if state == "Terminating:Wait":
+                self.drain()
+                return
+            self._report()
+            self.done.wait(self.interval)
+
+    def drain(self):
+        print(f"DRAINING {self.instance_id}: {self.worker.inflight} tasks in flight")
+        self._report(draining=True)
+        stopper = threading.Thread(target=self.worker.stop, kwargs={"drain": True}, daemon=True)
+        stopper.start()
+        while stopper.is_alive():
+            stopper.join(self.interval)
+            if stopper.is_alive():
+                self._heartbeat()
+        self._report(draining=True)
+        try:
+            self.autoscaling.complete_lifecycle_action(
+                LifecycleHookName=self.hook, AutoScalingGroupName=self.asg,
+                LifecycleActionResult="CONTINUE", InstanceId=self.instance_id)
+            print(f"DRAINED {self.instance_id}: lifecycle action completed")
+        except Exception as e:
+            print(f"LIFECYCLE COMPLETION FAILED: {e}")  # the hook times out to CONTINUE anyway
+        self.done.set()
+
+    def _heartbeat(self):
+        try:
+            self.autoscaling.record_lifecycle_action_heartbeat(
+                LifecycleHookName=self.hook, AutoScalingGroupName=self.asg, InstanceId=self.instance_id)
+        except Exception as e:
+            print(f"LIFECYCLE HEARTBEAT FAILED: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain-aware scale-in setup")
+    parser.add_argument("--install-hook", metavar="ASG", required=True, help="add the termination lifecycle hook")
+    parser.add_argument("--timeout", type=int, default=DRAIN_TIMEOUT, help="hook heartbeat timeout (s)")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", "eu-north-1"))
+    args = parser.parse_args()
+
+    from aws_clients import LazyClient
+    install_drain_hook(LazyClient("autoscaling", args.region), args.install_hook, args.timeout)
+    print(f"HOOK INSTALLED: {DRAIN_HOOK_NAME} on {args.install_hook} ({args.timeout}s)")
+
+
+if __name__ == "__main__":
+    main()
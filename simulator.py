@@ -0,0 +1,362 @@
+# Filename: simulator.py
+#
+# Offline discrete-event simulator for the scaling Lambda.
+# Replays an arrival trace (tasks per step) against aws_Lambda.lambda_handler
+# with stand-in ASG/SQS/SNS clients on virtual time, models instance boot
+# latency and FIFO service, and reports queue-wait percentiles,
+# instance-hours and scale events. Parameter sweeps run on a process pool;
+# tuner.py replays the decision function alone (run_decisions) for speed.
+#
+# Usage:
+#   python simulator.py --trace diurnal:40 --days 30
+#   python simulator.py --trace trace.csv --sweep HIGH_BACKLOG_THRESHOLD=5,10,20 COOLDOWN_SECONDS=60,300
+
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from local_aws import FakeAutoScaling, FakeSNS
+
+# Scaler settings a simulation (or sweep) may override on aws_Lambda
+TUNABLES = (
+    "HIGH_BACKLOG_THRESHOLD", "LOW_BACKLOG_THRESHOLD", "COOLDOWN_SECONDS",
+    "MAX_INSTANCES", "MIN_INSTANCES", "SCALING_MODE", "FORECAST_HORIZON_SECONDS",
+    "TARGET_TASKS_PER_INSTANCE", "MAX_SCALE_DOWN_STEP",
+    "TARGET_UTILIZATION", "TARGET_BACKLOG_ROUNDS", "INSTANCE_TYPE", "SCALE_IN_MODE",
+)
+
+# aws_Lambda globals a handler replay replaces with stand-ins (then restores)
+PATCHED = ("autoscaling", "sqs", "sns", "state_store", "time", "METRICS_LOG", "metrics")
+
+ARRIVAL, SCALER, READY = 0, 1, 2
+
+
+# -------------------------------
+# TRACES
+# -------------------------------
+def synthetic_trace(kind, steps, level=20.0, seed=0):
+    """
+    Tasks per step for steps of one minute.
+      constant:L   L tasks/min
+      diurnal:L    sine wave peaking at L tasks/min once a day
+      bursty:L     L/4 baseline with random bursts of ~L tasks/min
+    """
+    rng = random.Random(seed)
+    if kind == "constant":
+        return [int(level)] * steps
+    if kind == "diurnal":
+        return [max(0, int(rng.gauss(level / 2 * (1 - math.cos(2 * math.pi * t / 1440)), 1))) for t in range(steps)]
+    if kind == "bursty":
+        trace, burst = [], 0
+        for _ in range(steps):
+            if burst == 0 and rng.random() < 0.01:
+                burst = rng.randint(5, 30)
+            rate = level if burst else level / 4
+            burst = max(0, burst - 1)
+            trace.append(max(0, int(rng.gauss(rate, math.sqrt(rate) + 0.1))))
+        return trace
+    raise ValueError(f"unknown synthetic trace: {kind}")
+
+
+def load_trace(spec, days=1, seed=0):
+    """A synthetic spec ("diurnal:40") or a CSV file whose last column is tasks per minute."""
+    if os.path.exists(spec):
+        trace = []
+        with open(spec) as f:
+            for line in f:
+                field = line.strip().split(",")[-1]
+                try:
+                    trace.append(int(float(field)))
+                except ValueError:
+                    continue  # header
+        return trace
+    kind, _, level = spec.partition(":")
+    return synthetic_trace(kind, int(days * 1440), float(level or 20), seed)
+
+
+# -------------------------------
+# SIMULATION
+# -------------------------------
+class _BacklogQueue:
+    """SQS stand-in whose depth is the simulation's fluid backlog."""
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None, **kwargs):
+        return {"Attributes": {
+            "ApproximateNumberOfMessages": str(math.ceil(self.sim.waiting)),
+            "ApproximateNumberOfMessagesNotVisible": "0",
+        }}
+
+
+class _VirtualTime:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def time(self):
+        return self.sim.now
+
+
+class Simulation:
+    """
+    One replay of a trace. Tasks are served FIFO as a fluid at
+    service_rate tasks/second per InService instance; arrivals in a step
+    enqueue at the start of the step.
+    """
+
+    def __init__(self, trace, step_seconds=60, service_rate=0.1, boot_seconds=90,
+                 scaler_interval=60, initial_instances=1):
+        self.trace = trace
+        self.step_seconds = step_seconds
+        self.service_rate = service_rate
+        self.scaler_interval = scaler_interval
+        self.now = 0.0
+        self.cohorts = deque()  # [arrival time, tasks remaining]
+        self.waiting = 0.0
+        self.waits = []         # (seconds from arrival to completion, tasks)
+        self.instance_seconds = 0.0
+        self.max_backlog = 0.0
+        self.asg = FakeAutoScaling(clock=lambda: self.now, boot_seconds=boot_seconds)
+        self.sqs = _BacklogQueue(self)
+        self.sns = FakeSNS()
+        self.initial_instances = initial_instances
+
+    def _advance(self, t):
+        dt = t - self.now
+        if dt <= 0:
+            return
+        group = self.asg.groups[self.asg_name]
+        instances = group["Instances"]
+        running = sum(1 for i in instances if i["LifecycleState"] == "InService")
+        self.instance_seconds += len(instances) * dt
+        rate = running * self.service_rate
+        capacity = rate * dt
+        clock = self.now
+        cohorts = self.cohorts
+        while capacity > 1e-9 and cohorts:
+            cohort = cohorts[0]
+            take = min(cohort[1], capacity)
+            clock += take / rate
+            self.waits.append((clock - cohort[0], take))
+            capacity -= take
+            self.waiting -= take
+            cohort[1] -= take
+            if cohort[1] <= 1e-9:
+                cohorts.popleft()
+        self.now = t
+
+    def run(self, scaler, params=None):
+        """
+        scaler: the aws_Lambda module; params override its TUNABLES for this run.
+        Its clients, state store, clock and settings are swapped for the
+        run and restored afterwards.
+        """
+        for name in params or {}:
+            if name not in TUNABLES:
+                raise ValueError(f"unknown parameter: {name}")
+        from state_store import open_store
+
+        saved = {name: getattr(scaler, name) for name in PATCHED + tuple(params or ())}
+        described = dict(scaler.asg_instances), dict(scaler.asg_instance_types)
+        stdout = sys.stdout
+        try:
+            for name, value in (params or {}).items():
+                setattr(scaler, name, value)
+            self.asg_name = scaler.ASG_NAME
+            self.asg.create_group(self.asg_name, desired=self.initial_instances, max_size=scaler.MAX_INSTANCES)
+            scaler.autoscaling, scaler.sqs, scaler.sns = self.asg, self.sqs, self.sns
+            scaler.state_store = open_store("memory://")
+            scaler.time = _VirtualTime(self)
+            scaler.METRICS_LOG = False
+            scaler.metrics = None
+            sys.stdout = open(os.devnull, "w")
+            scale_events = self._replay(lambda t: scaler.lambda_handler({}, None))
+        finally:
+            if sys.stdout is not stdout:
+                sys.stdout.close()
+                sys.stdout = stdout
+            for name, value in saved.items():
+                setattr(scaler, name, value)
+            for cache, before in zip((scaler.asg_instances, scaler.asg_instance_types), described):
+                cache.clear()
+                cache.update(before)
+        return self._result(params, scale_events)
+
+    def run_decisions(self, scaler, params=None):
+        """
+        Same replay, calling scaler.decide_capacity directly instead of the
+        handler: no state store, describe batching, alerts or logging, and
+        the module is not modified. Scale-in lowers DesiredCapacity, which
+        without worker load reports picks the same instances as drain mode.
+        Resource mode needs the handler (run()).
+        """
+        from forecast import HoltForecaster
+
+        cfg = {name: getattr(scaler, name) for name in scaler.POOL_SETTINGS}
+        for name, value in (params or {}).items():
+            if name not in TUNABLES:
+                raise ValueError(f"unknown parameter: {name}")
+            cfg[name] = value
+        if cfg["SCALING_MODE"] == "resource":
+            raise ValueError("resource mode needs the full handler replay")
+
+        self.asg_name = scaler.ASG_NAME
+        self.asg.create_group(self.asg_name, desired=self.initial_instances, max_size=cfg["MAX_INSTANCES"])
+        forecaster = HoltForecaster(scaler.FORECAST_ALPHA, scaler.FORECAST_BETA)
+        decide, asg, names = scaler.decide_capacity, self.asg, [self.asg_name]
+        last_scale_time = [0]
+
+        def scale(t):
+            group = asg.describe_auto_scaling_groups(AutoScalingGroupNames=names)["AutoScalingGroups"][0]
+            desired = group["DesiredCapacity"]
+            running = sum(1 for i in group["Instances"] if i["LifecycleState"] == "InService")
+            backlog = math.ceil(self.waiting)
+            forecaster.update(t, backlog)
+            new_capacity, remaining = decide(cfg, desired, running, backlog, t, last_scale_time[0], forecaster)
+            if not remaining and new_capacity != desired:
+                last_scale_time[0] = t
+                asg.update_auto_scaling_group(AutoScalingGroupName=self.asg_name, DesiredCapacity=new_capacity)
+
+        return self._result(params, self._replay(scale))
+
+    def _replay(self, scale):
+        """Event loop over arrivals, scaler runs (scale(t)) and boot completions; returns scale events."""
+        end = len(self.trace) * self.step_seconds
+        seq = itertools.count()
+        events = [(i * self.step_seconds, next(seq), ARRIVAL, n) for i, n in enumerate(self.trace) if n]
+        events.append((0.0, next(seq), SCALER, None))
+        heapq.heapify(events)
+        scheduled = set()
+        scale_events = 0
+        while events:
+            t, _, kind, payload = heapq.heappop(events)
+            if t > end:
+                break
+            self._advance(t)
+            if kind == ARRIVAL:
+                self.cohorts.append([t, float(payload)])
+                self.waiting += payload
+                self.max_backlog = max(self.max_backlog, self.waiting)
+            elif kind == SCALER:
+                group = self.asg.groups[self.asg_name]
+                before = group["DesiredCapacity"]
+                scale(t)
+                scale_events += group["DesiredCapacity"] != before
+                for ready in self.asg.ready_times(self.asg_name):
+                    if ready not in scheduled:
+                        scheduled.add(ready)
+                        heapq.heappush(events, (ready, next(seq), READY, None))
+                heapq.heappush(events, (t + self.scaler_interval, next(seq), SCALER, None))
+        self._advance(end)
+        return scale_events
+
+    def _result(self, params, scale_events):
+        # Tasks still queued at the end count as waiting until the end of
+        # the trace (a lower bound), so runs that fall behind are penalized
+        # rather than scored only on the tasks they got to.
+        waits = self.waits + [(self.now - arrival, left) for arrival, left in self.cohorts]
+        return {
+            "params": params or {},
+            "wait_p50": weighted_percentile(waits, 50),
+            "wait_p90": weighted_percentile(waits, 90),
+            "wait_p99": weighted_percentile(waits, 99),
+            "instance_hours": self.instance_seconds / 3600,
+            "scale_events": scale_events,
+            "max_backlog": math.ceil(self.max_backlog),
+            "unfinished": round(self.waiting),  # the fluid model leaves fractional residue
+        }
+
+
+def weighted_percentile(pairs, pct):
+    if not pairs:
+        return 0.0
+    pairs = sorted(pairs)
+    total = sum(w for _, w in pairs)
+    target = total * pct / 100
+    acc = 0.0
+    for value, weight in pairs:
+        acc += weight
+        if acc >= target:
+            return value
+    return pairs[-1][0]
+
+
+def simulate(trace, params=None, fast=False, **sim_kwargs):
+    """One replay; fast=True goes through decide_capacity only (see Simulation.run_decisions)."""
+    import aws_Lambda
+    start = time.perf_counter()
+    sim = Simulation(trace, **sim_kwargs)
+    result = sim.run_decisions(aws_Lambda, params) if fast else sim.run(aws_Lambda, params)
+    result["wall_seconds"] = time.perf_counter() - start
+    return result
+
+
+def _simulate_args(args):
+    trace, params, sim_kwargs = args
+    return simulate(trace, params, **sim_kwargs)
+
+
+def sweep(trace, grid, workers=None, **sim_kwargs):
+    """Run simulate() for every combination in grid ({name: [values]}) on a process pool."""
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_simulate_args, [(trace, combo, sim_kwargs) for combo in combos]))
+
+
+def _parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline autoscaling simulator")
+    parser.add_argument("--trace", default="diurnal:40", help="CSV file or constant:L / diurnal:L / bursty:L")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--service-rate", type=float, default=0.1, help="tasks/second per instance")
+    parser.add_argument("--boot-seconds", type=float, default=90)
+    parser.add_argument("--scaler-interval", type=float, default=60)
+    parser.add_argument("--set", nargs="*", default=[], metavar="NAME=VALUE", help="fixed scaler parameters")
+    parser.add_argument("--sweep", nargs="*", default=[], metavar="NAME=V1,V2", help="parameter grid")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace, args.days, args.seed)
+    sim_kwargs = {"service_rate": args.service_rate, "boot_seconds": args.boot_seconds,
+                  "scaler_interval": args.scaler_interval}
+    fixed = {k: _parse_value(v) for k, v in (item.split("=", 1) for item in args.set)}
+    grid = {k: [_parse_value(v) for v in vs.split(",")] for k, vs in (item.split("=", 1) for item in args.sweep)}
+    grid.update({k: [v] for k, v in fixed.items()})
+
+    start = time.perf_counter()
+    results = sweep(trace, grid, args.workers, **sim_kwargs) if args.sweep else [simulate(trace, fixed, **sim_kwargs)]
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"trace: {args.trace}, {len(trace)} steps, {sum(trace)} tasks; {len(results)} run(s) in {elapsed:.2f}s")
+    print(f"{'params':<48} | {'p50 s':>7} | {'p99 s':>8} | {'inst-h':>8} | {'scales':>6} | {'unfinished':>10}")
+    for r in results:
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items()) or "(defaults)"
+        print(f"{params:<48} | {r['wait_p50']:7.1f} | {r['wait_p99']:8.1f} | {r['instance_hours']:8.1f} | "
+              f"{r['scale_events']:>6} | {r['unfinished']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# Filename: state_store.py
+#
+# Shared scaler state (cooldown, last action, backlog sample history) with
+# compare-and-swap writes, so concurrent Lambda containers cannot both act
+# on the same cooldown window.
+#
+# Every backend exposes the same DynamoDB-style item API:
+#   get_item(key)                          -> item dict with "version", or None
+#   get_items(keys)                        -> {key: item} for the keys that exist, in one read
+#   put_item(key, data, expected_version)  -> new version, or raises ConditionalCheckFailed
+# expected_version=None means "item must not exist yet".
+# shared is True only for backends every container sees (worker load
+# reports for drain scale-in need one).
+#
+# STATE_STORE_URL selects the backend:
+#   sqlite:///tmp/scaler-state.db   (default; local file, survives warm starts)
+#   dynamodb://table-name           (shared between all containers)
+#   memory://                       (process-local, for simulations)
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ConditionalCheckFailed(Exception):
+    pass
+
+
+# -------------------------------
+# BACKEND: in-process dict
+# -------------------------------
+class MemoryStateStore:
+    """Process-local store. Items are shallow-copied, never serialized."""
+
+    shared = False
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get_item(self, key):
+        item = self._items.get(key)
+        return dict(item) if item is not None else None
+
+    def get_items(self, keys):
+        items = self._items
+        return {key: dict(items[key]) for key in keys if key in items}
+
+    def put_item(self, key, data, expected_version=None):
+        with self._lock:
+            current = self._items.get(key)
+            if (current["version"] if current else None) != expected_version:
+                raise ConditionalCheckFailed(f"{key}: expected version {expected_version}")
+            new_version = 1 if expected_version is None else expected_version + 1
+            self._items[key] = dict(data, version=new_version)
+        return new_version
+
+
+# -------------------------------
+# BACKEND: SQLite (local file)
+# -------------------------------
+class SQLiteStateStore:
+    shared = False
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scaler_state (pk TEXT PRIMARY KEY, version INTEGER NOT NULL, body TEXT NOT NULL)"
+        )
+
+    def get_item(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT version, body FROM scaler_state WHERE pk = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return dict(json.loads(row[1]), version=row[0])
+
+    def get_items(self, keys):
+        keys = list(keys)
+        items = {}
+        for start in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            chunk = keys[start:start + 500]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT pk, version, body FROM scaler_state WHERE pk IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            items.update((pk, dict(json.loads(body), version=version)) for pk, version, body in rows)
+        return items
+
+    def put_item(self, key, data, expected_version=None):
+        body = json.dumps({k: v for k, v in data.items() if k != "version"})
+        with self._lock:
+            if expected_version is None:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO scaler_state (pk, version, body) VALUES (?, 1, ?)", (key, body)
+                )
+                new_version = 1
+            else:
+                cur = self._conn.execute(
+                    "UPDATE scaler_state SET version = version + 1, body = ? WHERE pk = ? AND version = ?",
+                    (body, key, expected_version),
+                )
+                new_version = expected_version + 1
+        if cur.rowcount != 1:
+            raise ConditionalCheckFailed(f"{key}: expected version {expected_version}")
+        return new_version
+
+
+# -------------------------------
+# BACKEND: DynamoDB
+# -------------------------------
+class DynamoDBStateStore:
+    """Table with a string partition key "pk"; items hold "version" (N) and "body" (S)."""
+
+    shared = True
+
+    def __init__(self, table_name, client=None):
+        if client is None:
+            from aws_clients import LazyClient
+            client = LazyClient("dynamodb")
+        self.table_name = table_name
+        self.client = client
+
+    def get_item(self, key):
+        resp = self.client.get_item(TableName=self.table_name, Key={"pk": {"S": key}}, ConsistentRead=True)
+        item = resp.get("Item")
+        if item is None:
+            return None
+        return dict(json.loads(item["body"]["S"]), version=int(item["version"]["N"]))
+
+    def get_items(self, keys):
+        """BatchGetItem, 100 keys per request; unprocessed keys are retried."""
+        keys = list(dict.fromkeys(keys))
+        items = {}
+        for start in range(0, len(keys), 100):
+            request = {self.table_name: {"Keys": [{"pk": {"S": key}} for key in keys[start:start + 100]],
+                                         "ConsistentRead": True}}
+            for attempt in range(5):
+                resp = self.client.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(self.table_name, []):
+                    items[item["pk"]["S"]] = dict(json.loads(item["body"]["S"]), version=int(item["version"]["N"]))
+                request = resp.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+        return items
+
+    def put_item(self, key, data, expected_version=None):
+        body = json.dumps({k: v for k, v in data.items() if k != "version"})
+        new_version = 1 if expected_version is None else expected_version + 1
+        kwargs = {}
+        if expected_version is None:
+            kwargs["ConditionExpression"] = "attribute_not_exists(pk)"
+        else:
+            kwargs["ConditionExpression"] = "version = :v"
+            kwargs["ExpressionAttributeValues"] = {":v": {"N": str(expected_version)}}
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"pk": {"S": key}, "version": {"N": str(new_version)}, "body": {"S": body}},
+                **kwargs,
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            raise ConditionalCheckFailed(f"{key}: expected version {expected_version}") from None
+        return new_version
+
+
+def open_store(url=None):
+    url = url or os.environ.get("STATE_STORE_URL", "sqlite:///tmp/scaler-state.db")
+    scheme, _, rest = url.partition("://")
+    if scheme == "sqlite":
+        return SQLiteStateStore(rest or ":memory:")
+    if scheme == "dynamodb":
+        return DynamoDBStateStore(rest)
+    if scheme == "memory":
+        return MemoryStateStore()
+    raise ValueError(f"unsupported state store: {url}")
+
+
+# -------------------------------
+# PER-INVOCATION SESSION
+# -------------------------------
+class StateSession:
+    """
+    One read, cached for the rest of the invocation, and one conditional
+    write at the end. commit() returns False if another writer got there first.
+    """
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        self.version = None
+        self._data = None
+
+    def seed(self, item):
+        """Use an item already read (e.g. by one get_items for many keys; None = missing) instead of load()'s read."""
+        item = dict(item or {})
+        self.version = item.pop("version", None)
+        self._data = item
+        return self._data
+
+    def load(self):
+        if self._data is None:
+            try:
+                item = self.store.get_item(self.key)
+            except Exception as e:
+                print(f"ERROR reading state: {e}")
+                item = None
+            item = item or {}
+            self.version = item.pop("version", None)
+            self._data = item
+        return self._data
+
+    def commit(self):
+        try:
+            self.version = self.store.put_item(self.key, self.load(), self.version)
+            return True
+        except ConditionalCheckFailed:
+            return False
+        except Exception as e:
+            print(f"ERROR writing state: {e}")
+            return False
@@ -0,0 +1,206 @@
+# Filename: task_publisher.py
+#
+# Batched SQS task publishing and a rate-controlled load generator.
+# Messages go out through send_message_batch (10 per call) on a thread
+# pool; every task gets a unique id.
+#
+# Load generator against the in-process SQS stand-in:
+#   python task_publisher.py --rate 5000 --shape burst --duration 30
+# or against a real queue:
+#   python task_publisher.py --queue-url https://sqs.../cpu-task-queue --rate 200
+
+import argparse
+import json
+import math
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SQS_BATCH_SIZE = 10           # SQS hard limit per send_message_batch
+SQS_BATCH_BYTES = 256 * 1024  # SQS hard limit per batch payload
+PUBLISH_WORKERS = 8
+
+
+def new_task_id():
+    return f"task-{uuid.uuid4().hex}"
+
+
+def make_task(task="CPU", **fields):
+    """Message body for one task, same shape the dashboard has always sent."""
+    return json.dumps(dict({"task": task, "id": new_task_id()}, **fields))
+
+
+def _batches(bodies):
+    batch, size = [], 0
+    for body in bodies:
+        length = len(body.encode())
+        if batch and (len(batch) == SQS_BATCH_SIZE or size + length > SQS_BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(body)
+        size += length
+    if batch:
+        yield batch
+
+
+def _send_batch(sqs, queue_url, batch, retries=2):
+    """Send one batch; entries SQS reports as failed are retried. Returns (sent, failed)."""
+    entries = [{"Id": str(i), "MessageBody": body} for i, body in enumerate(batch)]
+    sent = 0
+    for attempt in range(retries + 1):
+        resp = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        sent += len(resp.get("Successful", []))
+        failed_ids = {f["Id"] for f in resp.get("Failed", []) if not f.get("SenderFault")}
+        sender_faults = len(resp.get("Failed", [])) - len(failed_ids)
+        entries = [e for e in entries if e["Id"] in failed_ids]
+        if not entries:
+            return sent, sender_faults
+        time.sleep(0.05 * 2 ** attempt)
+    return sent, len(entries) + sender_faults
+
+
+class TaskPublisher:
+    """
+    Reusable publisher: one thread pool shared by every publish() call.
+    With an event_bus.EventBus, each sent batch is announced as a
+    "tasks.enqueued" event so event-driven consumers need not poll SQS.
+    """
+
+    def __init__(self, sqs, queue_url, max_workers=PUBLISH_WORKERS, bus=None):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.bus = bus
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="publish")
+
+    def _send(self, batch):
+        sent, failed = _send_batch(self.sqs, self.queue_url, batch)
+        if self.bus is not None and sent:
+            self.bus.publish("tasks.enqueued", queue_url=self.queue_url, count=sent)
+        return sent, failed
+
+    def submit(self, bodies):
+        """Start sending bodies; returns one (future, batch size) pair per batch of up to 10."""
+        return [(self._pool.submit(self._send, batch), len(batch)) for batch in _batches(bodies)]
+
+    def publish(self, bodies):
+        """Send bodies and wait. Returns {"sent": n, "failed": n, "calls": n}."""
+        pending = self.submit(bodies)
+        sent, failed = collect(pending)
+        return {"sent": sent, "failed": failed, "calls": len(pending)}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def collect(pending):
+    """Wait for (future, batch size) pairs; a batch whose send raised counts as failed whole. Returns (sent, failed)."""
+    sent = failed = 0
+    for future, size in pending:
+        try:
+            s, f = future.result()
+        except Exception as e:
+            print(f"BATCH FAILED: {e}")
+            s, f = 0, size
+        sent += s
+        failed += f
+    return sent, failed
+
+
+def publish_tasks(sqs, queue_url, count, task="CPU", max_workers=PUBLISH_WORKERS, bus=None):
+    publisher = TaskPublisher(sqs, queue_url, max_workers, bus)
+    try:
+        return publisher.publish([make_task(task) for _ in range(count)])
+    finally:
+        publisher.close()
+
+
+# -------------------------------
+# LOAD GENERATOR
+# -------------------------------
+def rate_at(shape, t, rate, duration):
+    """
+    Target messages/second at t seconds into the run.
+      constant  flat at rate
+      ramp      0 -> rate over the run
+      burst     rate/5 baseline, full rate for 10% of every 10s period
+      sine      rate/2 +- rate/2, one cycle per minute
+      spike     rate/10 baseline, full rate in the middle 10% of the run
+    """
+    if shape == "constant":
+        return rate
+    if shape == "ramp":
+        return rate * min(t / duration, 1.0) if duration else rate
+    if shape == "burst":
+        return rate if (t % 10) < 1 else rate / 5
+    if shape == "sine":
+        return rate / 2 * (1 - math.cos(2 * math.pi * t / 60))
+    if shape == "spike":
+        return rate if 0.45 * duration <= t < 0.55 * duration else rate / 10
+    raise ValueError(f"unknown shape: {shape}")
+
+
+SHAPES = ("constant", "ramp", "burst", "sine", "spike")
+
+
+def generate_load(publisher, rate, duration, shape="constant", tick=0.05, report_every=1.0):
+    """
+    Publish at the target rate for duration seconds. Each tick sends whatever
+    the integral of rate_at() says is due, so a slow tick is caught up by
+    the next. Returns totals plus the achieved rate.
+    """
+    start = time.perf_counter()
+    due = 0.0
+    queued = 0
+    pending = []
+    next_report = report_every
+    while True:
+        now = time.perf_counter() - start
+        if now >= duration:
+            break
+        due += rate_at(shape, now, rate, duration) * tick
+        n = int(due - queued)
+        if n > 0:
+            pending.extend(publisher.submit(make_task() for _ in range(n)))
+            queued += n
+        if report_every and now >= next_report:
+            print(f"t={now:5.1f}s target={rate_at(shape, now, rate, duration):7.0f}/s queued={queued}")
+            next_report += report_every
+        time.sleep(max(0.0, tick - ((time.perf_counter() - start) - now)))
+    sent, failed = collect(pending)
+    elapsed = time.perf_counter() - start
+    return {"sent": sent, "failed": failed, "calls": len(pending), "seconds": elapsed, "rate": sent / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQS task load generator")
+    parser.add_argument("--queue-url", default=None, help="real SQS queue (default: in-process stand-in)")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", "eu-north-1"))
+    parser.add_argument("--rate", type=float, default=5000, help="peak messages/second")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--shape", choices=SHAPES, default="constant")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.01, help="stand-in per-call latency (s)")
+    args = parser.parse_args()
+
+    if args.queue_url:
+        import boto3
+        from botocore.config import Config
+        sqs = boto3.client("sqs", region_name=args.region, config=Config(max_pool_connections=args.workers))
+        queue_url = args.queue_url
+    else:
+        from local_aws import FakeSQS
+        sqs = FakeSQS(latency=args.latency)
+        queue_url = sqs.create_queue(QueueName="cpu-task-queue")["QueueUrl"]
+
+    publisher = TaskPublisher(sqs, queue_url, args.workers)
+    try:
+        result = generate_load(publisher, args.rate, args.duration, args.shape)
+    finally:
+        publisher.close()
+    print(f"sent={result['sent']} failed={result['failed']} batches={result['calls']} "
+          f"in {result['seconds']:.1f}s -> {result['rate']:.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    main()
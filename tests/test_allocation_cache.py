@@ -0,0 +1,77 @@
+# Filename: test_allocation_cache.py
+#
+# The cache must be transparent: every answer equals what the policy
+# computes for the same descriptor, hit or miss.
+
+import os
+import random
+
+import pytest
+
+from allocation_cache import AllocationCache
+from policies import PolicyError, PolicyRegistry
+
+
+POLICY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "policies.json")
+
+
+@pytest.fixture
+def registry():
+    # The shipped config: task types, classes and the input-size rule
+    return PolicyRegistry(POLICY_FILE)
+
+
+def expected(registry, descriptor):
+    task_type = descriptor.get("task_type")
+    policy = registry.get(descriptor.get("policy"), descriptor.get("workload_class"),
+                          task_type.lower() if task_type else None)
+    return policy.name, policy.size(float(descriptor["task_load"]), float(descriptor.get("input_size_mb") or 0))
+
+
+def test_input_size_is_not_rounded(registry):
+    cache = AllocationCache(registry)
+    for _ in range(2):  # miss, then hit
+        assert cache.allocate({"task_load": 0, "input_size_mb": 3754})[1] == registry.get(None, None).size(0, 3754)
+
+
+@pytest.mark.parametrize("maxsize", [1, 8, 4096])
+def test_cached_answers_match_policy(registry, maxsize):
+    cache = AllocationCache(registry, maxsize=maxsize)
+    rng = random.Random(3)
+    for _ in range(3000):
+        load = rng.randint(-5, 110)
+        descriptor = {
+            "task_load": rng.choice([load, float(load), str(load), load + 0.5]),
+            "task_type": rng.choice([None, "cpu", "CPU", "io"]),
+            "input_size_mb": rng.choice([0, 1, 63, 64, 65, 3754, rng.randint(0, 50000)]),
+        }
+        name, allocation, _ = cache.allocate(descriptor)
+        assert (name, allocation) == expected(registry, descriptor), descriptor
+
+
+def test_equivalent_descriptors_share_an_entry(registry):
+    cache = AllocationCache(registry)
+    assert cache.allocate({"task_load": 50})[2] == "miss"
+    assert cache.allocate({"task_load": "50"})[2] == "hit"
+    assert cache.allocate({"task_load": 50.0, "task_type": None})[2] == "hit"
+
+
+def test_invalid_load_is_rejected(registry):
+    with pytest.raises(PolicyError):
+        AllocationCache(registry).allocate({"task_load": None})
+
+
+@pytest.mark.parametrize("size", [-1, -100000, "-5", float("nan"), float("inf"), "inf", "lots"])
+def test_invalid_input_size_is_rejected(registry, size):
+    cache = AllocationCache(registry)
+    with pytest.raises(PolicyError):
+        cache.allocate({"task_load": 50, "input_size_mb": size})
+    with pytest.raises(PolicyError):
+        cache.allocate({"task_load": 50, "input_size_mb": size})  # nothing was cached
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.parametrize("size", [-1, float("nan"), float("inf")])
+def test_policy_size_rejects_invalid_input_size(registry, size):
+    with pytest.raises(PolicyError):
+        registry.get(None, None).size(50, size)
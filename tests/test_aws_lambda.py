@@ -0,0 +1,90 @@
+# Filename: test_aws_lambda.py
+#
+# The scaling handler against local_aws stand-ins: response shape and
+# state-store round trips.
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import aws_Lambda
+from local_aws import FakeAutoScaling, FakeSNS, FakeSQS
+from state_store import MemoryStateStore
+
+
+class CountingStore(MemoryStateStore):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get_item(self, key):
+        self.reads += 1
+        return super().get_item(key)
+
+    def get_items(self, keys):
+        self.reads += 1
+        return super().get_items(keys)
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    asg, sqs, store = FakeAutoScaling(), FakeSQS(), CountingStore()
+    monkeypatch.setattr(aws_Lambda, "autoscaling", asg)
+    monkeypatch.setattr(aws_Lambda, "sqs", sqs)
+    monkeypatch.setattr(aws_Lambda, "sns", FakeSNS())
+    monkeypatch.setattr(aws_Lambda, "state_store", store)
+    monkeypatch.setattr(aws_Lambda, "metrics", None)
+    monkeypatch.setattr(aws_Lambda, "METRICS_LOG", False)
+    return asg, sqs, store
+
+
+def add_pool(asg, sqs, name, backlog):
+    asg.create_group(name, desired=1, max_size=5)
+    url = sqs.create_queue(QueueName=name)["QueueUrl"]
+    for _ in range(backlog):
+        sqs.send_message(QueueUrl=url, MessageBody="{}")
+    return url
+
+
+def test_default_pool_keeps_the_original_body(fakes, monkeypatch):
+    asg, sqs, _ = fakes
+    url = add_pool(asg, sqs, aws_Lambda.ASG_NAME, backlog=40)
+    monkeypatch.setattr(aws_Lambda, "SCALING_POOLS", "")
+    monkeypatch.setattr(aws_Lambda, "SQS_QUEUE_URL", url)
+    monkeypatch.setattr(aws_Lambda, "POOLS", aws_Lambda.load_pools())
+    response = aws_Lambda.lambda_handler({}, None)
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert "pools" not in body
+    assert (body["desired"], body["running"], body["backlog"], body["action"]) == (2, 1, 40, "up")
+
+
+def test_multi_pool_body_and_one_state_read(fakes, monkeypatch):
+    asg, sqs, store = fakes
+    spec = json.dumps([{"name": f"p{i}", "asg": f"p{i}", "queue_url": add_pool(asg, sqs, f"p{i}", backlog=i * 20)}
+                       for i in range(4)])
+    monkeypatch.setattr(aws_Lambda, "SCALING_POOLS", spec)
+    monkeypatch.setattr(aws_Lambda, "POOLS", aws_Lambda.load_pools())
+    body = json.loads(aws_Lambda.lambda_handler({}, None)["body"])
+    assert sorted(body["pools"]) == ["p0", "p1", "p2", "p3"]
+    assert body["pools"]["p3"]["action"] == "up"
+    assert store.reads == 1
+    assert all(store.get_item(f"p{i}") is not None for i in range(4))  # each pool committed its state
+
+
+@pytest.mark.parametrize("url, mode, expected", [
+    ("memory://", "", "desired"),
+    ("dynamodb://scaler-state", "", "drain"),
+    ("memory://", "drain", "drain"),
+])
+def test_scale_in_mode_follows_state_store(url, mode, expected):
+    # Module-level configuration: import it fresh in a child interpreter
+    env = dict(os.environ, STATE_STORE_URL=url, SCALE_IN_MODE=mode, METRICS_STORE_PATH="")
+    out = subprocess.run([sys.executable, "-c", "import aws_Lambda; print(aws_Lambda.SCALE_IN_MODE)"],
+                         cwd=os.path.dirname(aws_Lambda.__file__), env=env, capture_output=True, text=True, check=True)
+    lines = out.stdout.split()
+    assert lines[-1] == expected
+    assert ("without a shared state store" in out.stdout) == (mode == "drain")
@@ -0,0 +1,227 @@
+# Filename: test_control_plane.py
+#
+# Token bucket AIMD, call coalescing, retries and SNS digests, on a fake clock.
+
+import threading
+
+import pytest
+
+from control_plane import AlertDigest, GuardedClient, SingleFlight, TokenBucket
+from instrumentation import Registry
+from local_aws import ClientError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+# -------------------------------
+# TOKEN BUCKET
+# -------------------------------
+def test_bucket_allows_burst_then_paces(clock):
+    bucket = TokenBucket(10, burst=5, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        assert bucket.acquire()
+    assert clock.now == 1000.0
+    assert bucket.acquire()
+    assert clock.now == pytest.approx(1000.1)
+
+
+def test_bucket_times_out(clock):
+    bucket = TokenBucket(1, burst=1, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=0.5)
+
+
+def test_bucket_short_by_rounding_still_advances(clock):
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        assert len(sleeps) < 10, "acquire is spinning"
+        clock.sleep(seconds)
+
+    bucket = TokenBucket(25, clock=clock, sleep=sleep)
+    bucket.tokens = 1 - 1e-15
+    assert bucket.acquire()
+    assert len(sleeps) == 1
+
+
+def test_throttle_halves_rate_down_to_floor(clock):
+    bucket = TokenBucket(8, clock=clock, sleep=clock.sleep)
+    bucket.throttled()
+    assert bucket.rate == 4
+    assert bucket.tokens <= 0
+    for _ in range(20):
+        bucket.throttled()
+    assert bucket.rate == pytest.approx(8 * 0.05)
+
+
+def test_success_recovers_additively(clock):
+    bucket = TokenBucket(20, clock=clock, sleep=clock.sleep)
+    bucket.throttled()
+    for expected in (11, 12, 13):
+        bucket.success()
+        assert bucket.rate == pytest.approx(expected)
+    for _ in range(50):
+        bucket.success()
+    assert bucket.rate == 20
+
+
+# -------------------------------
+# SINGLE FLIGHT
+# -------------------------------
+def test_concurrent_callers_share_one_call():
+    flights, release, calls, results = SingleFlight(), threading.Event(), [], []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", fn))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    release.wait(0.2)  # let every caller join the leader's flight
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == [("value", False)] + [("value", True)] * 4
+    assert not flights._flights
+
+
+def test_errors_are_raised_and_key_released():
+    def fail():
+        raise ValueError("boom")
+
+    flights = SingleFlight()
+    with pytest.raises(ValueError):
+        flights.do("k", fail)
+    assert flights.do("k", lambda: 2) == (2, False)
+
+
+# -------------------------------
+# GUARDED CLIENT
+# -------------------------------
+class Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.region = "eu-north-1"
+
+    def describe_things(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"Things": kwargs}
+
+    update_thing = describe_things
+
+
+def guarded(client, clock, **kwargs):
+    bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+    return GuardedClient(client, "test", bucket=bucket, sleep=clock.sleep, registry=Registry(), **kwargs), bucket
+
+
+def test_throttles_are_retried_and_slow_the_bucket(clock):
+    client = Flaky([ClientError("Throttling", "DescribeThings"), ClientError("Throttling", "DescribeThings")])
+    wrapped, bucket = guarded(client, clock)
+    assert wrapped.describe_things(Name="a") == {"Things": {"Name": "a"}}
+    assert client.calls == 3
+    assert bucket.rate == pytest.approx(100 / 4 + 100 / 20)
+
+
+def test_gives_up_after_max_attempts(clock):
+    client = Flaky([ClientError("InternalError", "UpdateThing", status=500)] * 5)
+    wrapped, _ = guarded(client, clock, attempts=3)
+    with pytest.raises(ClientError):
+        wrapped.update_thing()
+    assert client.calls == 3
+
+
+def test_client_errors_are_not_retried(clock):
+    client = Flaky([ClientError("ValidationError", "UpdateThing")])
+    wrapped, _ = guarded(client, clock)
+    with pytest.raises(ClientError):
+        wrapped.update_thing()
+    assert client.calls == 1
+
+
+def test_identical_describes_are_coalesced():
+    release = threading.Event()
+
+    class Slow(Flaky):
+        def describe_things(self, **kwargs):
+            release.wait(5)
+            return super().describe_things(**kwargs)
+
+    client = Slow([])
+    wrapped = GuardedClient(client, "test", bucket=TokenBucket(100), registry=Registry())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(wrapped.describe_things(Name="a"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    release.wait(0.2)
+    release.set()
+    for t in threads:
+        t.join()
+    assert client.calls == 1
+    assert results == [{"Things": {"Name": "a"}}] * 4
+    wrapped.update_thing(Name="a")
+    wrapped.update_thing(Name="a")
+    assert client.calls == 3  # writes are never shared
+
+
+def test_non_callables_pass_through(clock):
+    wrapped, _ = guarded(Flaky([]), clock)
+    assert wrapped.region == "eu-north-1"
+
+
+# -------------------------------
+# ALERT DIGEST
+# -------------------------------
+def test_digest_holds_until_window(clock):
+    sent = []
+    digest = AlertDigest(lambda **kw: sent.append(kw), window=60, clock=clock)
+    digest.publish(TopicArn="t", Message="one", Subject="A")
+    digest.publish(TopicArn="t", Message="two", Subject="B")
+    assert digest.flush(force=False) == 0
+    clock.now += 60
+    assert digest.flush(force=False) == 1
+    assert sent[0]["Subject"] == "2 alerts: A, B"
+    assert "one" in sent[0]["Message"] and "two" in sent[0]["Message"]
+    assert digest.pending() == 0
+
+
+def test_urgent_and_full_digests_go_out_at_once(clock):
+    sent = []
+    digest = AlertDigest(lambda **kw: sent.append(kw), window=600, max_pending=3, clock=clock)
+    digest.publish(TopicArn="t", Message="oops", Subject="ERROR", urgent=True)
+    assert sent == [{"TopicArn": "t", "Message": "oops", "Subject": "ERROR"}]
+    for i in range(3):
+        digest.publish(TopicArn="t", Message=str(i), Subject="S")
+    assert len(sent) == 2
+
+
+def test_failed_publish_drops_batch(clock, capsys):
+    def publish(**kwargs):
+        raise RuntimeError("sns down")
+
+    digest = AlertDigest(publish, window=0, clock=clock)
+    digest.publish(TopicArn="t", Message="m")
+    assert digest.flush() == 0
+    assert digest.pending() == 0
+    assert "ALERT FAILED" in capsys.readouterr().out
@@ -0,0 +1,35 @@
+# Filename: test_dynamic.py
+#
+# /allocate and /allocate/batch through the Flask test client.
+
+import struct
+
+import pytest
+
+import dynamic
+
+
+@pytest.fixture(scope="module")
+def client():
+    return dynamic.app.test_client()
+
+
+def test_allocate(client):
+    body = client.post("/allocate", json={"task_load": 50}).get_json()
+    assert body["status"] == "success"
+    assert body["allocation"] == {"cpu": 5, "memory": 25.0, "storage": 100}
+
+
+@pytest.mark.parametrize("loads", [[5, 50, 100], [5, 150, 50], [-1, 0, 101]])
+def test_batch_binary_body_matches_json(client, loads):
+    binary = client.post("/allocate/batch", data=struct.pack(f"<{len(loads)}i", *loads),
+                         content_type="application/octet-stream").get_json()
+    as_json = client.post("/allocate/batch", json=loads).get_json()
+    assert binary["status"] == "success", binary
+    assert binary == as_json
+    assert binary["allocation"]["cpu"] == [dynamic.allocate_resources(t)["cpu"] for t in loads]
+
+
+def test_batch_binary_body_must_be_whole_int32s(client):
+    body = client.post("/allocate/batch", data=b"\x01\x02\x03", content_type="application/octet-stream").get_json()
+    assert body["status"] == "error"
@@ -0,0 +1,143 @@
+# Filename: test_event_scaler.py
+#
+# Event-driven scaler on a virtual-time bus: model updates, debounce and
+# max_delay, cooldown retries.
+
+import pytest
+
+from event_bus import EventBus
+from event_scaler import EventDrivenScaler, lifecycle_from_eventbridge
+
+QUEUE = "https://sqs.local/q"
+POOL = {"name": "p", "asg": "asg-p", "queue_url": QUEUE}
+
+
+class FakeScaler:
+    """The parts of aws_Lambda the event scaler calls; scale_pool answers from `responses`."""
+
+    POOLS = [POOL]
+
+    class alerts:
+        @staticmethod
+        def flush(force=True):
+            return 0
+
+    def __init__(self, desired=2, running=2, backlog=0):
+        self.state = (desired, running)
+        self.backlog = backlog
+        self.calls = []
+        self.responses = []
+
+    def get_asg_states(self, names):
+        return {name: self.state for name in names}
+
+    def get_backlogs(self, urls):
+        return {url: self.backlog for url in urls}
+
+    def scale_pool(self, pool, desired, running, backlog, now):
+        self.calls.append((now, desired, running, backlog))
+        return self.responses.pop(0) if self.responses else {"status": "ok", "desired": desired}
+
+
+@pytest.fixture
+def setup():
+    bus = EventBus(threaded=False)
+    scaler = FakeScaler()
+    service = EventDrivenScaler(bus, scaler, debounce=2, max_delay=10).start()
+    return bus, scaler, service
+
+
+def at(bus, t, topic, **payload):
+    bus.run(until=t)
+    bus.now = t
+    bus.publish(topic, **payload)
+    bus.run(until=t)  # deliver it
+
+
+def test_seed_reads_asg_and_queue_once(setup):
+    _, _, service = setup
+    assert service.snapshot() == {"p": {"desired": 2, "running": 2, "backlog": 0}}
+
+
+def test_events_update_the_model(setup):
+    bus, _, service = setup
+    at(bus, 0, "tasks.enqueued", queue_url=QUEUE, count=10)
+    at(bus, 0, "tasks.completed", queue_url=QUEUE, count=3)
+    at(bus, 0, "instance.lifecycle", asg="asg-p", instance_id="i-1", state="InService", previous="Pending")
+    assert service.snapshot()["p"] == {"desired": 2, "running": 3, "backlog": 7}
+    at(bus, 0, "tasks.completed", queue_url=QUEUE, count=50)
+    at(bus, 0, "instance.lifecycle", asg="asg-p", instance_id="i-2", state="Terminating:Wait", previous="InService")
+    at(bus, 0, "tasks.enqueued", queue_url="https://sqs.local/other", count=5)
+    assert service.snapshot()["p"] == {"desired": 2, "running": 2, "backlog": 0}
+    at(bus, 0, "queue.depth", queue_url=QUEUE, depth=42)
+    assert service.snapshot()["p"]["backlog"] == 42
+
+
+def test_burst_gives_one_decision_after_debounce(setup):
+    bus, scaler, _ = setup
+    for t in (0, 0.5, 1.0, 1.5):
+        at(bus, t, "tasks.enqueued", queue_url=QUEUE, count=5)
+    bus.run(until=3.4)
+    assert scaler.calls == []
+    bus.run(until=3.5)
+    assert scaler.calls == [(3.5, 2, 2, 20)]
+    bus.run()
+    assert len(scaler.calls) == 1
+
+
+def test_max_delay_bounds_a_continuous_burst(setup):
+    bus, scaler, _ = setup
+    for i in range(30):  # one event a second for 30 seconds
+        at(bus, i, "tasks.enqueued", queue_url=QUEUE, count=1)
+    bus.run(until=29.9)
+    assert [c[0] for c in scaler.calls] == [10, 20]
+    bus.run()
+    assert [c[0] for c in scaler.calls] == [10, 20, 30]
+
+
+def test_unchanged_model_does_not_decide(setup):
+    bus, scaler, _ = setup
+    at(bus, 0, "queue.depth", queue_url=QUEUE, depth=0)
+    bus.run()
+    assert scaler.calls == []
+
+
+def test_scaling_publishes_capacity_change(setup):
+    bus, scaler, service = setup
+    changes = []
+    bus.subscribe("capacity.changed", lambda event: changes.append(event.payload))
+    scaler.responses = [{"status": "scaled", "desired": 3}]
+    at(bus, 0, "tasks.enqueued", queue_url=QUEUE, count=50)
+    bus.run()
+    assert changes == [{"asg": "asg-p", "desired": 3}]
+    assert service.snapshot()["p"]["desired"] == 3
+    assert len(scaler.calls) == 1  # its own capacity change is not a new decision
+
+
+def test_cooldown_is_retried(setup):
+    bus, scaler, _ = setup
+    scaler.responses = [{"status": "cooldown", "desired": 2, "retry_in": 30}]
+    at(bus, 0, "tasks.enqueued", queue_url=QUEUE, count=50)
+    bus.run()
+    assert [c[0] for c in scaler.calls] == [2, 32]
+
+
+def test_failed_decision_is_logged(setup, capsys):
+    bus, scaler, service = setup
+
+    def fail(*args):
+        raise RuntimeError("throttled")
+
+    scaler.scale_pool = fail
+    at(bus, 0, "tasks.enqueued", queue_url=QUEUE, count=5)
+    bus.run()
+    assert "EVENT DECISION FAILED" in capsys.readouterr().out
+    assert not service.decisions
+
+
+def test_eventbridge_mapping():
+    event = {"source": "aws.autoscaling", "detail-type": "EC2 Instance Launch Successful",
+             "detail": {"AutoScalingGroupName": "asg-p", "EC2InstanceId": "i-1"}}
+    assert lifecycle_from_eventbridge(event) == {"asg": "asg-p", "instance_id": "i-1",
+                                                 "state": "InService", "previous": "Pending"}
+    assert lifecycle_from_eventbridge({"source": "aws.events", "detail-type": "Scheduled Event"}) is None
@@ -0,0 +1,99 @@
+# Filename: test_fleet_ops.py
+#
+# Fleet fan-out and the per-host stress operations, with a recording
+# stand-in for the SSH connection pool.
+
+import threading
+import time
+
+import pytest
+
+import fleet_ops
+from fleet_ops import SSHPool, ensure_stress_ng, fan_out, start_stress, stop_stress
+
+
+class RecordingPool:
+    """SSHPool.run / stress_ready surface; statuses maps a command prefix to an exit status."""
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or {}
+        self.commands = []
+        self.stress_ready = set()
+        self._lock = threading.Lock()
+
+    def run(self, ip, command, timeout=fleet_ops.COMMAND_TIMEOUT):
+        with self._lock:
+            self.commands.append((ip, command))
+        status = next((s for prefix, s in self.statuses.items() if command.startswith(prefix)), 0)
+        return status, ""
+
+
+def test_fan_out_runs_hosts_concurrently():
+    barrier = threading.Barrier(4, timeout=5)
+
+    def op(ip, suffix):
+        barrier.wait()  # only passes if all four hosts run at once
+        return ip + suffix
+
+    results = fan_out(["a", "b", "c", "d", "a"], op, "!")
+    assert sorted(results) == ["a", "b", "c", "d"]
+    assert all(r["ok"] and r["result"] == ip + "!" for ip, r in results.items())
+
+
+def test_fan_out_reports_errors_and_timeouts():
+    release = threading.Event()
+
+    def op(ip):
+        if ip == "bad":
+            raise RuntimeError("x" * 200)
+        if ip == "slow":
+            release.wait(5)
+        return "ok"
+
+    start = time.perf_counter()
+    results = fan_out(["good", "bad", "slow"], op, timeout=0.2)
+    release.set()
+    assert time.perf_counter() - start < 2
+    assert results["good"]["ok"]
+    assert not results["bad"]["ok"] and results["bad"]["result"] == "x" * 80
+    assert results["slow"] == {"ok": False, "result": "timed out after 0.2s", "seconds": 0.2}
+    assert fan_out([], op) == {}
+
+
+def test_stress_ng_installed_once_per_host():
+    pool = RecordingPool()
+    assert start_stress(pool, "10.0.0.1", cores=4, duration=60) == "Running"
+    assert start_stress(pool, "10.0.0.1") == "Running"
+    commands = [c for _, c in pool.commands]
+    assert sum("apt-get install" in c for c in commands) == 1
+    assert "stress-ng --cpu 4 --timeout 60" in commands[1]
+    assert stop_stress(pool, "10.0.0.1") == "Stopped"
+    assert pool.commands[-1][1].startswith("pkill -f stress-ng")
+
+
+def test_failed_install_is_not_cached():
+    pool = RecordingPool({"command -v stress-ng": 100})
+    with pytest.raises(RuntimeError, match="exit 100"):
+        ensure_stress_ng(pool, "10.0.0.1")
+    assert "10.0.0.1" not in pool.stress_ready
+    results = fan_out(["10.0.0.1"], lambda ip: start_stress(pool, ip))
+    assert not results["10.0.0.1"]["ok"]
+
+
+def test_broken_connection_is_dropped():
+    class Broken:
+        closed = False
+
+        def exec_command(self, command, timeout=None):
+            raise EOFError("connection reset")
+
+        def close(self):
+            self.closed = True
+
+    client = Broken()
+    pool = SSHPool("ubuntu")
+    pool.get = lambda ip: pool._clients.setdefault(ip, client)
+    with pytest.raises(EOFError):
+        pool.run("10.0.0.1", "true")
+    assert client.closed
+    assert "10.0.0.1" not in pool._clients
@@ -0,0 +1,81 @@
+# Filename: test_forecast.py
+#
+# Holt backlog forecaster and the capacity target derived from it.
+
+import json
+import random
+
+import pytest
+
+from forecast import HoltForecaster, target_capacity
+
+
+def test_first_sample_sets_level():
+    f = HoltForecaster()
+    assert f.forecast(60) == 0.0
+    f.update(0, 40)
+    assert (f.level, f.trend, f.error) == (40.0, 0.0, 0.0)
+    assert f.forecast(60) == 40.0
+
+
+@pytest.mark.parametrize("spacing", ["regular", "irregular"])
+def test_trend_follows_a_ramp_per_second(spacing):
+    rng = random.Random(1)
+    f = HoltForecaster()
+    t = 0.0
+    for _ in range(200):
+        f.update(t, 2.0 * t)  # two tasks a second
+        t += 60 if spacing == "regular" else rng.uniform(10, 120)
+    assert f.trend == pytest.approx(2.0, rel=0.01)
+    assert f.forecast(180, margin=0) == pytest.approx(f.level + 360, rel=1e-9)
+
+
+def test_out_of_order_samples_do_not_move_the_model():
+    f = HoltForecaster()
+    f.update(100, 10)
+    f.update(160, 20)
+    before = (f.level, f.trend, f.error)
+    f.update(160, 500)
+    f.update(150, 500)
+    assert (f.level, f.trend, f.error) == before
+
+
+def test_forecast_adds_error_margin_and_never_goes_negative():
+    f = HoltForecaster()
+    for t, backlog in enumerate([50, 10, 60, 5, 40, 0]):
+        f.update(t * 60, backlog)
+    assert f.error > 0
+    assert f.forecast(0, margin=2) == pytest.approx(max(0.0, f.level + 2 * f.error))
+    falling = HoltForecaster()
+    for t in range(10):
+        falling.update(t * 60, 100 - 10 * t)
+    assert falling.forecast(3600) == 0.0
+
+
+def test_round_trip_through_json():
+    f = HoltForecaster(window=5)
+    for t in range(8):
+        f.update(t * 30, t * t)
+    restored = HoltForecaster.from_dict(json.loads(json.dumps(f.to_dict())), window=5)
+    assert restored.to_dict() == f.to_dict()
+    f.update(300, 70)
+    restored.update(300, 70)
+    assert restored.forecast(120) == f.forecast(120)
+    assert HoltForecaster.from_dict(None).level is None
+
+
+def test_ready_after_three_samples():
+    f = HoltForecaster()
+    for t in range(3):
+        assert not f.ready
+        f.update(t, 1)
+    assert f.ready
+
+
+@pytest.mark.parametrize("backlog, expected", [(0, 1), (1, 1), (10, 1), (11, 2), (95, 5), (10_000, 5)])
+def test_target_capacity_is_clamped(backlog, expected):
+    assert target_capacity(backlog, 10, 1, 5) == expected
+
+
+def test_target_capacity_without_per_instance_target():
+    assert target_capacity(3, 0, 1, 7) == 7
@@ -0,0 +1,80 @@
+# Filename: test_instrumentation.py
+#
+# Sharded metrics: totals survive threads exiting, and exited threads'
+# shards are released.
+
+import threading
+
+from instrumentation import Counter, Histogram, bucket_index, bucket_upper
+
+
+def run_threads(fn, count):
+    for _ in range(count):
+        t = threading.Thread(target=fn)
+        t.start()
+        t.join()
+
+
+def test_shards_of_exited_threads_are_folded():
+    counter, histogram = Counter(), Histogram()
+
+    def work():
+        counter.inc()
+        histogram.record_ns(1500)
+
+    run_threads(work, 500)
+    assert counter.value == 500
+    assert histogram.snapshot()["count"] == 500
+    assert len(counter._shards) == 0 and len(histogram._shards) == 0
+
+
+def test_live_thread_shards_are_counted():
+    counter = Counter()
+    release = threading.Event()
+    started = threading.Barrier(4)
+
+    def work():
+        counter.inc(2)
+        started.wait()
+        release.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for t in threads:
+        t.start()
+    started.wait()
+    assert counter.value == 6
+    release.set()
+    for t in threads:
+        t.join()
+    assert counter.value == 6
+
+
+def test_equal_shards_retire_their_own_cell():
+    counter = Counter()
+    counted, more, done = threading.Event(), threading.Event(), threading.Event()
+
+    def live():
+        counter.inc(2)
+        counted.set()
+        more.wait()
+        counter.inc()
+        done.set()
+        more.wait()
+
+    t = threading.Thread(target=live)
+    t.start()
+    counted.wait()
+    run_threads(lambda: counter.inc(2), 1)  # exits with a cell equal to the live one
+    more.set()
+    done.wait()
+    assert counter.value == 5
+    t.join()
+    assert counter.value == 5
+    assert not counter._shards
+
+
+def test_bucket_bounds_contain_value():
+    for ns in (0, 1, 15, 16, 17, 1000, 123456, 10 ** 9):
+        index = bucket_index(ns)
+        assert bucket_upper(index) >= ns
+        assert index == 0 or bucket_upper(index - 1) < ns
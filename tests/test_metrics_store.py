@@ -0,0 +1,97 @@
+# Filename: test_metrics_store.py
+#
+# Ring wrap, rollup queries and persistence of the file-backed metrics store.
+
+import pytest
+
+from metrics_store import MetricsStore, RingBuffer, Series, StoreLocked
+
+
+def test_ring_wraps_keeping_newest_rows():
+    ring = RingBuffer(2, 4)
+    for i in range(10):
+        ring.append((i, i * 10))
+    assert len(ring) == 4
+    assert ring.rows(0, 4) == [(6, 60), (7, 70), (8, 80), (9, 90)]
+    assert ring.bisect(7.5) == 2
+    assert ring.last_timestamp() == 9
+
+
+def test_out_of_order_samples_dropped():
+    series = Series("s")
+    assert series.append(100, 1.0)
+    assert not series.append(99, 2.0)
+    assert series.query(0, 200) == ("raw", [100], [1.0])
+
+
+def test_query_uses_raw_when_it_fits():
+    series = Series("s")
+    for i in range(120):
+        series.append(i * 60, float(i))
+    res, ts, values = series.query(0, 120 * 60)
+    assert res == "raw"
+    assert len(ts) == 120
+    assert values[-1] == 119.0
+
+
+def test_query_falls_back_to_rollups():
+    series = Series("s")
+    for i in range(600):  # ten hours at one sample a minute
+        series.append(i * 60, float(i))
+    res, ts, values = series.query(0, 600 * 60, max_points=200)
+    assert res == "5m"
+    assert len(ts) == 120
+    assert ts[:2] == [0, 300]
+    assert values[0] == pytest.approx(2.0)  # mean of 0..4
+    assert values[-1] == pytest.approx(597.0)  # the still-filling last bucket
+
+
+def test_query_uses_rollups_once_raw_wrapped():
+    series = Series("s", raw_capacity=10)
+    for i in range(30):
+        series.append(i * 60, float(i))
+    res, ts, _ = series.query(0, 30 * 60)
+    assert res == "1m"
+    assert ts[0] == 0
+    assert len(ts) == 30
+
+
+def test_rollups_survive_reopen(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    for i in range(100):  # ends mid-way through a 5m and a 1h bucket
+        store.append("cpu", i % 7, ts=i * 20)
+    expected = {res: store.query("cpu", 0, 3600, max_points=n) for res, n in [("1m", 40), ("5m", 8), ("1h", 1)]}
+    store.close()
+
+    store = MetricsStore(str(tmp_path))
+    try:
+        for res, n in [("1m", 40), ("5m", 8), ("1h", 1)]:
+            assert store.query("cpu", 0, 3600, max_points=n) == expected[res]
+            assert expected[res][0] == res
+        # Samples appended after the restart land in the same open buckets
+        store.append("cpu", 6, ts=100 * 20)
+        assert store.series("cpu")._open["1h"][2] == 101
+    finally:
+        store.close()
+
+
+def test_readonly_reader_sees_open_buckets(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    for i in range(10):
+        store.append("cpu", float(i), ts=i * 20)
+    store.flush()
+    reader = MetricsStore(str(tmp_path), readonly=True)
+    try:
+        assert reader.query("cpu", 0, 3600, max_points=1) == ("5m", [0], [4.5])
+    finally:
+        reader.close()
+        store.close()
+
+
+def test_second_writer_is_refused(tmp_path):
+    store = MetricsStore(str(tmp_path))
+    try:
+        with pytest.raises(StoreLocked):
+            MetricsStore(str(tmp_path))
+    finally:
+        store.close()
@@ -0,0 +1,104 @@
+# Filename: test_placement.py
+#
+# First-fit / best-fit placement against a brute-force scan.
+
+import math
+import random
+
+import pytest
+
+import placement
+from placement import Placer, instances_needed, nodes_from_asg
+
+TEMPLATE = placement.DEFAULT_INSTANCE_CAPACITY
+
+
+def node(i, cpu, memory, storage=500):
+    return {"id": f"i-{i}", "cpu": cpu, "memory": memory, "storage": storage}
+
+
+def task(cpu, memory, storage=10):
+    return {"cpu": cpu, "memory": memory, "storage": storage}
+
+
+def test_first_fit_takes_leftmost_node():
+    placer = Placer([node(0, 1, 4), node(1, 4, 16), node(2, 8, 32)], strategy="first-fit")
+    assert placer.place(task(2, 8)) == "i-1"
+    assert placer.place(task(2, 8)) == "i-1"
+    assert placer.place(task(2, 8)) == "i-2"
+
+
+def test_best_fit_takes_tightest_node():
+    placer = Placer([node(0, 8, 32), node(1, 2, 8), node(2, 4, 16)], strategy="best-fit")
+    assert placer.place(task(2, 8)) == "i-1"
+    assert placer.place(task(3, 8)) == "i-2"
+
+
+def test_best_fit_skips_nodes_short_on_memory():
+    nodes = [node(i, 2, 1) for i in range(placement.BEST_FIT_SCAN * 2)] + [node(99, 8, 32)]
+    placer = Placer(nodes, strategy="best-fit")
+    assert placer.place(task(2, 4)) == "i-99"
+
+
+def test_nothing_fits_without_template():
+    placer = Placer([node(0, 8, 2), node(1, 1, 32)], strategy="first-fit")
+    assert placer.place(task(4, 16)) is None
+    assert placer.new_instances == 0
+
+
+def test_new_instance_from_template():
+    placer = Placer([node(0, 1, 1)], TEMPLATE)
+    assert placer.place(task(4, 16)) == "new-1"
+    assert placer.place(task(4, 16)) == "new-1"
+    assert placer.place(task(4, 16)) == "new-2"
+    assert placer.place(task(16, 16)) is None
+    assert placer.instances_needed == 2
+
+
+@pytest.mark.parametrize("strategy", placement.STRATEGIES)
+def test_first_fit_matches_linear_scan(strategy):
+    rng = random.Random(3)
+    nodes = [node(i, rng.randint(0, 8), rng.randint(0, 32), rng.randint(0, 50)) for i in range(300)]
+    placer = Placer(nodes, strategy=strategy)
+    for _ in range(500):
+        need = (rng.randint(1, 4), rng.randint(1, 16), rng.randint(1, 20))
+        fits = [i for i, free in enumerate(placer.free) if all(f >= n for f, n in zip(free, need))]
+        if strategy == "first-fit":
+            assert placer._tree.first_fit(need) == (fits[0] if fits else None)
+        node_id = placer.place(dict(zip(placement.RESOURCES, need)))
+        assert (node_id is None) == (not fits)
+        if node_id is not None:
+            assert placer.ids.index(node_id) in fits
+    assert all(min(free) >= 0 for free in placer.free)
+
+
+def test_tree_grows_past_initial_capacity():
+    placer = Placer([node(0, 1, 1)], strategy="first-fit")
+    for i in range(1, 40):
+        placer.add_node(f"i-{i}", node(i, 1, 1))
+    placer.add_node("big", node(40, 8, 32))
+    assert placer.place(task(4, 16)) == "big"
+
+
+@pytest.mark.parametrize("strategy", placement.STRATEGIES)
+def test_place_all_respects_capacity_bound(strategy):
+    rng = random.Random(5)
+    tasks = [task(rng.choice([1, 2, 4]), rng.choice([2, 4, 8, 16])) for _ in range(200)]
+    result = Placer((), TEMPLATE, strategy).place_all(tasks)
+    lower = max(math.ceil(sum(t[r] for t in tasks) / TEMPLATE[r]) for r in placement.RESOURCES)
+    assert not result["unplaced"]
+    assert sorted(i for i, _ in result["assignments"]) == list(range(200))
+    assert lower <= result["instances_needed"] == instances_needed(tasks, strategy=strategy)
+
+
+def test_nodes_from_asg_uses_in_service_capacity():
+    instances = [
+        {"InstanceId": "i-1", "InstanceType": "c5.xlarge", "LifecycleState": "InService"},
+        {"InstanceId": "i-2", "InstanceType": "m5.large", "LifecycleState": "InService"},
+        {"InstanceId": "i-3", "InstanceType": "c5.xlarge", "LifecycleState": "Pending"},
+    ]
+    nodes = nodes_from_asg(instances, {"c5.xlarge": {"cpu": 4, "memory": 8, "storage": 100}})
+    assert nodes == [
+        {"cpu": 4, "memory": 8, "storage": 100, "id": "i-1"},
+        dict(TEMPLATE, id="i-2"),
+    ]
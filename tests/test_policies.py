@@ -0,0 +1,40 @@
+# Filename: test_policies.py
+#
+# The compiled default policy must reproduce the original clamps in
+# dynamic.allocate_resources exactly, in and out of the 0-100 table.
+
+import os
+
+import pytest
+
+from policies import PolicyRegistry
+
+
+def baseline(task_load):
+    cpu = min(max(task_load // 10, 1), 8)
+    memory = min(max(task_load * 0.5, 1), 32)
+    storage = min(max(task_load * 2, 10), 500)
+    return {"cpu": cpu, "memory": memory, "storage": storage}
+
+
+POLICY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "policies.json")
+
+
+@pytest.fixture(scope="module", params=[None, POLICY_FILE], ids=["builtin", "policies.json"])
+def policy(request):
+    return PolicyRegistry(request.param).get(None, None)
+
+
+@pytest.mark.parametrize("task_load", list(range(-20, 151)) + [0.5, 7.5, 55.25, 99.9, 1e6])
+def test_default_policy_matches_baseline_clamps(policy, task_load):
+    result = policy.lookup(task_load)
+    assert result == baseline(task_load)
+    assert [type(v) for v in result.values()] == [type(v) for v in baseline(task_load).values()]
+
+
+def test_lookup_batch_matches_lookup(policy):
+    loads = [0, 5, 50, 100, -3, 150, 77]
+    columns = policy.lookup_batch(loads)
+    rows = [policy.lookup(t) for t in loads]
+    for resource, values in columns.items():
+        assert values == [row[resource] for row in rows]
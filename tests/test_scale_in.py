@@ -0,0 +1,97 @@
+# Filename: test_scale_in.py
+#
+# Scale-in planning, worker load reports and the lifecycle-hook drain.
+
+import contextlib
+import io
+
+import scale_in
+from local_aws import FakeAutoScaling, FakeSQS
+from scale_in import DrainWatcher, LoadReporter, plan_scale_in, worker_loads
+from state_store import StateSession, open_store
+from task_publisher import TaskPublisher, make_task
+from worker import Worker
+
+
+def inst(iid, state="InService", zone="a", protected=False):
+    return {"InstanceId": iid, "LifecycleState": state, "AvailabilityZone": zone, "ProtectedFromScaleIn": protected}
+
+
+def test_plan_order_pending_idle_unknown_busy():
+    instances = [inst("busy-5"), inst("busy-1"), inst("unknown"), inst("idle"), inst("booting", "Pending")]
+    loads = {"busy-5": 5, "busy-1": 1, "idle": 0, "booting": 0}
+    assert plan_scale_in(instances, loads, 5) == ["booting", "idle", "unknown", "busy-1", "busy-5"]
+
+
+def test_plan_skips_protected_and_terminating():
+    instances = [inst("dashboard", protected=True), inst("leaving", "Terminating:Wait"), inst("worker")]
+    assert plan_scale_in(instances, {"dashboard": 0, "leaving": 0, "worker": 3}, 3) == ["worker"]
+
+
+def test_plan_balances_zones_on_ties():
+    instances = [inst("a1", zone="a"), inst("b1", zone="b"), inst("b2", zone="b"), inst("b3", zone="b")]
+    loads = dict.fromkeys(["a1", "b1", "b2", "b3"], 0)
+    assert plan_scale_in(instances, loads, 2) == ["b1", "b2"]
+    assert plan_scale_in(instances, loads, 0) == []
+
+
+def test_worker_loads_ignore_stale_and_missing_reports():
+    store = open_store("memory://")
+    LoadReporter(store, "fresh").report(4, now=1000)
+    LoadReporter(store, "stale").report(0, now=1000 - scale_in.LOAD_TTL - 1)
+    assert worker_loads(store, ["fresh", "stale", "missing"], now=1000) == {"fresh": 4, "stale": None, "missing": None}
+
+
+def test_reporter_recovers_from_stale_session():
+    store = open_store("memory://")
+    reporter = LoadReporter(store, "i-1")
+    assert reporter.report(1, now=0)
+    session = StateSession(store, scale_in.load_key("i-1"))  # e.g. a restarted worker
+    session.load()["inflight"] = 9
+    session.commit()
+    assert reporter.report(2, now=1)
+    assert store.get_item(scale_in.load_key("i-1"))["inflight"] == 2
+
+
+def test_scale_in_terminates_least_loaded():
+    asg = FakeAutoScaling()
+    group = asg.create_group("g", desired=3)
+    ids = [i["InstanceId"] for i in group["Instances"]]
+    store = open_store("memory://")
+    for iid, load in zip(ids, [3, 0, 7]):
+        LoadReporter(store, iid).report(load, now=500)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert scale_in.scale_in(asg, group["Instances"], 1, store, now=500) == [ids[1]]
+    assert group["DesiredCapacity"] == 2
+    assert [i["InstanceId"] for i in group["Instances"]] == [ids[0], ids[2]]
+
+
+def test_lifecycle_hook_drain_finishes_tasks():
+    asg = FakeAutoScaling()
+    group = asg.create_group("g", desired=2)
+    scale_in.install_drain_hook(asg, "g", timeout=30)
+    victim = group["Instances"][0]["InstanceId"]
+
+    sqs = FakeSQS()
+    queue_url = sqs.create_queue(QueueName="q")["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url)
+    publisher.publish([make_task("IO", seconds=0.3) for _ in range(4)])
+    publisher.close()
+    store = open_store("memory://")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        worker = Worker(sqs, queue_url, workers=4, mode="thread", wait_seconds=1).start()
+        watcher = DrainWatcher(asg, worker, victim, store, interval=0.05).start()
+        for _ in range(500):
+            if worker.stats["received"] == 4:
+                break
+            watcher.done.wait(0.01)
+        asg.terminate_instance_in_auto_scaling_group(InstanceId=victim, ShouldDecrementDesiredCapacity=True)
+        assert asg._find(victim)[1]["LifecycleState"] == "Terminating:Wait"
+        assert watcher.done.wait(10)
+
+    assert worker.stats["deleted"] == 4
+    assert victim not in [i["InstanceId"] for i in group["Instances"]]
+    assert store.get_item(scale_in.load_key(victim))["draining"] is True
+    attrs = sqs.get_queue_attributes(QueueUrl=queue_url)["Attributes"]
+    assert attrs["ApproximateNumberOfMessages"] == attrs["ApproximateNumberOfMessagesNotVisible"] == "0"
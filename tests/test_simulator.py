@@ -0,0 +1,38 @@
+# Filename: test_simulator.py
+#
+# Handler replays must leave the aws_Lambda module as they found it, and
+# match the decisions-only replay.
+
+import aws_Lambda
+import simulator
+
+TRACE = simulator.load_trace("bursty:20", 0.2)
+
+
+def module_state():
+    return {name: getattr(aws_Lambda, name) for name in simulator.PATCHED + simulator.TUNABLES}
+
+
+def test_run_restores_the_scaler_module():
+    before = module_state()
+    simulator.simulate(TRACE, {"HIGH_BACKLOG_THRESHOLD": 3, "COOLDOWN_SECONDS": 0})
+    simulator.simulate(TRACE, {"MAX_INSTANCES": 2})
+    after = module_state()
+    assert after.keys() == before.keys()
+    for name in before:
+        assert after[name] is before[name], name
+
+
+def test_params_do_not_leak_between_runs():
+    alone = simulator.simulate(TRACE, {"MAX_INSTANCES": 2})
+    simulator.simulate(TRACE, {"HIGH_BACKLOG_THRESHOLD": 3, "COOLDOWN_SECONDS": 0})
+    again = simulator.simulate(TRACE, {"MAX_INSTANCES": 2})
+    alone.pop("wall_seconds"), again.pop("wall_seconds")
+    assert again == alone
+
+
+def test_fast_replay_matches_handler_replay():
+    params = {"HIGH_BACKLOG_THRESHOLD": 5, "COOLDOWN_SECONDS": 120}
+    full, fast = simulator.simulate(TRACE, params), simulator.simulate(TRACE, params, fast=True)
+    full.pop("wall_seconds"), fast.pop("wall_seconds")
+    assert full == fast
@@ -0,0 +1,51 @@
+# Filename: test_state_store.py
+#
+# Compare-and-swap semantics of StateSession on the local backends.
+
+import pytest
+
+from state_store import ConditionalCheckFailed, StateSession, open_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return open_store("memory://")
+    return open_store(f"sqlite://{tmp_path / 'state.db'}")
+
+
+def test_first_commit_creates_item(store):
+    session = StateSession(store, "asg")
+    session.load()["last_scale_time"] = 100
+    assert session.commit()
+    assert store.get_item("asg") == {"last_scale_time": 100, "version": 1}
+
+
+def test_concurrent_sessions_one_wins(store):
+    StateSession(store, "asg").commit()
+    first, second = StateSession(store, "asg"), StateSession(store, "asg")
+    first.load()["last_scale_action"] = "up"
+    second.load()["last_scale_action"] = "down"
+    assert first.commit()
+    assert not second.commit()
+    assert store.get_item("asg")["last_scale_action"] == "up"
+
+
+def test_concurrent_creates_one_wins(store):
+    first, second = StateSession(store, "asg"), StateSession(store, "asg")
+    first.load(), second.load()
+    assert first.commit()
+    assert not second.commit()
+
+
+def test_put_item_rejects_stale_version(store):
+    store.put_item("k", {"a": 1})
+    store.put_item("k", {"a": 2}, expected_version=1)
+    with pytest.raises(ConditionalCheckFailed):
+        store.put_item("k", {"a": 3}, expected_version=1)
+
+
+def test_get_items_returns_existing_keys(store):
+    store.put_item("a", {"n": 1})
+    store.put_item("b", {"n": 2})
+    assert store.get_items(["a", "b", "missing"]) == {"a": {"n": 1, "version": 1}, "b": {"n": 2, "version": 1}}
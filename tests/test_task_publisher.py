@@ -0,0 +1,115 @@
+# Filename: test_task_publisher.py
+#
+# Batching, retries and failure accounting of the SQS task publisher.
+
+import json
+
+import pytest
+
+import task_publisher
+from local_aws import FakeSQS
+from task_publisher import TaskPublisher, generate_load, make_task, rate_at
+
+
+class FlakySQS(FakeSQS):
+    """Fails the first attempt of every entry with a retryable error; raises on batches of `raise_on` entries."""
+
+    def __init__(self, raise_on=None):
+        super().__init__()
+        self.raise_on = raise_on
+        self.seen = set()
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        if len(Entries) == self.raise_on:
+            raise RuntimeError("connection reset")
+        fresh = [e for e in Entries if e["MessageBody"] not in self.seen]
+        self.seen.update(e["MessageBody"] for e in fresh)
+        retried = [e for e in Entries if e not in fresh]
+        resp = super().send_message_batch(QueueUrl, retried) if retried else {"Successful": [], "Failed": []}
+        resp["Failed"] = [{"Id": e["Id"], "SenderFault": False, "Code": "InternalError"} for e in fresh]
+        return resp
+
+
+@pytest.fixture
+def publisher():
+    sqs = FakeSQS()
+    queue_url = sqs.create_queue(QueueName="cpu-task-queue")["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url, max_workers=4)
+    yield publisher
+    publisher.close()
+
+
+def queued(publisher):
+    attrs = publisher.sqs.get_queue_attributes(QueueUrl=publisher.queue_url)["Attributes"]
+    return int(attrs["ApproximateNumberOfMessages"])
+
+
+def test_task_ids_are_unique():
+    ids = {json.loads(make_task())["id"] for _ in range(1000)}
+    assert len(ids) == 1000
+    body = json.loads(make_task("IO", seconds=2))
+    assert body["task"] == "IO" and body["seconds"] == 2
+
+
+def test_batches_split_on_count_and_bytes():
+    assert [len(b) for b in task_publisher._batches(["x"] * 25)] == [10, 10, 5]
+    big = "x" * (task_publisher.SQS_BATCH_BYTES // 3 + 1)
+    assert [len(b) for b in task_publisher._batches([big] * 5)] == [2, 2, 1]
+
+
+def test_publish_sends_everything(publisher):
+    result = publisher.publish([make_task() for _ in range(95)])
+    assert result == {"sent": 95, "failed": 0, "calls": 10}
+    assert queued(publisher) == 95
+
+
+def test_failed_entries_are_retried():
+    sqs = FlakySQS()
+    queue_url = sqs.create_queue(QueueName="q")["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url)
+    try:
+        assert publisher.publish([make_task() for _ in range(15)]) == {"sent": 15, "failed": 0, "calls": 2}
+    finally:
+        publisher.close()
+
+
+def test_raising_batch_counts_its_own_size():
+    sqs = FlakySQS(raise_on=3)
+    queue_url = sqs.create_queue(QueueName="q")["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url)
+    try:
+        # 23 tasks -> batches of 10, 10 and 3; only the short one raises
+        assert publisher.publish([make_task() for _ in range(23)]) == {"sent": 20, "failed": 3, "calls": 3}
+    finally:
+        publisher.close()
+
+
+def test_generate_load_survives_failed_batches():
+    sqs = FlakySQS(raise_on=10)
+    queue_url = sqs.create_queue(QueueName="q")["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url)
+    try:
+        result = generate_load(publisher, rate=400, duration=0.5, report_every=0)
+    finally:
+        publisher.close()
+    assert result["failed"] + result["sent"] > 0
+    assert result["failed"] % 10 == 0
+
+
+def test_enqueued_events_published(publisher):
+    from event_bus import EventBus
+
+    bus = EventBus(threaded=False)
+    counts = []
+    bus.subscribe("tasks.enqueued", lambda event: counts.append(event.payload["count"]))
+    publisher.bus = bus
+    publisher.publish([make_task() for _ in range(12)])
+    bus.run()
+    assert sorted(counts) == [2, 10]
+
+
+@pytest.mark.parametrize("shape", task_publisher.SHAPES)
+def test_rate_shapes_stay_within_peak(shape):
+    rates = [rate_at(shape, t / 10, 100, 60) for t in range(600)]
+    assert all(0 <= r <= 100 for r in rates)
+    assert max(rates) == pytest.approx(100, rel=0.01)
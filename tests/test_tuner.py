@@ -0,0 +1,42 @@
+# Filename: test_tuner.py
+#
+# Pareto frontier selection and the simulator results it is built from.
+
+import simulator
+from tuner import dominated_by, pareto_front
+
+
+def result(p99, hours, unfinished=0):
+    return {"params": {}, "wait_p99": p99, "instance_hours": hours, "unfinished": unfinished}
+
+
+def test_front_keeps_only_non_dominated_runs():
+    a, b, c, d = result(100, 10), result(50, 20), result(120, 15), result(40, 40)
+    assert pareto_front([a, b, c, d]) == [a, b, d]
+    assert dominated_by(c, [a, b, d], "wait_p99") == [a]
+
+
+def test_unfinished_runs_are_not_dropped_by_default():
+    lucky = result(420, 286, unfinished=0)
+    better = result(175, 127, unfinished=1)
+    assert pareto_front([lucky, better]) == [better]
+    assert pareto_front([lucky, better], max_unfinished=0) == [lucky]
+
+
+def test_front_of_nothing_is_empty():
+    assert pareto_front([]) == []
+
+
+def test_simulation_counts_queued_work_as_waiting():
+    # Arrivals the single instance cannot serve: the backlog left at the end
+    # must show in the wait percentiles, not just in "unfinished"
+    trace = [100] + [0] * 9
+    r = simulator.simulate(trace, {"MAX_INSTANCES": 1}, fast=True, service_rate=0.01)
+    assert r["unfinished"] > 0
+    assert r["wait_p99"] >= 9 * 60 * 0.9
+
+
+def test_fluid_residue_is_not_unfinished():
+    # Default settings keep up with this trace; the fractional task the fluid
+    # model leaves behind must not count as an unfinished task
+    assert simulator.simulate(simulator.load_trace("bursty:20", 3), fast=True)["unfinished"] == 0
@@ -0,0 +1,110 @@
+# Filename: test_worker.py
+#
+# Worker runtime against the in-process SQS stand-in.
+
+import contextlib
+import io
+import json
+import time
+
+import pytest
+
+import worker
+from event_bus import EventBus
+from local_aws import FakeSQS
+from task_publisher import TaskPublisher, make_task
+from worker import Worker, run_task
+
+
+def seeded(bodies, visibility=30):
+    sqs = FakeSQS()
+    queue_url = sqs.create_queue(QueueName="q", Attributes={"VisibilityTimeout": str(visibility)})["QueueUrl"]
+    publisher = TaskPublisher(sqs, queue_url)
+    publisher.publish(bodies)
+    publisher.close()
+    return sqs, queue_url
+
+
+def depth(sqs, queue_url):
+    attrs = sqs.get_queue_attributes(QueueUrl=queue_url)["Attributes"]
+    return int(attrs["ApproximateNumberOfMessages"]), int(attrs["ApproximateNumberOfMessagesNotVisible"])
+
+
+def drain(w, idle=0.3):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return w.start().run_until_empty(idle_seconds=idle)
+
+
+def test_mode_defaults_by_handler():
+    sqs = FakeSQS()
+    assert Worker(sqs, "q", workers=1).mode == "process"
+    assert Worker(sqs, "q", handler=len, workers=1).mode == "thread"
+    assert Worker(sqs, "q", workers=1, mode="thread").mode == "thread"
+
+
+def test_run_task_returns_id():
+    body = make_task("IO", seconds=0)
+    assert run_task(body) == json.loads(body)["id"]
+
+
+def test_processes_and_deletes_in_batches():
+    sqs, queue_url = seeded([make_task("IO", seconds=0.001) for _ in range(200)])
+    stats = drain(Worker(sqs, queue_url, workers=16, mode="thread", wait_seconds=1))
+    assert stats["processed"] == stats["deleted"] == 200
+    assert stats["delete_calls"] < 200 / 2
+    assert depth(sqs, queue_url) == (0, 0)
+
+
+def test_process_mode_runs_cpu_tasks():
+    sqs, queue_url = seeded([make_task("CPU", seconds=0.01) for _ in range(8)])
+    stats = drain(Worker(sqs, queue_url, workers=2, wait_seconds=1))
+    assert stats["deleted"] == 8
+
+
+def test_failed_task_left_for_redelivery():
+    def handler(body):
+        if json.loads(body).get("fail"):
+            raise ValueError("boom")
+
+    sqs, queue_url = seeded([make_task("IO", fail=i < 3) for i in range(10)])
+    stats = drain(Worker(sqs, queue_url, handler, workers=4, wait_seconds=1))
+    assert stats["failed"] == 3 and stats["deleted"] == 7
+    assert depth(sqs, queue_url) == (0, 3)  # in flight until the visibility timeout lapses
+
+
+def test_long_tasks_get_visibility_extended():
+    sqs, queue_url = seeded([make_task("IO", seconds=1.2) for _ in range(4)], visibility=1)
+    stats = drain(Worker(sqs, queue_url, workers=4, mode="thread", visibility=1, wait_seconds=1))
+    assert stats["deleted"] == 4
+    assert stats["extended"] >= 4
+    assert stats["redelivered"] == 0
+
+
+def test_stop_without_drain_hands_tasks_back():
+    sqs, queue_url = seeded([make_task("IO", seconds=1) for _ in range(6)])
+    w = Worker(sqs, queue_url, workers=2, mode="thread", wait_seconds=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        w.start()
+        for _ in range(100):
+            if w.stats["received"]:
+                break
+            time.sleep(0.02)
+        stats = w.stop(drain=False)
+    assert stats.get("deleted", 0) == 0
+    assert w.inflight == 0
+    assert depth(sqs, queue_url)[0] == 6 - stats.get("processed", 0)
+
+
+def test_completions_announced_on_bus():
+    bus = EventBus(threaded=False)
+    completed = []
+    bus.subscribe("tasks.completed", lambda event: completed.append(event.payload["count"]))
+    sqs, queue_url = seeded([make_task("IO", seconds=0) for _ in range(25)])
+    drain(Worker(sqs, queue_url, workers=4, mode="thread", wait_seconds=1, bus=bus))
+    bus.run()
+    assert sum(completed) == 25
+
+
+@pytest.mark.parametrize("task_load", [10, 50, 100])
+def test_pool_size_is_positive(task_load):
+    assert worker.pool_size(task_load) >= 1
@@ -0,0 +1,351 @@
+# Filename: tuner.py
+#
+# Scaler parameter tuning. Replays a recorded backlog trace through the
+# Lambda's own decision function (aws_Lambda.decide_capacity, via
+# simulator.Simulation.run_decisions) for many settings of
+# HIGH_BACKLOG_THRESHOLD, LOW_BACKLOG_THRESHOLD, COOLDOWN_SECONDS and
+# MAX_INSTANCES on a process pool, and prints the Pareto frontier of queue
+# wait vs. instance-hours: every setting on it is the cheapest way to get
+# its latency.
+#
+# A backlog trace is (timestamp, backlog[, running]) samples, from a CSV or
+# from the scaler's metrics store (METRICS_STORE_PATH). It is turned into
+# arrivals per step: backlog growth plus what was served meanwhile, with
+# min(running, backlog) instances busy at --service-rate (tasks finishing
+# between two samples cannot be seen otherwise). Without running counts,
+# only growth counts. An arrivals CSV (--trace) needs no estimate.
+#
+# Usage:
+#   python tuner.py --backlog backlog.csv
+#   python tuner.py --metrics-dir /mnt/metrics --days 14 --search bayes --trials 300
+#   python tuner.py --trace diurnal:40 --grid MAX_INSTANCES=5,10,20 COOLDOWN_SECONDS=60,300
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import simulator
+
+# Search space: name -> (low, high, step)
+SPACE = {
+    "HIGH_BACKLOG_THRESHOLD": (2, 50, 1),
+    "LOW_BACKLOG_THRESHOLD": (0, 10, 1),
+    "COOLDOWN_SECONDS": (30, 900, 30),
+    "MAX_INSTANCES": (1, 50, 1),
+}
+DEFAULT_GRID = {
+    "HIGH_BACKLOG_THRESHOLD": [5, 10, 20, 40],
+    "LOW_BACKLOG_THRESHOLD": [1, 2, 5],
+    "COOLDOWN_SECONDS": [60, 180, 300, 600],
+    "MAX_INSTANCES": [5, 10, 20, 40],
+}
+LATENCY_KEYS = {"p50": "wait_p50", "p90": "wait_p90", "p99": "wait_p99"}
+
+try:
+    import optuna
+except ImportError:
+    optuna = None
+
+
+# -------------------------------
+# BACKLOG TRACES
+# -------------------------------
+def _timestamp(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def read_backlog_csv(path):
+    """[(timestamp, backlog, running or None)] from timestamp,backlog[,running] rows (epoch or ISO times)."""
+    samples = []
+    with open(path) as f:
+        for line in f:
+            fields = [x.strip() for x in line.split(",")]
+            if len(fields) < 2:
+                continue
+            try:
+                running = float(fields[2]) if len(fields) > 2 and fields[2] else None
+                samples.append((_timestamp(fields[0]), float(fields[1]), running))
+            except ValueError:
+                continue  # header
+    return sorted(samples)
+
+
+def read_metrics(directory, days, prefix=""):
+    """The same samples from the scaler's metrics store: the last days of <prefix>backlog and <prefix>running."""
+    from metrics_store import MetricsStore
+
+    store = MetricsStore(directory, readonly=True)  # the scaler may be writing it
+    end = time.time()
+    start = end - days * 86400
+    max_points = int(days * 1440) + 60
+    _, times, backlog = store.query(prefix + "backlog", start, end, max_points)
+    _, running_times, running = store.query(prefix + "running", start, end, max_points)
+    running = dict(zip(running_times, running))
+    return [(t, b, running.get(t)) for t, b in zip(times, backlog)]
+
+
+def arrivals_from_backlog(samples, step_seconds=60, service_rate=0.1):
+    """
+    Tasks arriving per step, inferred from backlog samples: the backlog
+    change between samples plus busy instances x service_rate x elapsed,
+    floored at zero. An instance is busy while the backlog (which counts
+    in-flight tasks) covers it. Fractions carry over to the next step.
+    """
+    if not samples:
+        return []
+    t0 = samples[0][0]
+    trace = [0] * (int((samples[-1][0] - t0) // step_seconds) + 1)
+    pending = samples[0][1]  # the backlog already queued arrives in step 0
+    step = 0
+    for (t, backlog, running), (t_next, backlog_next, _) in zip(samples, samples[1:]):
+        busy = min(running or 0, (backlog + backlog_next) / 2)
+        served = busy * service_rate * (t_next - t)
+        pending += max(0.0, backlog_next - backlog + served)
+        step = int((t - t0) // step_seconds)
+        trace[step] += int(pending)
+        pending -= int(pending)
+    trace[step] += round(pending)
+    return trace
+
+
+# -------------------------------
+# EVALUATION (process pool)
+# -------------------------------
+_trace = None
+_sim_kwargs = None
+
+
+def _init_worker(trace, sim_kwargs):
+    # The trace is sent once per process, not once per candidate
+    global _trace, _sim_kwargs
+    _trace, _sim_kwargs = trace, sim_kwargs
+
+
+def _evaluate(params):
+    result = simulator.simulate(_trace, params, fast=True, **_sim_kwargs)
+    result.pop("wall_seconds", None)
+    return result
+
+
+def valid(params):
+    return params.get("LOW_BACKLOG_THRESHOLD", 0) < params.get("HIGH_BACKLOG_THRESHOLD", math.inf)
+
+
+class Evaluator:
+    """Replays candidate settings on a process pool, each distinct setting once."""
+
+    def __init__(self, trace, fixed=None, workers=None, **sim_kwargs):
+        self.fixed = dict(fixed or {})
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(trace, sim_kwargs))
+        self.results = {}
+
+    def __call__(self, candidates):
+        """Results for candidates ({name: value} dicts), in order."""
+        keyed = [tuple(sorted(dict(c, **self.fixed).items())) for c in candidates]
+        todo = list(dict.fromkeys(k for k in keyed if k not in self.results))
+        chunksize = max(1, len(todo) // (self.workers * 4))
+        for key, result in zip(todo, self.pool.map(_evaluate, [dict(k) for k in todo], chunksize=chunksize)):
+            self.results[key] = result
+        return [self.results[k] for k in keyed]
+
+    def close(self):
+        self.pool.shutdown()
+
+
+# -------------------------------
+# SEARCH
+# -------------------------------
+def grid_search(evaluate, grid):
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    return evaluate([c for c in combos if valid(c)])
+
+
+def _random_value(rng, name):
+    low, high, step = SPACE[name]
+    return low + step * rng.randint(0, (high - low) // step)
+
+
+def _random_candidate(rng, names):
+    while True:
+        candidate = {name: _random_value(rng, name) for name in names}
+        if valid(candidate):
+            return candidate
+
+
+def _mutate(rng, params, names):
+    while True:
+        candidate = dict(params)
+        for name in rng.sample(names, rng.randint(1, len(names))):
+            low, high, step = SPACE[name]
+            candidate[name] = min(high, max(low, candidate[name] + rng.choice((-1, 1)) * step * rng.randint(1, 3)))
+        if valid(candidate):
+            return candidate
+
+
+def random_search(evaluate, trials, names, seed=0):
+    rng = random.Random(seed)
+    return evaluate([_random_candidate(rng, names) for _ in range(trials)])
+
+
+def frontier_search(evaluate, trials, names, latency_key, batch, seed=0):
+    """
+    Model-free stand-in for Bayesian search: a random first third, then
+    batches of small steps from settings on the current frontier.
+    """
+    rng = random.Random(seed)
+    results = evaluate([_random_candidate(rng, names) for _ in range(max(batch, trials // 3))])
+    while len(results) < trials:
+        front = pareto_front(results, latency_key)
+        parents = [{n: r["params"][n] for n in names} for r in front]
+        results += evaluate([_mutate(rng, rng.choice(parents), names) for _ in range(min(batch, trials - len(results)))])
+    return results
+
+
+def bayes_search(evaluate, trials, names, latency_key, batch, seed=0):
+    """Multi-objective TPE (optuna), asked and told in batches so the pool stays busy."""
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(directions=["minimize", "minimize"],
+                                sampler=optuna.samplers.TPESampler(seed=seed, multivariate=True))
+    results, asked_total = [], 0
+    while asked_total < trials:
+        asked = [study.ask() for _ in range(min(batch, trials - asked_total))]
+        asked_total += len(asked)
+        candidates = [{name: t.suggest_int(name, *SPACE[name][:2], step=SPACE[name][2]) for name in names}
+                      for t in asked]
+        runnable = [(t, c) for t, c in zip(asked, candidates) if valid(c)]
+        for t, c in zip(asked, candidates):
+            if not valid(c):
+                study.tell(t, state=optuna.trial.TrialState.PRUNED)
+        for (t, _), result in zip(runnable, evaluate([c for _, c in runnable])):
+            study.tell(t, [result[latency_key], result["instance_hours"]])
+            results.append(result)
+    return results
+
+
+# -------------------------------
+# PARETO FRONTIER
+# -------------------------------
+def pareto_front(results, latency_key="wait_p99", max_unfinished=None):
+    """
+    Results no other result beats on both latency and instance-hours, by
+    instance-hours. Tasks a run leaves queued count in its latencies as
+    waiting until the end of the trace; max_unfinished additionally drops
+    runs that leave more than that many behind.
+    """
+    eligible = sorted((r for r in results if max_unfinished is None or r["unfinished"] <= max_unfinished),
+                      key=lambda r: (r["instance_hours"], r[latency_key]))
+    front, best = [], math.inf
+    for r in eligible:
+        if r[latency_key] < best:
+            front.append(r)
+            best = r[latency_key]
+    return front
+
+
+def dominated_by(result, front, latency_key):
+    return [r for r in front if r is not result and r[latency_key] <= result[latency_key]
+            and r["instance_hours"] <= result["instance_hours"]
+            and (r[latency_key], r["instance_hours"]) != (result[latency_key], result["instance_hours"])]
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Tune scaler thresholds on a recorded backlog trace")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--backlog", help="CSV of timestamp,backlog[,running] samples")
+    source.add_argument("--metrics-dir", help="metrics store directory (METRICS_STORE_PATH)")
+    source.add_argument("--trace", help="arrivals per step instead: CSV or constant:L / diurnal:L / bursty:L")
+    parser.add_argument("--prefix", default="", help="pool metrics prefix, e.g. gpu_")
+    parser.add_argument("--days", type=float, default=14, help="history to read / synthetic trace length")
+    parser.add_argument("--search", choices=("grid", "random", "bayes"), default="grid")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2", help="grid values (default: built-in grid)")
+    parser.add_argument("--trials", type=int, default=200, help="candidates for random / bayes search")
+    parser.add_argument("--set", nargs="*", default=[], metavar="NAME=VALUE", help="fixed scaler parameters")
+    parser.add_argument("--latency", choices=sorted(LATENCY_KEYS), default="p99")
+    parser.add_argument("--max-unfinished", type=int, default=None, help="drop runs leaving more tasks queued")
+    parser.add_argument("--service-rate", type=float, default=0.1, help="tasks/second per instance")
+    parser.add_argument("--boot-seconds", type=float, default=90)
+    parser.add_argument("--scaler-interval", type=float, default=60)
+    parser.add_argument("--step-seconds", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.backlog or args.metrics_dir:
+        samples = read_backlog_csv(args.backlog) if args.backlog else read_metrics(args.metrics_dir, args.days, args.prefix)
+        trace = arrivals_from_backlog(samples, args.step_seconds, args.service_rate)
+        label = args.backlog or f"{args.metrics_dir} ({args.prefix}backlog, {len(samples)} samples)"
+    else:
+        label = args.trace or "diurnal:40"
+        trace = simulator.load_trace(label, args.days, args.seed)
+    if not trace:
+        parser.error("the backlog trace is empty")
+
+    fixed = {k: simulator._parse_value(v) for k, v in (item.split("=", 1) for item in args.set)}
+    for name in fixed:
+        if name not in simulator.TUNABLES:
+            parser.error(f"unknown parameter: {name}")
+    if fixed.get("SCALING_MODE") == "resource":
+        parser.error("resource mode cannot be tuned here: it needs the full handler replay")
+    latency_key = LATENCY_KEYS[args.latency]
+    names = [n for n in SPACE if n not in fixed]
+    sim_kwargs = {"step_seconds": args.step_seconds, "service_rate": args.service_rate,
+                  "boot_seconds": args.boot_seconds, "scaler_interval": args.scaler_interval}
+
+    evaluate = Evaluator(trace, fixed, args.workers, **sim_kwargs)
+    start = time.perf_counter()
+    try:
+        current = evaluate([{}])[0]
+        if args.search == "grid":
+            grid = {k: [simulator._parse_value(v) for v in vs.split(",")]
+                    for k, vs in (item.split("=", 1) for item in args.grid)}
+            results = grid_search(evaluate, grid or {n: DEFAULT_GRID[n] for n in names})
+        elif args.search == "random":
+            results = random_search(evaluate, args.trials, names, args.seed)
+        elif optuna is not None:
+            results = bayes_search(evaluate, args.trials, names, latency_key, evaluate.workers * 2, args.seed)
+        else:
+            if not args.json:
+                print("optuna not installed; searching from the frontier instead")
+            results = frontier_search(evaluate, args.trials, names, latency_key, evaluate.workers * 2, args.seed)
+    finally:
+        evaluate.close()
+    elapsed = time.perf_counter() - start
+    front = pareto_front(results + [current], latency_key, args.max_unfinished)
+    beaten = dominated_by(current, front, latency_key)
+
+    if args.json:
+        print(json.dumps({"trace": label, "steps": len(trace), "tasks": sum(trace), "latency": args.latency,
+                          "evaluated": len(evaluate.results), "seconds": elapsed,
+                          "current": current, "current_dominated_by": len(beaten), "frontier": front}, indent=2))
+        return
+
+    print(f"trace: {label}, {len(trace)} steps, {sum(trace)} tasks; "
+          f"{len(evaluate.results)} settings in {elapsed:.1f}s on {evaluate.workers} process(es)")
+    print(f"current settings: {args.latency}={current[latency_key]:.0f}s, "
+          f"instance-h={current['instance_hours']:.1f} ({len(beaten)} frontier settings beat it on both)")
+    header = " ".join(f"{n.split('_')[0].lower():>8}" for n in SPACE)
+    print(f"{header} | {args.latency + ' s':>8} | {'p50 s':>7} | {'inst-h':>8} | {'scales':>6} | {'unfinished':>10}")
+    for r in front:
+        cells = " ".join(f"{r['params'].get(n, '(cur)')!s:>8}" for n in SPACE)
+        print(f"{cells} | {r[latency_key]:8.0f} | {r['wait_p50']:7.0f} | {r['instance_hours']:8.1f} | "
+              f"{r['scale_events']:>6} | {r['unfinished']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+# Filename: worker.py
+#
+# Worker runtime: consumes the task queue on each instance.
+# Pollers long-poll receive_message (10 messages per call) and hand tasks to
+# a thread or process pool sized from the allocation policy: as many tasks
+# as fit on this instance type at once. Finished tasks are deleted in
+# batches of 10; tasks still running near the end of their visibility
+# timeout get it extended, so long tasks are not delivered twice. A task
+# that fails is left in flight and SQS redelivers it after the timeout.
+#
+# Run on an instance:  python worker.py --task-load 50
+# Local stand-in:      python worker.py --local 2000 --seconds 0.01
+# SIGTERM/SIGINT stop polling and let running tasks finish and be deleted.
+# On EC2 a scale_in.DrainWatcher reports the in-flight count for the
+# scale-in planner and drains the worker when the ASG starts terminating it.
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import scale_in
+
+QUEUE_URL = os.environ.get("SQS_QUEUE_URL", "https://sqs.eu-north-1.amazonaws.com/198852397946/cpu-task-queue")
+REGION = os.environ.get("AWS_REGION", "eu-north-1")
+TASK_LOAD = int(os.environ.get("WORKER_TASK_LOAD", 50))
+INSTANCE_TYPE = os.environ.get("INSTANCE_TYPE") or None
+WORKER_MODE = os.environ.get("WORKER_MODE") or None  # thread | process; None picks by handler
+TASK_SECONDS = float(os.environ.get("WORKER_TASK_SECONDS", 1.0))
+
+RECEIVE_BATCH = 10          # SQS maximum per receive_message / delete_message_batch
+WAIT_SECONDS = 20           # long poll; SQS maximum
+VISIBILITY_TIMEOUT = 60
+PREFETCH = 2                # received-but-not-started tasks per pool slot
+DELETE_FLUSH_SECONDS = 0.2  # a partial delete batch waits at most this long
+
+
+def pool_size(task_load=TASK_LOAD, instance_type=INSTANCE_TYPE, policy=None, workload_class=None):
+    """
+    Tasks of task_load that fit on instance_type at once, using the same
+    allocation as dynamic.allocate_resources and the instance catalog.
+    """
+    from capacity_model import allocations_for, get_catalog
+    from placement import RESOURCES
+
+    allocation = allocations_for([task_load], policy, workload_class)[0]
+    capacity = get_catalog().capacity(instance_type)
+    fits = [int(capacity[r] // allocation[r]) for r in RESOURCES if allocation[r] > 0]
+    return max(1, min(fits) if fits else 1)
+
+
+def run_task(body):
+    """
+    Default task handler. {"task": "CPU"} burns CPU for "seconds" (the
+    stress-ng load the fleet used to get over SSH); other task types sleep.
+    Module-level so the process pool can pickle it.
+    """
+    task = json.loads(body)
+    seconds = float(task.get("seconds", TASK_SECONDS))
+    if task.get("task", "CPU").upper() == "CPU":
+        deadline = time.perf_counter() + seconds
+        x = 0
+        while time.perf_counter() < deadline:
+            x += 1
+    else:
+        time.sleep(seconds)
+    return task.get("id")
+
+
+class Worker:
+    """
+    sqs:       boto3 SQS client (or local_aws.FakeSQS)
+    handler:   callable(body) run per message; raising leaves the message for redelivery
+    workers:   pool size (default pool_size())
+    mode:      "thread" or "process" (handler must be picklable). Default: "process"
+               for the built-in run_task, whose CPU tasks are a pure-Python busy
+               loop that threads would serialise on the GIL; "thread" for any
+               other handler, which is assumed to be I/O-bound
+    bus:       optional event_bus.EventBus; deletions are announced as "tasks.completed"
+    """
+
+    def __init__(self, sqs, queue_url=QUEUE_URL, handler=run_task, workers=None, mode=WORKER_MODE, pollers=None,
+                 visibility=VISIBILITY_TIMEOUT, wait_seconds=WAIT_SECONDS, bus=None):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.handler = handler
+        self.workers = workers or pool_size()
+        self.mode = mode or ("process" if handler is run_task else "thread")
+        self.visibility = visibility
+        self.wait_seconds = wait_seconds
+        self.bus = bus
+        capacity = self.workers * PREFETCH
+        # Enough concurrent long polls to keep the pool fed at one batch each
+        self.pollers = pollers or max(1, min(8, math.ceil(capacity / RECEIVE_BATCH)))
+        self._slots = threading.Semaphore(capacity)
+        self._inflight = {}  # receipt handle -> visible until (monotonic)
+        self._lock = threading.Lock()
+        self._deletes = queue.Queue()
+        self._stop = threading.Event()
+        self._closed = threading.Event()
+        self._threads = []
+        self._pool = None
+        self.stats = Counter()
+
+    # -------------------------------
+    # LIFECYCLE
+    # -------------------------------
+    def start(self):
+        if self.mode == "process":
+            # The pool starts its processes on the first task, from a poller thread; forking
+            # there would copy locks the other threads hold, so children come from a forkserver
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="task")
+        targets = [self._poll] * self.pollers + [self._delete_loop, self._extend_loop]
+        for i, target in enumerate(targets):
+            thread = threading.Thread(target=target, name=f"worker-{target.__name__.strip('_')}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"WORKER STARTED: {self.workers} {self.mode} workers, {self.pollers} pollers on {self.queue_url}")
+        return self
+
+    def stop(self, drain=True):
+        """
+        Stop polling. With drain, received tasks finish (visibility still
+        extended) and are deleted; without, tasks not yet started are
+        cancelled and everything unfinished is handed back to the queue.
+        """
+        if not self._threads:
+            return dict(self.stats)  # never started, or already stopped
+        self._stop.set()
+        pollers, deleter, extender = self._threads[:self.pollers], self._threads[-2], self._threads[-1]
+        for thread in pollers:
+            thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=drain, cancel_futures=not drain)
+        self._deletes.put(None)
+        deleter.join()
+        self._closed.set()
+        extender.join()
+        with self._lock:
+            unfinished = list(self._inflight)
+        for start in range(0, len(unfinished), RECEIVE_BATCH):
+            self._change_visibility(unfinished[start:start + RECEIVE_BATCH], 0)
+        self._threads = []
+        return dict(self.stats)
+
+    @property
+    def inflight(self):
+        """Messages received and not yet deleted or handed back."""
+        with self._lock:
+            return len(self._inflight)
+
+    def run_until_empty(self, idle_seconds=1.0, poll=0.05):
+        """Block until nothing has been received or is in flight for idle_seconds; returns stats."""
+        idle_since = None
+        last = None
+        while True:
+            with self._lock:
+                busy = bool(self._inflight)
+            seen = self.stats["received"]
+            now = time.monotonic()
+            if busy or seen != last:
+                idle_since, last = now, seen
+            elif now - idle_since >= idle_seconds:
+                return self.stop()
+            time.sleep(poll)
+
+    # -------------------------------
+    # RECEIVE
+    # -------------------------------
+    def _reserve(self):
+        """Block for one free slot, then take up to a full batch without waiting."""
+        if not self._slots.acquire(timeout=0.5):
+            return 0
+        n = 1
+        while n < RECEIVE_BATCH and self._slots.acquire(blocking=False):
+            n += 1
+        return n
+
+    def _poll(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            n = self._reserve()
+            if not n:
+                continue
+            try:
+                resp = self.sqs.receive_message(
+                    QueueUrl=self.queue_url, MaxNumberOfMessages=n, WaitTimeSeconds=self.wait_seconds,
+                    VisibilityTimeout=self.visibility, AttributeNames=["ApproximateReceiveCount"])
+                backoff = 0.5
+            except Exception as e:
+                print(f"RECEIVE FAILED: {e}")
+                self._release(n)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            messages = resp.get("Messages", [])
+            self._release(n - len(messages))
+            expires = time.monotonic() + self.visibility
+            redelivered = sum(1 for m in messages if int(m.get("Attributes", {}).get("ApproximateReceiveCount", 1)) > 1)
+            with self._lock:
+                for message in messages:
+                    self._inflight[message["ReceiptHandle"]] = expires
+                self.stats.update(polls=1, empty_polls=int(not messages), received=len(messages),
+                                  redelivered=redelivered)
+            for message in messages:
+                future = self._pool.submit(self.handler, message["Body"])
+                future.add_done_callback(partial(self._finished, message["ReceiptHandle"]))
+
+    def _release(self, n):
+        for _ in range(n):
+            self._slots.release()
+
+    def _finished(self, receipt, future):
+        self._slots.release()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self._deletes.put(receipt)
+            with self._lock:
+                self.stats["processed"] += 1
+            return
+        print(f"TASK FAILED: {error}")
+        with self._lock:
+            self.stats["failed"] += 1
+            self._inflight.pop(receipt, None)  # stop extending; SQS redelivers after the timeout
+
+    # -------------------------------
+    # DELETE (batched)
+    # -------------------------------
+    def _delete_loop(self):
+        done = False
+        while not done:
+            batch = []
+            item = self._deletes.get()
+            deadline = time.monotonic() + DELETE_FLUSH_SECONDS
+            while True:
+                if item is None:
+                    done = True
+                else:
+                    batch.append(item)
+                if done or len(batch) == RECEIVE_BATCH:
+                    break
+                try:
+                    item = self._deletes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._delete_batch(batch)
+
+    def _delete_batch(self, receipts):
+        entries = [{"Id": str(i), "ReceiptHandle": r} for i, r in enumerate(receipts)]
+        try:
+            resp = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            deleted, failed = len(resp.get("Successful", [])), resp.get("Failed", [])
+        except Exception as e:
+            print(f"DELETE FAILED: {e}")
+            deleted, failed = 0, entries
+        with self._lock:
+            for receipt in receipts:
+                self._inflight.pop(receipt, None)
+            self.stats.update(deleted=deleted, delete_failed=len(failed), delete_calls=1)
+        if self.bus is not None and deleted:
+            self.bus.publish("tasks.completed", queue_url=self.queue_url, count=deleted)
+
+    # -------------------------------
+    # VISIBILITY EXTENSION
+    # -------------------------------
+    def _extend_loop(self):
+        # Runs until stop() has drained the pool, so draining tasks stay invisible
+        interval = max(0.05, self.visibility / 4)
+        while not self._closed.wait(interval):
+            now = time.monotonic()
+            with self._lock:
+                due = [r for r, until in self._inflight.items() if until - now < self.visibility / 2]
+            for start in range(0, len(due), RECEIVE_BATCH):
+                self._change_visibility(due[start:start + RECEIVE_BATCH], self.visibility)
+
+    def _change_visibility(self, receipts, timeout):
+        entries = [{"Id": str(i), "ReceiptHandle": r, "VisibilityTimeout": timeout} for i, r in enumerate(receipts)]
+        try:
+            resp = self.sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+            failed = {receipts[int(f["Id"])] for f in resp.get("Failed", [])}
+        except Exception as e:
+            print(f"VISIBILITY CHANGE FAILED: {e}")
+            return
+        until = time.monotonic() + timeout
+        with self._lock:
+            for receipt in receipts:
+                if receipt in failed or not timeout:
+                    self._inflight.pop(receipt, None)  # gone, redelivered elsewhere, or handed back
+                elif receipt in self._inflight:
+                    self._inflight[receipt] = until
+            self.stats["extended" if timeout else "returned"] += len(receipts) - len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQS task worker")
+    parser.add_argument("--queue-url", default=QUEUE_URL)
+    parser.add_argument("--region", default=REGION)
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: from the allocation policy)")
+    parser.add_argument("--task-load", type=int, default=TASK_LOAD, help="load used to size the pool")
+    parser.add_argument("--instance-type", default=INSTANCE_TYPE)
+    parser.add_argument("--mode", choices=("thread", "process"), default=WORKER_MODE,
+                        help="pool type (default: process for the built-in CPU handler)")
+    parser.add_argument("--visibility", type=int, default=VISIBILITY_TIMEOUT)
+    parser.add_argument("--local", type=int, default=0, metavar="N", help="run against the stand-in with N tasks")
+    parser.add_argument("--seconds", type=float, default=None, help="task duration for --local tasks")
+    args = parser.parse_args()
+
+    workers = args.workers or pool_size(args.task_load, args.instance_type)
+    if args.local:
+        from local_aws import FakeSQS
+        from task_publisher import TaskPublisher, make_task
+
+        sqs = FakeSQS()
+        queue_url = sqs.create_queue(QueueName="cpu-task-queue")["QueueUrl"]
+        fields = {} if args.seconds is None else {"seconds": args.seconds}
+        publisher = TaskPublisher(sqs, queue_url)
+        publisher.publish([make_task(**fields) for _ in range(args.local)])
+        publisher.close()
+        worker = Worker(sqs, queue_url, workers=workers, mode=args.mode, visibility=args.visibility, wait_seconds=1)
+        start = time.perf_counter()
+        stats = worker.start().run_until_empty()
+        elapsed = time.perf_counter() - start
+        print(f"{stats.get('deleted', 0)} tasks in {elapsed:.1f}s -> {stats.get('deleted', 0) / elapsed:.0f} tasks/s {stats}")
+        return
+
+    import boto3
+    from botocore.config import Config
+
+    sqs = boto3.client("sqs", region_name=args.region, config=Config(max_pool_connections=max(10, workers)))
+    worker = Worker(sqs, args.queue_url, workers=workers, mode=args.mode, visibility=args.visibility).start()
+    watcher = None
+    instance_id = scale_in.instance_id_from_metadata()
+    if instance_id:
+        from aws_clients import LazyClient
+        from state_store import open_store
+        watcher = scale_in.DrainWatcher(LazyClient("autoscaling", args.region), worker, instance_id, open_store()).start()
+    stopping = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+    while not stopping.wait(1.0):
+        if watcher is not None and watcher.done.is_set():
+            print(f"WORKER DRAINED: {dict(worker.stats)}")
+            return
+    print("WORKER STOPPING: draining running tasks")
+    print(f"WORKER STOPPED: {worker.stop(drain=True)}")
+
+
+if __name__ == "__main__":
+    main()